@@ -1,79 +1,273 @@
 import streamlit as st
 from PIL import Image
 from io import BytesIO
+import uuid
+from nucleo.fotos_pdf import TIPOS_UPLOAD, e_pdf, expandir_pdfs
+from nucleo.hashes import dhash, hash_upload, quase_iguais
+from nucleo.previa import LADO_RASCUNHO, previa, rascunho
+from nucleo.sonda import abrir_imagem, sondar_imagem, validar_imagem
+from nucleo.trabalhos import fila_compartilhada
 
 st.set_page_config(page_title="Imagens → PDF", page_icon="📄", layout="wide")
 
 st.title("📸 Converter Imagens em PDF")
-st.write("Envie suas imagens (JPG ou PNG), altere a ordem, visualize e gere um PDF!")
+st.write("Envie suas imagens (JPG, PNG ou PDFs com fotos), altere a ordem, visualize e gere um PDF!")
 
 # --- Estado inicial ---
-# Estrutura de dados mais robusta: [{"nome": str, "imagem": Image.Image}, ...]
+# Estrutura de dados mais robusta: [{"nome": str, "imagem": Image.Image | None, "previa": Image.Image | None}, ...]
+# "imagem" fica None enquanto a decodificação completa roda em segundo plano, e
+# "previa" até o rascunho ser desenhado pela primeira vez
 if "data_imagens" not in st.session_state:
     st.session_state.data_imagens = []
-# Set para rastrear arquivos já processados (evita re-adição e rollback)
+# Set com o file_id dos uploads já processados: a lista do file_uploader volta
+# inteira a cada rerun, e cada upload só é lido (hash, cabeçalho) uma vez
 if "uploaded_file_keys" not in st.session_state:
     st.session_state.uploaded_file_keys = set()
+# Ids das imagens marcadas para as operações em grupo (valem entre as páginas)
+if "selecionadas" not in st.session_state:
+    st.session_state.selecionadas = set()
+
+# Organizador paginado: cada rerun desenha só as imagens da página visível
+OPCOES_POR_PAGINA = [10, 20, 50]
+PREVIAS_POR_PAGINA = 12
+LADO_MINIATURA = 160
+# Páginas de PDF sem foto embutida aproveitável são rasterizadas para caber
+# numa página A4 a 200 DPI: texto legível sem pesar no PDF final
+CAIXA_PAGINA_PX = (1654, 2339)
 
 # --- Funções auxiliares ---
 
 def mover_cima(index):
     if index > 0:
         st.session_state.data_imagens[index], st.session_state.data_imagens[index-1] = st.session_state.data_imagens[index-1], st.session_state.data_imagens[index]
+        marcar_quase_iguais()
 
 def mover_baixo(index):
     if index < len(st.session_state.data_imagens) - 1:
         st.session_state.data_imagens[index], st.session_state.data_imagens[index+1] = st.session_state.data_imagens[index+1], st.session_state.data_imagens[index]
+        marcar_quase_iguais()
 
 def girar_imagem(index):
-    st.session_state.data_imagens[index]["imagem"] = st.session_state.data_imagens[index]["imagem"].rotate(-90, expand=True)
+    item = st.session_state.data_imagens[index]
+    item["previa"] = previa_do_item(item).rotate(-90, expand=True)
+    item["miniatura"] = None
+    if item["imagem"] is None:
+        # Aplicado quando a imagem completa chegar da fila
+        item["giros"] += 1
+    else:
+        item["imagem"] = item["imagem"].rotate(-90, expand=True)
 
 def excluir_imagem(index):
     # Não precisamos mexer no uploaded_file_keys aqui, pois o arquivo pode ser re-adicionado
     # se o usuário fizer upload novamente. Apenas removemos do estado atual.
-    del st.session_state.data_imagens[index]
+    item = st.session_state.data_imagens.pop(index)
+    st.session_state.selecionadas.discard(item["id"])
+    marcar_quase_iguais()
 
 def limpar_tudo():
     st.session_state.data_imagens.clear()
-    st.session_state.uploaded_file_keys.clear() 
+    st.session_state.uploaded_file_keys.clear()
+    limpar_selecao()
     # O Streamlit não permite resetar o file_uploader via st.session_state,
     # então removemos a linha problemática e usamos apenas rerun().
     # O estado dos dados já está limpo.
-    
+
+# --- Seleção e operações em grupo ---
+
+def alternar_selecao(id_item):
+    if st.session_state[f"sel_{id_item}"]:
+        st.session_state.selecionadas.add(id_item)
+    else:
+        st.session_state.selecionadas.discard(id_item)
+
+def selecionar(ids):
+    for id_item in ids:
+        st.session_state.selecionadas.add(id_item)
+        st.session_state[f"sel_{id_item}"] = True
+
+def limpar_selecao():
+    # As caixas de seleção voltam a ler o conjunto na próxima vez que aparecerem
+    for id_item in st.session_state.selecionadas:
+        st.session_state.pop(f"sel_{id_item}", None)
+    st.session_state.selecionadas.clear()
+
+def indices_selecionados():
+    return [i for i, item in enumerate(st.session_state.data_imagens) if item["id"] in st.session_state.selecionadas]
+
+def girar_selecionadas():
+    for i in indices_selecionados():
+        girar_imagem(i)
+
+def excluir_selecionadas():
+    st.session_state.data_imagens[:] = [
+        item for item in st.session_state.data_imagens if item["id"] not in st.session_state.selecionadas
+    ]
+    limpar_selecao()
+    marcar_quase_iguais()
+
+def mover_selecionadas():
+    """Move as selecionadas (na ordem atual) para começarem na posição escolhida e abre a página dela"""
+    itens = st.session_state.data_imagens
+    movidos = [item for item in itens if item["id"] in st.session_state.selecionadas]
+    resto = [item for item in itens if item["id"] not in st.session_state.selecionadas]
+    destino = min(max(st.session_state.posicao_destino - 1, 0), len(resto))
+    itens[:] = resto[:destino] + movidos + resto[destino:]
+    marcar_quase_iguais()
+    st.session_state.pagina_organizar = destino // st.session_state.get("itens_por_pagina", OPCOES_POR_PAGINA[1]) + 1
+
+def decodificar_imagem(dados):
+    """Tarefa da fila: decodificação completa, cópia de exibição e dHash (ou o erro como texto)"""
+    try:
+        img = abrir_imagem(BytesIO(dados))
+    except Exception as e:
+        return str(e)
+    img_previa = previa(img)
+    return img, img_previa, dhash(img_previa)
 
 # Função para adicionar imagens com verificação robusta
 def adicionar_imagens(uploaded_files):
     if not uploaded_files:
         return
 
-    # Usamos o nome do arquivo + seu tamanho como uma chave única de processamento
+    novos = []
+    # Duplicata é conteúdo igual (hash dos bytes), não nome + tamanho: pega o
+    # mesmo arquivo renomeado e não confunde arquivos diferentes de mesmo nome
+    hashes = {item["hash"] for item in st.session_state.data_imagens}
+    repetidas = []
     for file in uploaded_files:
         # Importante: o objeto file (UploadedFile) é re-criado a cada upload,
         # mas a lista uploaded_files é "sticky" até o usuário interagir.
-        file_key = f"{file.name}_{file.size}"
-        
-        # Só adiciona se o arquivo ainda não foi processado/adicionado
-        if file_key not in st.session_state.uploaded_file_keys:
-            try:
-                # Usar file.seek(0) antes de Image.open() garante que o ponteiro está no início,
-                # importante ao lidar com múltiplos uploads ou re-execuções.
-                file.seek(0) 
-                img = Image.open(file).convert("RGB")
-                st.session_state.data_imagens.append({"nome": file.name, "imagem": img})
-                st.session_state.uploaded_file_keys.add(file_key)
-            except Exception as e:
-                st.error(f"Erro ao carregar o arquivo {file.name}: {e}")
+        if file.file_id in st.session_state.uploaded_file_keys:
+            continue
+        st.session_state.uploaded_file_keys.add(file.file_id)
+
+        hash_arquivo = hash_upload(file)
+        if hash_arquivo in hashes:
+            # Igual a uma imagem da lista: não decodifica nem entra no PDF de novo
+            repetidas.append(file.name)
+            continue
+        try:
+            # Só o cabeçalho aqui: recusa arquivos corrompidos ou grandes demais
+            # sem decodificar. O rascunho é decodificado ao ser exibido.
+            validar_imagem(sondar_imagem(file))
+        except Exception as e:
+            st.error(f"Erro ao carregar o arquivo {file.name}: {e}")
+            continue
+        dados = file.getvalue()
+        item = {"id": uuid.uuid4().hex, "nome": file.name, "hash": hash_arquivo, "imagem": None, "previa": None,
+                "miniatura": None, "dados": dados, "giros": 0, "dhash": None, "parecida_com": None}
+        st.session_state.data_imagens.append(item)
+        hashes.add(hash_arquivo)
+        novos.append((item, dados))
+
+    if repetidas:
+        st.toast(f"{len(repetidas)} arquivo(s) repetido(s) ignorado(s): {', '.join(repetidas[:5])}"
+                 + ("…" if len(repetidas) > 5 else ""))
+
+    if novos:
+        # A decodificação completa vai para a fila; o rascunho é trocado quando ela termina
+        if "id_sessao" not in st.session_state:
+            st.session_state.id_sessao = uuid.uuid4().hex
+        trabalho = fila_compartilhada().submeter(
+            st.session_state.id_sessao, uuid.uuid4().hex, decodificar_imagem, [dados for _, dados in novos]
+        )
+        for indice, (item, _) in enumerate(novos):
+            item["trabalho"], item["indice"] = trabalho, indice
+
+def atualizar_imagens():
+    """Troca o rascunho pela imagem completa de cada item que a fila já decodificou"""
+    mudou = False
+    for item in list(st.session_state.data_imagens):
+        if item["imagem"] is not None:
+            continue
+        trabalho = item["trabalho"]
+        resultado = trabalho.resultados[item["indice"]] if trabalho.erro is None else str(trabalho.erro)
+        if resultado is None:
+            continue
+        if isinstance(resultado, str):
+            st.error(f"Erro ao carregar o arquivo {item['nome']}: {resultado}")
+            st.session_state.data_imagens.remove(item)
+            st.session_state.selecionadas.discard(item["id"])
+            mudou = True
+            continue
+        img, img_previa, item["dhash"] = resultado
+        for _ in range(item["giros"]):
+            img, img_previa = img.rotate(-90, expand=True), img_previa.rotate(-90, expand=True)
+        item["imagem"], item["previa"] = img, img_previa
+        del item["trabalho"], item["dados"]
+        mudou = True
+    if mudou:
+        marcar_quase_iguais()
+
+def marcar_quase_iguais():
+    """Aponta em cada imagem a mais parecida (dHash) entre as anteriores na lista.
+
+    Refeito na lista inteira, na ordem atual, a cada chegada, exclusão ou
+    movimentação: a marca não depende da ordem em que a fila decodificou
+    e nunca aponta para uma imagem que já saiu.
+    """
+    itens = st.session_state.data_imagens
+    decodificados = [item for item in itens if item["dhash"] is not None]
+    hashes = [item["dhash"] for item in decodificados]
+    indices = quase_iguais(hashes, hashes, ate=range(len(decodificados)))
+    for item in itens:
+        item["parecida_com"] = None
+    for item, j in zip(decodificados, indices):
+        item["parecida_com"] = decodificados[j]["nome"] if j >= 0 else None
+
+def previa_do_item(item):
+    """Rascunho rápido (JPEG decodificado em escala reduzida) até a imagem completa chegar"""
+    if item["previa"] is None:
+        try:
+            item["previa"] = rascunho(BytesIO(item["dados"]))
+        except Exception:
+            # O erro aparece quando a decodificação completa terminar
+            item["previa"] = Image.new("RGB", (LADO_RASCUNHO, LADO_RASCUNHO), "#eeeeee")
+    return item["previa"]
+
+def miniatura_do_item(item):
+    """Miniatura JPEG do organizador: codificada uma vez, os reruns só reenviam os bytes"""
+    if item["miniatura"] is None:
+        img = previa_do_item(item).convert("RGB")
+        img.thumbnail((LADO_MINIATURA, LADO_MINIATURA), Image.BILINEAR)
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=80)
+        item["miniatura"] = buf.getvalue()
+    return item["miniatura"]
+
+def pagina_atual(chave, total_itens, por_pagina):
+    """Seletor de página (mantido dentro do intervalo quando a lista encolhe) e a fatia visível"""
+    total_paginas = max(1, -(-total_itens // por_pagina))
+    if st.session_state.get(chave, 1) > total_paginas:
+        st.session_state[chave] = total_paginas
+    pagina = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, key=chave)
+    inicio = (pagina - 1) * por_pagina
+    return range(inicio, min(inicio + por_pagina, total_itens))
+
+def imagens_pendentes():
+    return sum(item["imagem"] is None for item in st.session_state.data_imagens)
 
 # --- Upload ---
 uploaded_files = st.file_uploader(
     "Selecione ou arraste suas imagens aqui",
-    type=["png", "jpg", "jpeg"],
+    type=TIPOS_UPLOAD,
     accept_multiple_files=True,
     key="image_uploader" # Adicionamos uma chave para controle
 )
 
+# PDFs viram uma imagem por foto embutida (ou por página), na posição do PDF;
+# cada PDF é aberto uma vez só (depois o file_id dele é ignorado como os demais)
+arquivos = []
+for f in uploaded_files or []:
+    if e_pdf(f) and f.file_id not in st.session_state.uploaded_file_keys:
+        st.session_state.uploaded_file_keys.add(f.file_id)
+        arquivos += expandir_pdfs([f], CAIXA_PAGINA_PX)
+    else:
+        arquivos.append(f)
+
 # Chama a função para processar os arquivos carregados
-adicionar_imagens(uploaded_files)
+adicionar_imagens(arquivos)
+atualizar_imagens()
 
 # --- Abas ---
 aba1, aba2 = st.tabs(["🗂️ Organizar Imagens", "👀 Pré-visualização"])
@@ -83,31 +277,83 @@ with aba1:
     st.subheader("🧩 Reordene e edite suas imagens")
 
     if st.session_state.data_imagens:
-        
+        itens = st.session_state.data_imagens
+        total = len(itens)
+
+        col_pag1, col_pag2 = st.columns(2)
+        with col_pag1:
+            por_pagina = st.selectbox("Imagens por página", OPCOES_POR_PAGINA, index=1, key="itens_por_pagina")
+        with col_pag2:
+            visiveis = pagina_atual("pagina_organizar", total, por_pagina)
+
+        # Operações em grupo sobre as selecionadas (a seleção vale entre as páginas)
+        n_sel = len(st.session_state.selecionadas)
+        st.caption(f"{total} imagens · {n_sel} selecionadas")
+        # Quase iguais (dHash): a mesma foto reexportada, reduzida ou recomprimida
+        apontar = st.checkbox("Apontar fotos quase iguais", value=True, key="apontar_quase_iguais")
+        quase = [item["id"] for item in itens if item["parecida_com"]] if apontar else []
+        if quase:
+            st.button(f"☑️ Selecionar {len(quase)} quase iguais", on_click=selecionar, args=(quase,))
+        col_g1, col_g2, col_g3, col_g4, col_g5, col_g6 = st.columns([1, 1, 1, 1, 1, 1])
+        with col_g1:
+            st.button("☑️ Selecionar página", on_click=selecionar, args=([itens[i]["id"] for i in visiveis],),
+                      use_container_width=True)
+        with col_g2:
+            st.button("✖️ Limpar seleção", on_click=limpar_selecao, disabled=not n_sel, use_container_width=True)
+        with col_g3:
+            st.button("🔄 Girar selecionadas", on_click=girar_selecionadas, disabled=not n_sel, use_container_width=True)
+        with col_g4:
+            st.button("🗑️ Excluir selecionadas", on_click=excluir_selecionadas, disabled=not n_sel,
+                      use_container_width=True)
+        with col_g5:
+            if st.session_state.get("posicao_destino", 1) > total:
+                st.session_state.posicao_destino = total
+            st.number_input("Posição", min_value=1, max_value=total, key="posicao_destino",
+                            label_visibility="collapsed")
+        with col_g6:
+            st.button("↪️ Mover para a posição", on_click=mover_selecionadas, disabled=not n_sel,
+                      use_container_width=True)
+
+        st.divider()
+
         # A forma mais robusta de exibir em Streamlit é garantindo a unicidade da key
-        # e a correta referência no on_click.
-        for i, item in enumerate(st.session_state.data_imagens):
-            nome = item["nome"]
+        # e a correta referência no on_click. As keys usam o id da imagem, que não
+        # muda quando ela troca de posição.
+        for i in visiveis:
+            item = itens[i]
+            nome, id_item = item["nome"], item["id"]
             # Usar o container st.container() com uma key única ajuda a isolar os elementos
             # de cada linha do loop.
-            with st.container(key=f"item_container_{nome}_{i}"):
-                col1, col2, col3, col4, col5 = st.columns([3, 1, 1, 1, 1])
+            with st.container(key=f"item_container_{id_item}"):
+                col0, col_mini, col1, col2, col3, col4, col5 = st.columns([0.4, 1, 3, 1, 1, 1, 1])
+
+                with col0:
+                    chave_sel = f"sel_{id_item}"
+                    if chave_sel not in st.session_state:
+                        st.session_state[chave_sel] = id_item in st.session_state.selecionadas
+                    st.checkbox("Selecionar", key=chave_sel, on_change=alternar_selecao, args=(id_item,),
+                                label_visibility="collapsed")
+
+                with col_mini:
+                    st.image(miniatura_do_item(item), width=LADO_MINIATURA // 2)
 
                 # Colunas com os botões e texto
                 with col1:
                     st.write(f"**{i+1}. {nome}**")
+                    if apontar and item["parecida_com"]:
+                        st.caption(f"≈ parecida com {item['parecida_com']}")
 
                 with col2:
-                    st.button("⬆️", key=f"up_{nome}_{i}", on_click=mover_cima, args=(i,))
+                    st.button("⬆️", key=f"up_{id_item}", on_click=mover_cima, args=(i,))
 
                 with col3:
-                    st.button("⬇️", key=f"down_{nome}_{i}", on_click=mover_baixo, args=(i,))
+                    st.button("⬇️", key=f"down_{id_item}", on_click=mover_baixo, args=(i,))
 
                 with col4:
-                    st.button("🔄", key=f"rotate_{nome}_{i}", on_click=girar_imagem, args=(i,))
+                    st.button("🔄", key=f"rotate_{id_item}", on_click=girar_imagem, args=(i,))
 
                 with col5:
-                    st.button("🗑️", key=f"delete_{nome}_{i}", on_click=excluir_imagem, args=(i,))
+                    st.button("🗑️", key=f"delete_{id_item}", on_click=excluir_imagem, args=(i,))
             
             # Adiciona um divisor leve entre os itens
             st.markdown("---", unsafe_allow_html=False) 
@@ -127,16 +373,39 @@ with aba2:
     if st.session_state.data_imagens:
         st.subheader("👁️ Visualização das imagens")
         
-        # Extrai os dados para visualização e geração de PDF
+        visiveis_previa = pagina_atual("pagina_previa", len(st.session_state.data_imagens), PREVIAS_POR_PAGINA)
+
+        def mostrar_previas():
+            # Rascunho até a imagem completa ficar pronta; nunca a imagem de impressão inteira,
+            # e só as da página escolhida
+            itens = st.session_state.data_imagens
+            
+            # Exibe no máximo 3 colunas de imagem na pré-visualização
+            cols = st.columns(min(3, len(visiveis_previa)))
+            for n, i in enumerate(visiveis_previa):
+                if i >= len(itens):
+                    break
+                # Usamos o módulo (%) para ciclar nas colunas (se houver mais de 3 imagens)
+                with cols[n % len(cols)]: 
+                    st.image(previa_do_item(itens[i]), caption=f"{i + 1}. {itens[i]['nome']}", use_container_width=True)
+
+        @st.fragment(run_every=0.5)
+        def acompanhar_imagens():
+            """Troca os rascunhos pelas imagens completas sem reexecutar a página inteira"""
+            atualizar_imagens()
+            pendentes = imagens_pendentes()
+            if not pendentes:
+                st.rerun()
+            total = len(st.session_state.data_imagens)
+            st.progress((total - pendentes) / total, text=f"Carregando em alta qualidade: {total - pendentes} de {total}")
+            mostrar_previas()
+
+        if imagens_pendentes():
+            acompanhar_imagens()
+            st.stop()
+
+        mostrar_previas()
         imagens_para_visualizar = [item["imagem"] for item in st.session_state.data_imagens]
-        nomes_para_visualizar = [item["nome"] for item in st.session_state.data_imagens]
-        
-        # Exibe no máximo 3 colunas de imagem na pré-visualização
-        cols = st.columns(min(3, len(imagens_para_visualizar)))
-        for i, img in enumerate(imagens_para_visualizar):
-            # Usamos o módulo (%) para ciclar nas colunas (se houver mais de 3 imagens)
-            with cols[i % len(cols)]: 
-                st.image(img, caption=nomes_para_visualizar[i], use_container_width=True)
 
         nome_pdf = st.text_input("📝 Nome do PDF (sem .pdf):", value="imagens_unidas")
 
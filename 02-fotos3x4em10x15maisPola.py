@@ -3,7 +3,23 @@ from PIL import Image, ImageOps, ImageDraw
 import io
 import subprocess
 import sys
-import importlib
+import importlib.metadata
+import math
+import uuid
+import zipfile
+import numpy as np
+import pandas as pd
+from nucleo.cache_disco import cache_compartilhado, versao_codigo
+from nucleo.cores import assinatura, perfil_saida_bytes
+from nucleo.fotos_pdf import TIPOS_UPLOAD, expandir_pdfs, primeira_foto
+from nucleo.hashes import hash_upload
+from nucleo.metricas import BYTES_CODIFICADOS, medido
+from nucleo.modelos import MODELOS, cm_para_px, compilar, renderizar, variante
+from nucleo.reamostragem import backend_ativo, redimensionar
+from nucleo.recursos import fonte
+from nucleo.rostos import detector_disponivel, janela_no_rosto, localizar_rosto
+from nucleo.sonda import abrir_imagem, ImagemRejeitada
+from nucleo.trabalhos import fila_compartilhada
 
 # Lista de bibliotecas necessárias para outros apps
 REQUIRED_LIBRARIES = [
@@ -11,15 +27,24 @@ REQUIRED_LIBRARIES = [
     "num2words", "html5lib", "beautifulsoup4", "PyGithub", "workalendar"
 ]
 
-def install_missing_libraries():
-    """Verifica e instala bibliotecas ausentes"""
-    missing_libs = []
-    
+@st.cache_data(ttl=3600, show_spinner=False)
+def verificar_bibliotecas():
+    """Versão instalada de cada biblioteca (None se ausente), sem importá-las.
+
+    Consulta só os metadados dos pacotes: nomes de distribuição como
+    "PyMuPDF" ou "beautifulsoup4" não são nomes de módulo importáveis.
+    """
+    situacao = {}
     for lib in REQUIRED_LIBRARIES:
         try:
-            importlib.import_module(lib)
-        except ImportError:
-            missing_libs.append(lib)
+            situacao[lib] = importlib.metadata.version(lib)
+        except importlib.metadata.PackageNotFoundError:
+            situacao[lib] = None
+    return situacao
+
+def install_missing_libraries():
+    """Verifica e instala bibliotecas ausentes"""
+    missing_libs = [lib for lib, versao in verificar_bibliotecas().items() if versao is None]
     
     if missing_libs:
         st.warning(f"Bibliotecas ausentes detectadas: {', '.join(missing_libs)}")
@@ -34,6 +59,7 @@ def install_missing_libraries():
                     except subprocess.CalledProcessError:
                         st.error(f"✗ Falha ao instalar {lib}")
             
+            verificar_bibliotecas.clear()
             st.success("Instalação concluída! Reinicie o aplicativo para carregar as bibliotecas.")
             return False
         return False
@@ -41,66 +67,61 @@ def install_missing_libraries():
         st.success("Todas as bibliotecas necessárias estão instaladas!")
         return True
 
-def corrigir_rotacao(image):
-    """Corrige a rotação automática baseada em metadados EXIF"""
-    try:
-        # Verificar se há informações de orientação EXIF
-        exif = image._getexif()
-        if exif:
-            orientation = exif.get(0x0112)
-            if orientation:
-                # Rotacionar conforme a orientação EXIF
-                if orientation == 3:
-                    image = image.rotate(180, expand=True)
-                elif orientation == 6:
-                    image = image.rotate(270, expand=True)
-                elif orientation == 8:
-                    image = image.rotate(90, expand=True)
-    except Exception:
-        pass
-    return image
+FOTOS_POR_FOLHA = 10
+BORDA_3X4_PX = 10
+# Foto 3x4 a 300 DPI (também o DPI das páginas de PDF rasterizadas)
+CAIXA_3X4_PX = (int(3 * 300 / 2.54), int(4 * 300 / 2.54))
 
 def rotacionar_imagem(image, angulo):
     """Rotaciona a imagem pelo ângulo especificado"""
     return image.rotate(angulo, expand=True)
 
-def montar_folha_3x4(foto, dpi=300, borda=False, espacamento=0):
-    # Tamanho do papel 10x15 cm em pixels
-    largura_papel_px = int(15 * dpi / 2.54)
-    altura_papel_px = int(10 * dpi / 2.54)
-    
+def preparar_foto_3x4(foto, dpi=300, borda=False, rosto=None):
+    """Foto recortada em 3x4 (com a borda branca opcional), pronta para colar na folha.
+
+    Com ``rosto`` (caixa de ``localizar_rosto``) o recorte enquadra o rosto
+    em vez de pegar o centro da foto. Com o backend ``opencv`` a foto sai
+    como array, que ``renderizar`` cola sem voltar para o Pillow.
+    """
     # Tamanho da foto 3x4 cm em pixels
     largura_foto_px = int(3 * dpi / 2.54)
     altura_foto_px = int(4 * dpi / 2.54)
 
     # Redimensionar foto para 3x4 mantendo a proporção e fazendo crop
-    foto_redimensionada = redimensionar_e_recortar(foto, (largura_foto_px, altura_foto_px))
+    if rosto is not None:
+        foto_redimensionada = recortar_no_rosto(foto, (largura_foto_px, altura_foto_px), rosto, como_array=True)
+    else:
+        foto_redimensionada = redimensionar_e_recortar(foto, (largura_foto_px, altura_foto_px), como_array=True)
 
     # Se a pessoa quiser borda, adiciona
-    if borda:
-        foto_redimensionada = ImageOps.expand(foto_redimensionada, border=10, fill="white")
+    if borda and isinstance(foto_redimensionada, np.ndarray):
+        b = BORDA_3X4_PX
+        foto_redimensionada = np.pad(foto_redimensionada, ((b, b), (b, b), (0, 0)), constant_values=255)
+    elif borda:
+        foto_redimensionada = ImageOps.expand(foto_redimensionada, border=BORDA_3X4_PX, fill="white")
+    return foto_redimensionada
 
-    # Criar folha em branco
-    folha = Image.new("RGB", (largura_papel_px, altura_papel_px), "white")
+def montar_folha_mista(fotos, dpi=300, espacamento=0, borda=False):
+    """Cola até 10 fotos 3x4 já preparadas (podem ser de pessoas diferentes) numa folha 10x15"""
+    # Modelo 5 colunas x 2 linhas a partir do canto; a borda e o espaçamento escolhidos na tela são em pixels
+    modelo = variante(MODELOS["3x4_em_10x15"], acrescimo_px=BORDA_3X4_PX if borda else 0, espaco_px=espacamento)
+    return renderizar(compilar(modelo, dpi), fotos[:FOTOS_POR_FOLHA])
 
-    # Calcular espaçamento entre fotos
-    espacamento_x = espacamento
-    espacamento_y = espacamento
-    
-    # Colar 10 fotos (5 colunas x 2 linhas)
-    for linha in range(2):
-        for coluna in range(5):
-            x = coluna * (foto_redimensionada.width + espacamento_x)
-            y = linha * (foto_redimensionada.height + espacamento_y)
-            folha.paste(foto_redimensionada, (x, y))
+@medido("montar_folha_3x4")
+def montar_folha_3x4(foto, dpi=300, borda=False, espacamento=0, rosto=None):
+    foto_redimensionada = preparar_foto_3x4(foto, dpi=dpi, borda=borda, rosto=rosto)
+    return montar_folha_mista([foto_redimensionada] * FOTOS_POR_FOLHA, dpi=dpi, espacamento=espacamento, borda=borda)
 
-    return folha
+def fonte_legenda(tamanho=None):
+    """Fonte da legenda; ``tamanho`` em pixels (None = fonte padrão pequena, como antes)"""
+    return fonte(None, tamanho)
 
-def criar_polaroid(imagem, texto="", tamanho=(800, 1000), cor_borda="white", espessura_borda=40):
+def criar_polaroid(imagem, texto="", tamanho=(800, 1000), cor_borda="white", espessura_borda=40,
+                   espaco_texto=80, tamanho_fonte=None):
     """Cria um efeito Polaroid com a imagem"""
     # Redimensionar a imagem para caber no formato Polaroid
     largura_img = tamanho[0] - espessura_borda * 2
-    altura_img = tamanho[1] - espessura_borda * 2 - 80  # Espaço para o texto
+    altura_img = tamanho[1] - espessura_borda * 2 - espaco_texto  # Espaço para o texto
     
     img_redimensionada = redimensionar_e_recortar(imagem, (largura_img, altura_img))
     
@@ -109,27 +130,28 @@ def criar_polaroid(imagem, texto="", tamanho=(800, 1000), cor_borda="white", esp
     
     # Colar a imagem no Polaroid
     offset_x = (tamanho[0] - img_redimensionada.width) // 2
-    offset_y = (tamanho[1] - img_redimensionada.height - 80) // 2
+    offset_y = (tamanho[1] - img_redimensionada.height - espaco_texto) // 2
     polaroid.paste(img_redimensionada, (offset_x, offset_y))
     
     # Adicionar texto se fornecido
     if texto:
         try:
             draw = ImageDraw.Draw(polaroid)
+            fonte = fonte_legenda(tamanho_fonte)
             # Centralizar o texto na parte inferior
-            bbox = draw.textbbox((0, 0), texto)
+            bbox = draw.textbbox((0, 0), texto, font=fonte)
             largura_texto = bbox[2] - bbox[0]
             altura_texto = bbox[3] - bbox[1]
             x_texto = (tamanho[0] - largura_texto) // 2
-            y_texto = tamanho[1] - 60 - altura_texto // 2
+            y_texto = tamanho[1] - (espessura_borda + espaco_texto) // 2 - altura_texto // 2
             
-            draw.text((x_texto, y_texto), texto, fill="black")
+            draw.text((x_texto, y_texto), texto, fill="black", font=fonte)
         except:
             pass
     
     return polaroid
 
-def redimensionar_e_recortar(image, target_size):
+def redimensionar_e_recortar(image, target_size, como_array=False):
     """Redimensiona a imagem mantendo a proporção e recortando o centro"""
     target_width, target_height = target_size
     width, height = image.size
@@ -148,7 +170,7 @@ def redimensionar_e_recortar(image, target_size):
         new_height = int(height * (target_width / width))
     
     # Redimensionar
-    image = image.resize((new_width, new_height), Image.LANCZOS)
+    image = redimensionar(image, (new_width, new_height), como_array=como_array)
     
     # Recortar o centro
     left = (new_width - target_width) / 2
@@ -156,8 +178,170 @@ def redimensionar_e_recortar(image, target_size):
     right = (new_width + target_width) / 2
     bottom = (new_height + target_height) / 2
     
+    if isinstance(image, np.ndarray):
+        # Mesmo arredondamento do crop do Pillow
+        return image[round(top):round(bottom), round(left):round(right)]
     return image.crop((left, top, right, bottom))
 
+def recortar_no_rosto(image, target_size, rosto, como_array=False):
+    """Recorta enquadrando o rosto como numa foto de documento e redimensiona para o alvo"""
+    proporcao = target_size[0] / target_size[1]
+    caixa = janela_no_rosto(image.size, rosto, proporcao, altura_minima=target_size[1])
+    return redimensionar(image.crop(caixa), target_size, como_array=como_array)
+
+def folha_3x4_jpeg(foto, borda, espacamento, rosto=None):
+    """Folha 3x4 já codificada em JPEG para impressão (300 DPI)"""
+    folha = montar_folha_3x4(foto, borda=borda, espacamento=espacamento, rosto=rosto)
+    buf = io.BytesIO()
+    folha.save(buf, format="JPEG", quality=100, dpi=(300, 300), icc_profile=perfil_saida_bytes())
+    return buf.getvalue()
+
+def polaroid_jpeg(foto, texto, tamanho, cor_borda):
+    """Polaroid já codificado em JPEG"""
+    polaroid = criar_polaroid(foto, texto=texto, tamanho=tamanho, cor_borda=cor_borda)
+    buf = io.BytesIO()
+    polaroid.save(buf, format="JPEG", quality=95, icc_profile=perfil_saida_bytes())
+    return buf.getvalue()
+
+# ------------------- LOTE (VÁRIAS PESSOAS) -------------------
+
+def preparar_foto_lote(item):
+    """Tarefa da fila: decodifica e recorta uma foto do lote (ou devolve o erro como texto)"""
+    dados, borda, centralizar, chave = item
+    try:
+        # Decodificada já em escala reduzida: só precisa cobrir 3x4 a 300 DPI
+        foto = abrir_imagem(io.BytesIO(dados), tamanho_alvo=CAIXA_3X4_PX)
+    except ImagemRejeitada as e:
+        return str(e)
+    rosto = localizar_rosto(foto, chave=chave) if centralizar else None
+    return preparar_foto_3x4(foto, borda=borda, rosto=rosto)
+
+@medido("folha_3x4_lote")
+def folha_lote_jpeg(item):
+    """Tarefa da fila: monta e codifica uma folha com as fotos já preparadas"""
+    fotos, espacamento, borda = item
+    folha = montar_folha_mista(fotos, espacamento=espacamento, borda=borda)
+    buf = io.BytesIO()
+    folha.save(buf, format="JPEG", quality=95, dpi=(300, 300), icc_profile=perfil_saida_bytes())
+    BYTES_CODIFICADOS.inc(buf.tell(), ferramenta="folha_3x4_lote")
+    return buf.getvalue()
+
+def distribuir_copias(pedidos):
+    """Uma entrada por cópia, fatiada em folhas de 10: pessoas diferentes dividem a folha (ex.: 5 + 5)"""
+    sequencia = [chave for chave, copias in pedidos for _ in range(copias)]
+    return [sequencia[i:i + FOTOS_POR_FOLHA] for i in range(0, len(sequencia), FOTOS_POR_FOLHA)]
+
+def pdf_das_folhas(folhas, tamanho_cm=(15, 10)):
+    """PDF com uma página por folha (10x15 deitada por padrão); os JPEGs entram sem recodificar"""
+    import pymupdf
+
+    doc = pymupdf.open()
+    for jpeg in folhas:
+        pagina = doc.new_page(width=tamanho_cm[0] / 2.54 * 72, height=tamanho_cm[1] / 2.54 * 72)
+        pagina.insert_image(pagina.rect, stream=jpeg)
+    return doc.tobytes()
+
+def zip_das_folhas(folhas):
+    """ZIP com um JPEG por folha (sem recomprimir: JPEG já é comprimido)"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for i, jpeg in enumerate(folhas, start=1):
+            zf.writestr(f"folha_3x4_{i:03d}.jpg", jpeg)
+    return buf.getvalue()
+
+def avancar_lote(lote):
+    """Passa do recorte das fotos para a montagem das folhas quando a primeira etapa termina"""
+    trabalho = lote["trabalho"]
+    if not trabalho.pronto or trabalho.erro is not None or lote["etapa"] != "fotos":
+        return
+    fotos = dict(zip(lote["chaves"], trabalho.resultados))
+    lote["erros"] = {lote["nomes"][c]: r for c, r in fotos.items() if isinstance(r, str)}
+    pedidos = [(c, n) for c, n in lote["pedidos"] if not isinstance(fotos[c], str)]
+    folhas = [([fotos[c] for c in folha], lote["espacamento"], lote["borda"]) for folha in distribuir_copias(pedidos)]
+    lote["etapa"] = "folhas"
+    lote["trabalho"] = fila_compartilhada().submeter(lote["sessao"], lote["chave"], folha_lote_jpeg, folhas)
+
+# ------------------- POLAROIDS EM LOTE (IMPRESSÃO) -------------------
+
+# Tamanhos reais (largura x altura em cm) dos formatos de foto instantânea
+TAMANHOS_POLAROID_CM = {
+    "Clássico (8,8 × 10,7 cm)": (8.8, 10.7),
+    "Quadrado (7,2 × 8,6 cm)": (7.2, 8.6),
+    "Mini (5,4 × 8,6 cm)": (5.4, 8.6),
+}
+FOLHAS_POLAROID_CM = {
+    "A4 (21 × 29,7 cm)": (21, 29.7),
+    "10x15 (10 × 15 cm)": (10, 15),
+}
+MARGEM_FOLHA_CM = 0.6   # Espaço para as marcas de corte
+ESPACO_CORTE_CM = 0.4   # Entre um Polaroid e outro
+MARCA_CORTE_CM = 0.4
+
+def polaroid_para_impressao(imagem, texto, tamanho_cm, dpi, cor_borda="white"):
+    """Polaroid no tamanho físico: borda, espaço da legenda e fonte na mesma proporção do modelo 800x1000"""
+    tamanho = (cm_para_px(tamanho_cm[0], dpi), cm_para_px(tamanho_cm[1], dpi))
+    escala = tamanho[0] / 800
+    espaco_texto = round(80 * escala)
+    return criar_polaroid(imagem, texto=texto, tamanho=tamanho, cor_borda=cor_borda,
+                          espessura_borda=round(40 * escala), espaco_texto=espaco_texto,
+                          tamanho_fonte=max(8, round(espaco_texto * 0.45)))
+
+def grade_polaroid(tamanho_cm, folha_cm):
+    """Folha (em pé ou deitada) e grade com mais Polaroids por página: (folha_cm, colunas, linhas)"""
+    melhor = (folha_cm, 0, 0)
+    for folha in (folha_cm, folha_cm[::-1]):
+        # Arredondado ao 0,1 mm: 10 - 2 × 0,6 tem que caber 8,8 exatamente
+        colunas = math.floor(round((folha[0] - 2 * MARGEM_FOLHA_CM + ESPACO_CORTE_CM) / (tamanho_cm[0] + ESPACO_CORTE_CM), 4))
+        linhas = math.floor(round((folha[1] - 2 * MARGEM_FOLHA_CM + ESPACO_CORTE_CM) / (tamanho_cm[1] + ESPACO_CORTE_CM), 4))
+        if colunas * linhas > melhor[1] * melhor[2]:
+            melhor = (folha, colunas, linhas)
+    return melhor
+
+def modelo_polaroid(tamanho_cm, folha_cm, colunas, linhas):
+    """Modelo da folha de Polaroids: grade centralizada com marcas de corte na margem"""
+    return {
+        "papel": folha_cm,
+        "grade": {"colunas": colunas, "linhas": linhas, "celula": tamanho_cm, "espaco": ESPACO_CORTE_CM},
+        # 0,085 mm = 1 px a 300 DPI
+        "corte": {"estilo": "margem", "cor": "black", "espessura": 0.085,
+                  "comprimento": MARCA_CORTE_CM, "afastamento": 0.1},
+    }
+
+def impor_polaroids(polaroids, tamanho_cm, folha_cm, colunas, linhas, dpi):
+    """Cola os Polaroids (todos do mesmo tamanho) centralizados na folha, com marcas de corte na margem"""
+    compilado = compilar(modelo_polaroid(tamanho_cm, folha_cm, colunas, linhas), dpi)
+    if not polaroids:
+        return Image.new("RGB", compilado["tamanho"], "white")
+    return renderizar(compilado, polaroids)
+
+@medido("folha_polaroid")
+def folha_polaroid_jpeg(item):
+    """Tarefa da fila: cria os Polaroids de uma folha, impõe e codifica em JPEG.
+
+    Devolve ``(jpeg, erros)``; fotos que não abrem ficam de fora da folha.
+    Uma tarefa por folha: só os Polaroids de uma folha ficam na memória por vez.
+    """
+    fotos, tamanho_cm, folha_cm, colunas, linhas, dpi, cor_borda = item
+    alvo = (cm_para_px(tamanho_cm[0], dpi), cm_para_px(tamanho_cm[1], dpi))
+    polaroids, erros = [], {}
+    for nome, dados, texto in fotos:
+        try:
+            # Decodificada já em escala reduzida: só precisa cobrir o Polaroid no DPI pedido
+            foto = abrir_imagem(io.BytesIO(dados), tamanho_alvo=alvo)
+        except ImagemRejeitada as e:
+            erros[nome] = str(e)
+            continue
+        polaroids.append(polaroid_para_impressao(foto, texto, tamanho_cm, dpi, cor_borda))
+    folha = impor_polaroids(polaroids, tamanho_cm, folha_cm, colunas, linhas, dpi)
+    buf = io.BytesIO()
+    folha.save(buf, format="JPEG", quality=95, dpi=(dpi, dpi), icc_profile=perfil_saida_bytes())
+    BYTES_CODIFICADOS.inc(buf.tell(), ferramenta="folha_polaroid")
+    return buf.getvalue(), erros
+
+# Versão do código que gera cada saída: qualquer mudança invalida o cache em disco
+VERSAO_FOLHA_3X4 = versao_codigo(abrir_imagem, rotacionar_imagem, redimensionar_e_recortar, recortar_no_rosto, janela_no_rosto, redimensionar, backend_ativo(), assinatura(), preparar_foto_3x4, compilar, renderizar, montar_folha_mista, montar_folha_3x4, folha_3x4_jpeg)
+VERSAO_POLAROID = versao_codigo(abrir_imagem, rotacionar_imagem, redimensionar_e_recortar, redimensionar, backend_ativo(), assinatura(), criar_polaroid, polaroid_jpeg)
+
 # ------------------- INTERFACE STREAMLIT -------------------
 
 st.set_page_config(
@@ -173,7 +357,7 @@ if 'rotacao_polaroid' not in st.session_state:
     st.session_state.rotacao_polaroid = 0
 
 # Criar abas
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["Gerador de Fotos 3x4", "Modelo Polaroid", "Bibliotecas", "Como Usar", "Sobre o Projeto"])
+tab1, tab_lote, tab2, tab_polaroid_lote, tab3, tab4, tab5 = st.tabs(["Gerador de Fotos 3x4", "Lote 3x4", "Modelo Polaroid", "Polaroids em Lote", "Bibliotecas", "Como Usar", "Sobre o Projeto"])
 
 with tab1:
     st.title("Gerador de Fotos 3x4 em Folha 10x15 📸")
@@ -181,18 +365,30 @@ with tab1:
     col1, col2 = st.columns(2)
     
     with col1:
-        uploaded_file = st.file_uploader("Envie sua foto", type=["jpg", "jpeg", "png"], key="uploader_3x4")
+        uploaded_file = primeira_foto(
+            st.file_uploader("Envie sua foto", type=TIPOS_UPLOAD, key="uploader_3x4"), CAIXA_3X4_PX
+        )
         
+        # Sonda o cabeçalho antes de decodificar; a orientação EXIF já vem aplicada
+        foto = None
         if uploaded_file:
-            foto = Image.open(uploaded_file).convert("RGB")
-            
-            # Corrigir rotação automática
-            foto = corrigir_rotacao(foto)
-            
+            try:
+                foto = abrir_imagem(uploaded_file)
+            except ImagemRejeitada as e:
+                st.error(f"Não foi possível usar esta foto: {e}")
+        
+        if foto is not None:
             # Opções de personalização
             st.subheader("Opções de Personalização")
             borda = st.checkbox("Adicionar borda branca em cada foto", value=True)
             espacamento = st.slider("Espaçamento entre fotos (pixels)", 0, 20, 0)
+            centralizar = st.checkbox(
+                "Centralizar no rosto (automático)",
+                value=detector_disponivel(),
+                disabled=not detector_disponivel(),
+                help="Enquadra o rosto como numa foto de documento em vez de recortar o centro. "
+                     "Requer o detector de rostos do OpenCV no servidor."
+            )
             
             # Controles de rotação com botões para 90, 180 e 270 graus
             st.subheader("Controles de Rotação")
@@ -219,19 +415,30 @@ with tab1:
                 foto = rotacionar_imagem(foto, st.session_state.rotacao)
                 st.info(f"Foto rotacionada em {st.session_state.rotacao} graus")
             
+            # Detecção numa cópia pequena da foto; fica em cache por foto + rotação
+            rosto = None
+            if centralizar:
+                rosto = localizar_rosto(foto, chave=f"{hash_upload(uploaded_file)}:{st.session_state.rotacao}")
+                if rosto is None:
+                    st.caption("Nenhum rosto encontrado: usando o recorte centralizado.")
+            
             col1_1, col1_2 = st.columns(2)
             with col1_1:
                 st.image(foto, caption="Sua foto (após ajustes)", use_column_width=True)
     
     with col2:
-        if uploaded_file:
-            folha = montar_folha_3x4(foto, borda=borda, espacamento=espacamento)
-            st.image(folha, caption="Prévia da folha 10x15 com fotos 3x4", use_column_width=True)
-            
-            # Preparar arquivo para download
-            buf = io.BytesIO()
-            folha.save(buf, format="JPEG", quality=100, dpi=(300, 300))
-            byte_im = buf.getvalue()
+        if foto is not None:
+            # Mesma foto + mesmos ajustes = mesma folha: servida do cache em disco
+            byte_im, do_cache = cache_compartilhado().obter_ou_gerar(
+                "folha_3x4",
+                hash_upload(uploaded_file),
+                {"rotacao": st.session_state.rotacao, "borda": borda, "espacamento": espacamento, "dpi": 300, "rosto": rosto},
+                VERSAO_FOLHA_3X4,
+                lambda: folha_3x4_jpeg(foto, borda, espacamento, rosto)
+            )
+            st.image(byte_im, caption="Prévia da folha 10x15 com fotos 3x4", use_column_width=True)
+            if do_cache:
+                st.caption("⚡ Folha reaproveitada do cache de impressões.")
             
             st.download_button(
                 label="📥 Baixar arquivo pronto (10x15 cm)",
@@ -246,20 +453,158 @@ with tab1:
         else:
             st.info("👈 Faça upload de uma foto para gerar sua folha de fotos 3x4")
 
+with tab_lote:
+    st.title("Fotos 3x4 em Lote (várias pessoas) 🏫")
+    st.write(
+        "Para escolas e empresas: envie as fotos de todas as pessoas, defina quantas "
+        "cópias cada uma precisa e baixe todas as folhas 10x15 de uma vez. Pessoas "
+        "diferentes dividem a mesma folha (ex.: 5 + 5) para não sobrar espaço."
+    )
+
+    arquivos_lote = expandir_pdfs(st.file_uploader(
+        "Envie as fotos", type=TIPOS_UPLOAD, accept_multiple_files=True, key="uploader_lote"
+    ) or [], CAIXA_3X4_PX)
+
+    if not arquivos_lote:
+        st.info("👆 Envie as fotos do lote (uma por pessoa)")
+    else:
+        if "id_sessao" not in st.session_state:
+            st.session_state.id_sessao = uuid.uuid4().hex
+
+        col_lote1, col_lote2 = st.columns(2)
+        with col_lote1:
+            copias_padrao = st.number_input("Cópias por pessoa", 1, 50, 10, key="copias_padrao_lote")
+            borda_lote = st.checkbox("Adicionar borda branca em cada foto", value=True, key="borda_lote")
+            centralizar_lote = st.checkbox(
+                "Centralizar no rosto (automático)",
+                value=detector_disponivel(),
+                disabled=not detector_disponivel(),
+                key="centralizar_lote",
+            )
+            espacamento_lote = st.slider("Espaçamento entre fotos (pixels)", 0, 20, 0, key="espacamento_lote")
+            formato_lote = st.radio("Baixar como", ["PDF (uma página por folha)", "ZIP de JPEGs"], key="formato_lote")
+        with col_lote2:
+            # A tabela recomeça quando muda o número padrão de cópias
+            tabela = st.data_editor(
+                pd.DataFrame({"Foto": [a.name for a in arquivos_lote], "Cópias": copias_padrao}),
+                column_config={"Cópias": st.column_config.NumberColumn(min_value=0, max_value=100, step=1)},
+                disabled=["Foto"],
+                hide_index=True,
+                key=f"tabela_lote_{copias_padrao}_{len(arquivos_lote)}",
+            )
+
+        # Mesma foto enviada duas vezes vira uma pessoa só (soma as cópias)
+        pedidos, nomes, dados_por_chave = {}, {}, {}
+        for arquivo, copias in zip(arquivos_lote, tabela["Cópias"]):
+            chave_foto = hash_upload(arquivo)
+            pedidos[chave_foto] = pedidos.get(chave_foto, 0) + int(copias or 0)
+            nomes.setdefault(chave_foto, arquivo.name)
+            dados_por_chave.setdefault(chave_foto, arquivo)
+        pedidos = [(c, n) for c, n in pedidos.items() if n > 0]
+        total_fotos = sum(n for _, n in pedidos)
+        st.caption(f"{len(pedidos)} pessoas, {total_fotos} fotos → {math.ceil(total_fotos / FOTOS_POR_FOLHA)} folhas 10x15")
+
+        chave_lote = (tuple(pedidos), borda_lote, espacamento_lote, centralizar_lote)
+        lote = st.session_state.get("lote_3x4")
+
+        if st.button("🖨️ Gerar folhas do lote", type="primary", disabled=not pedidos):
+            if lote is not None:
+                lote["trabalho"].cancelar()
+            chaves = [c for c, _ in pedidos]
+            # Etapa 1: recortar cada pessoa em paralelo; a etapa 2 (folhas) é enfileirada ao fim dela
+            trabalho = fila_compartilhada().submeter(
+                st.session_state.id_sessao,
+                chave_lote,
+                preparar_foto_lote,
+                [(dados_por_chave[c].getvalue(), borda_lote, centralizar_lote, f"lote:{c}") for c in chaves],
+            )
+            lote = {
+                "chave": chave_lote,
+                "sessao": st.session_state.id_sessao,
+                "pedidos": pedidos,
+                "chaves": chaves,
+                "nomes": nomes,
+                "espacamento": espacamento_lote,
+                "borda": borda_lote,
+                "etapa": "fotos",
+                "erros": {},
+                "inicio": trabalho.inicio,
+                "trabalho": trabalho,
+            }
+            st.session_state.lote_3x4 = lote
+
+        if lote is not None and lote["chave"] == chave_lote:
+            avancar_lote(lote)
+
+            @st.fragment(run_every=0.5)
+            def acompanhar_lote():
+                """Progresso das duas etapas sem reexecutar a página inteira"""
+                avancar_lote(lote)
+                trabalho = lote["trabalho"]
+                if trabalho.pronto and lote["etapa"] == "folhas":
+                    st.rerun()
+                etapa = "Recortando fotos" if lote["etapa"] == "fotos" else "Montando folhas"
+                st.progress(trabalho.progresso, text=f"{etapa}: {trabalho.concluidos} de {trabalho.total}")
+
+            trabalho = lote["trabalho"]
+            if trabalho.erro is not None:
+                st.error(f"Erro ao gerar o lote: {trabalho.erro}")
+            elif not (trabalho.pronto and lote["etapa"] == "folhas"):
+                acompanhar_lote()
+            else:
+                for nome, erro in lote["erros"].items():
+                    st.warning(f"{nome} ficou de fora: {erro}")
+                folhas = trabalho.resultados
+                if not folhas:
+                    st.warning("Nenhuma foto do lote pôde ser usada: nenhuma folha foi gerada.")
+                else:
+                    minutos = (trabalho.fim - lote["inicio"]) / 60
+                    col_m1, col_m2, col_m3 = st.columns(3)
+                    col_m1.metric("Folhas", len(folhas))
+                    col_m2.metric("Tempo total", f"{minutos * 60:.1f} s")
+                    col_m3.metric("Vazão", f"{len(folhas) / minutos:.0f} folhas/min" if minutos > 0 else "—")
+
+                    st.image(folhas[0], caption="Primeira folha do lote", use_container_width=True)
+                    if formato_lote.startswith("PDF"):
+                        st.download_button(
+                            "📥 Baixar PDF do lote",
+                            data=pdf_das_folhas(folhas),
+                            file_name="lote_fotos_3x4.pdf",
+                            mime="application/pdf",
+                            use_container_width=True,
+                            key="download_lote",
+                        )
+                    else:
+                        st.download_button(
+                            "📥 Baixar ZIP do lote",
+                            data=zip_das_folhas(folhas),
+                            file_name="lote_fotos_3x4.zip",
+                            mime="application/zip",
+                            use_container_width=True,
+                            key="download_lote",
+                        )
+        elif lote is not None:
+            st.info("As opções mudaram: clique em **Gerar folhas do lote** para refazer.")
+
 with tab2:
     st.title("Criador de Fotos Estilo Polaroid 📸")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        uploaded_file_polaroid = st.file_uploader("Envie sua foto", type=["jpg", "jpeg", "png"], key="uploader_polaroid")
+        # Polaroid de tela: 800x1000 px (tamanho padrão de criar_polaroid)
+        uploaded_file_polaroid = primeira_foto(
+            st.file_uploader("Envie sua foto", type=TIPOS_UPLOAD, key="uploader_polaroid"), (800, 1000)
+        )
         
+        foto_polaroid = None
         if uploaded_file_polaroid:
-            foto_polaroid = Image.open(uploaded_file_polaroid).convert("RGB")
-            
-            # Corrigir rotação automática
-            foto_polaroid = corrigir_rotacao(foto_polaroid)
-            
+            try:
+                foto_polaroid = abrir_imagem(uploaded_file_polaroid)
+            except ImagemRejeitada as e:
+                st.error(f"Não foi possível usar esta foto: {e}")
+        
+        if foto_polaroid is not None:
             # Opções de personalização do Polaroid
             st.subheader("Personalize seu Polaroid")
             texto_polaroid = st.text_input("Legenda (opcional)", max_chars=30, 
@@ -301,15 +646,18 @@ with tab2:
             st.image(foto_polaroid, caption="Sua foto (após ajustes)", use_column_width=True)
     
     with col2:
-        if uploaded_file_polaroid:
-            polaroid = criar_polaroid(foto_polaroid, texto=texto_polaroid, 
-                                     tamanho=tamanho, cor_borda=cor_borda)
-            st.image(polaroid, caption="Seu Polaroid", use_column_width=True)
-            
-            # Preparar arquivo para download
-            buf_polaroid = io.BytesIO()
-            polaroid.save(buf_polaroid, format="JPEG", quality=95)
-            byte_im_polaroid = buf_polaroid.getvalue()
+        if foto_polaroid is not None:
+            byte_im_polaroid, do_cache = cache_compartilhado().obter_ou_gerar(
+                "polaroid",
+                hash_upload(uploaded_file_polaroid),
+                {"rotacao": st.session_state.rotacao_polaroid, "texto": texto_polaroid,
+                 "tamanho": tamanho, "cor_borda": cor_borda},
+                VERSAO_POLAROID,
+                lambda: polaroid_jpeg(foto_polaroid, texto_polaroid, tamanho, cor_borda)
+            )
+            st.image(byte_im_polaroid, caption="Seu Polaroid", use_column_width=True)
+            if do_cache:
+                st.caption("⚡ Polaroid reaproveitado do cache de impressões.")
             
             st.download_button(
                 label="📥 Baixar Polaroid",
@@ -332,6 +680,124 @@ with tab2:
             draw.text((300, 700), "Sua foto aqui", fill="#666666")
             st.image(exemplo_img, caption="Exemplo de layout Polaroid", use_column_width=True)
 
+with tab_polaroid_lote:
+    st.title("Polaroids em Lote para Impressão 🎉")
+    st.write(
+        "Para eventos: envie todas as fotos, escreva a legenda de cada uma e baixe um PDF "
+        "com os Polaroids no tamanho real, várias por folha e com marcas de corte."
+    )
+
+    arquivos_polaroid = st.file_uploader(
+        "Envie as fotos", type=TIPOS_UPLOAD, accept_multiple_files=True, key="uploader_polaroid_lote"
+    )
+
+    if not arquivos_polaroid:
+        st.info("👆 Envie as fotos do evento (um Polaroid por foto)")
+    else:
+        if "id_sessao" not in st.session_state:
+            st.session_state.id_sessao = uuid.uuid4().hex
+
+        col_pl1, col_pl2 = st.columns(2)
+        with col_pl1:
+            modelo_polaroid = st.selectbox("Formato do Polaroid", list(TAMANHOS_POLAROID_CM), key="modelo_polaroid_lote")
+            folha_polaroid = st.selectbox("Papel", list(FOLHAS_POLAROID_CM), key="folha_polaroid_lote")
+            dpi_polaroid = st.select_slider("Resolução (DPI)", [150, 200, 300], value=300, key="dpi_polaroid_lote")
+            cor_borda_lote = st.color_picker("Cor da borda", "#FFFFFF", key="cor_borda_polaroid_lote")
+        # Páginas de PDF rasterizadas no tamanho do Polaroid no DPI escolhido
+        tamanho_cm = TAMANHOS_POLAROID_CM[modelo_polaroid]
+        arquivos_polaroid = expandir_pdfs(
+            arquivos_polaroid, (cm_para_px(tamanho_cm[0], dpi_polaroid), cm_para_px(tamanho_cm[1], dpi_polaroid))
+        )
+        with col_pl2:
+            tabela_polaroid = st.data_editor(
+                pd.DataFrame({"Foto": [a.name for a in arquivos_polaroid], "Legenda": "", "Cópias": 1}),
+                column_config={
+                    "Legenda": st.column_config.TextColumn(max_chars=30),
+                    "Cópias": st.column_config.NumberColumn(min_value=0, max_value=100, step=1),
+                },
+                disabled=["Foto"],
+                hide_index=True,
+                key=f"tabela_polaroid_lote_{len(arquivos_polaroid)}",
+            )
+
+        folha_cm, colunas_pl, linhas_pl = grade_polaroid(tamanho_cm, FOLHAS_POLAROID_CM[folha_polaroid])
+        por_folha = colunas_pl * linhas_pl
+
+        sequencia, pedidos_polaroid = [], []
+        for arquivo, legenda, copias in zip(arquivos_polaroid, tabela_polaroid["Legenda"], tabela_polaroid["Cópias"]):
+            legenda, copias = str(legenda or ""), int(copias or 0)
+            pedidos_polaroid.append((hash_upload(arquivo), legenda, copias))
+            sequencia += [(arquivo.name, arquivo.getvalue(), legenda)] * copias
+
+        if por_folha == 0:
+            st.error(f"O formato {modelo_polaroid} não cabe no papel {folha_polaroid} com as margens de corte.")
+        else:
+            total_folhas = math.ceil(len(sequencia) / por_folha)
+            st.caption(
+                f"{len(sequencia)} Polaroids, {por_folha} por folha ({colunas_pl} × {linhas_pl}, "
+                f"papel {'em pé' if folha_cm[0] < folha_cm[1] else 'deitado'}) → {total_folhas} folhas"
+            )
+
+        chave_polaroid = (tuple(pedidos_polaroid), modelo_polaroid, folha_polaroid, dpi_polaroid, cor_borda_lote)
+        lote_pl = st.session_state.get("lote_polaroid")
+
+        if st.button("🖨️ Gerar PDF dos Polaroids", type="primary", disabled=not sequencia or por_folha == 0):
+            if lote_pl is not None:
+                lote_pl["trabalho"].cancelar()
+            # Uma tarefa por folha, distribuídas entre os núcleos pela fila compartilhada
+            folhas_pl = [
+                (sequencia[i:i + por_folha], tamanho_cm, folha_cm, colunas_pl, linhas_pl, dpi_polaroid, cor_borda_lote)
+                for i in range(0, len(sequencia), por_folha)
+            ]
+            lote_pl = {
+                "chave": chave_polaroid,
+                "folha_cm": folha_cm,
+                "total": len(sequencia),
+                "trabalho": fila_compartilhada().submeter(
+                    st.session_state.id_sessao, chave_polaroid, folha_polaroid_jpeg, folhas_pl
+                ),
+            }
+            st.session_state.lote_polaroid = lote_pl
+
+        if lote_pl is not None and lote_pl["chave"] == chave_polaroid:
+            @st.fragment(run_every=0.5)
+            def acompanhar_polaroids():
+                """Progresso por folha sem reexecutar a página inteira"""
+                trabalho = lote_pl["trabalho"]
+                if trabalho.pronto:
+                    st.rerun()
+                st.progress(trabalho.progresso, text=f"Montando folhas: {trabalho.concluidos} de {trabalho.total}")
+
+            trabalho = lote_pl["trabalho"]
+            if trabalho.erro is not None:
+                st.error(f"Erro ao gerar os Polaroids: {trabalho.erro}")
+            elif not trabalho.pronto:
+                acompanhar_polaroids()
+            else:
+                folhas_pl = [jpeg for jpeg, _ in trabalho.resultados]
+                erros_pl = {}
+                for _, erros in trabalho.resultados:
+                    erros_pl.update(erros)
+                for nome, erro in erros_pl.items():
+                    st.warning(f"{nome} ficou de fora: {erro}")
+                col_m1, col_m2, col_m3 = st.columns(3)
+                col_m1.metric("Folhas", len(folhas_pl))
+                col_m2.metric("Tempo total", f"{trabalho.duracao:.1f} s")
+                col_m3.metric("Vazão", f"{lote_pl['total'] / trabalho.duracao * 60:.0f} Polaroids/min" if trabalho.duracao > 0 else "—")
+
+                st.image(folhas_pl[0], caption="Primeira folha", use_container_width=True)
+                st.download_button(
+                    "📥 Baixar PDF dos Polaroids",
+                    data=pdf_das_folhas(folhas_pl, tamanho_cm=lote_pl["folha_cm"]),
+                    file_name="polaroids.pdf",
+                    mime="application/pdf",
+                    use_container_width=True,
+                    key="download_polaroid_lote",
+                )
+                st.info(f"💡 Imprima em tamanho real (100%, sem ajustar à página) a {dpi_polaroid} DPI.")
+        elif lote_pl is not None:
+            st.info("As opções mudaram: clique em **Gerar PDF dos Polaroids** para refazer.")
+
 with tab3:
     st.header("Gerenciador de Bibliotecas")
     st.info("Esta aba verifica e instala bibliotecas necessárias para outros aplicativos.")
@@ -339,11 +805,10 @@ with tab3:
     st.subheader("Bibliotecas Necessárias")
     st.write("As seguintes bibliotecas são necessárias para outros aplicativos:")
     
-    for i, lib in enumerate(REQUIRED_LIBRARIES):
-        try:
-            importlib.import_module(lib)
-            st.success(f"{i+1}. {lib} ✓ (Instalada)")
-        except ImportError:
+    for i, (lib, versao) in enumerate(verificar_bibliotecas().items()):
+        if versao:
+            st.success(f"{i+1}. {lib} ✓ (Instalada, versão {versao})")
+        else:
             st.error(f"{i+1}. {lib} ✗ (Ausente)")
     
     # Verificar e instalar bibliotecas ausentes
@@ -376,6 +841,13 @@ with tab4:
     4. **Visualize**: Veja a prévia da folha com 10 fotos 3x4
     5. **Baixe**: Clique no botão de download para salvar a imagem pronta para impressão
     
+    ### 🏫 Guia Rápido: Lote 3x4 (escolas e empresas)
+    
+    1. **Envie todas as fotos**: Na aba "Lote 3x4", selecione as fotos (uma por pessoa)
+    2. **Defina as cópias**: Ajuste o número padrão ou edite a quantidade de cada pessoa na tabela
+    3. **Gere**: As fotos são recortadas em paralelo e agrupadas em folhas de 10 (pessoas podem dividir a folha)
+    4. **Baixe**: Um PDF com uma página por folha ou um ZIP com os JPEGs
+    
     ### 📸 Guia Rápido: Fotos Polaroid
     
     1. **Envie sua foto**: Na aba "Modelo Polaroid", faça upload de uma foto
@@ -387,6 +859,13 @@ with tab4:
     4. **Visualize**: Veja a prévia do seu Polaroid
     5. **Baixe**: Clique no botão de download para salvar seu Polaroid
     
+    ### 🎉 Guia Rápido: Polaroids em Lote (eventos)
+    
+    1. **Envie todas as fotos**: Na aba "Polaroids em Lote", selecione as fotos do evento
+    2. **Escreva as legendas**: Cada foto tem sua legenda e seu número de cópias na tabela
+    3. **Escolha formato e papel**: Clássico, Quadrado ou Mini, em A4 ou 10x15, no DPI da impressora
+    4. **Baixe**: Um PDF com vários Polaroids por folha, em tamanho real e com marcas de corte
+    
     ### 🎯 Dicas para Melhores Resultados:
     - Use uma foto com fundo neutro (branco ou claro) para fotos 3x4
     - Para Polaroids, fotos coloridas e com boa iluminação funcionam melhor
@@ -423,6 +902,7 @@ with tab5:
     - Personalização de cor da borda
     - Adição de legendas personalizadas
     - Opções de tamanho (Pequeno, Médio, Grande)
+    - Lote para eventos: Polaroids no tamanho real (A4 ou 10x15), com legenda por foto e marcas de corte
     - Controles de rotação para ajuste preciso
 
     ### Gerenciador de Bibliotecas:
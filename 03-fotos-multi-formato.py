@@ -8,6 +8,10 @@ import streamlit as st
 from PIL import Image, ImageOps, ImageDraw
 import io
 import math
+from nucleo.cores import perfil_saida_bytes
+from nucleo.reamostragem import redimensionar
+from nucleo.resolucao import mostrar_plano, planejar
+from nucleo.sonda import abrir_imagem
 
 st.set_page_config(page_title="Fotos Multi-Formato", layout="centered")
 st.title("🖼️ Fotos Multi-Formato")
@@ -34,7 +38,7 @@ def make_print_image(img, target_size_px, background_color=(255, 255, 255)):
         new_width = target_size_px[0]
         new_height = int(new_width / img_ratio)
     
-    img_resized = img.resize((new_width, new_height), Image.LANCZOS)
+    img_resized = redimensionar(img, (new_width, new_height))
     
     # Cria fundo branco
     background = Image.new('RGB', target_size_px, background_color)
@@ -88,6 +92,12 @@ DPI = st.sidebar.select_slider(
     value=300,
     help="Maior DPI = melhor qualidade para impressão"
 )
+limitar_dpi = st.sidebar.checkbox(
+    "Limitar ao que a foto suporta",
+    value=True,
+    help="Não amplia a foto além da resolução que ela tem: a folha sai no maior DPI efetivo entre os "
+         "formatos (o do menor formato), sem passar do DPI escolhido"
+)
 
 background_color = st.sidebar.color_picker(
     "Cor do fundo",
@@ -115,7 +125,7 @@ uploaded_file = st.file_uploader(
 if uploaded_file:
     try:
         # Carregar imagem
-        original_img = Image.open(uploaded_file).convert('RGB')
+        original_img = abrir_imagem(uploaded_file)
         
         col1, col2 = st.columns(2)
         
@@ -151,13 +161,22 @@ if uploaded_file:
         if formatos_selecionados:
             st.subheader("🖼️ Prévia dos Formatos")
             
+            # Cada formato recorta a foto para preencher o espaço: o DPI efetivo decide a resolução
+            plano = planejar(
+                "multi_formato", DPI,
+                [(formato_nome, original_img.size, dimensoes, "cobrir") for formato_nome, dimensoes in formatos_selecionados],
+                (10, 15), limitar=limitar_dpi,
+            )
+            dpi_saida = plano["dpi"]
+            mostrar_plano(plano)
+            
             # Processar cada formato selecionado
             imagens_processadas = []
             
             for formato_nome, dimensoes in formatos_selecionados:
                 largura_cm, altura_cm = dimensoes
-                largura_px = cm_to_px(largura_cm, DPI)
-                altura_px = cm_to_px(altura_cm, DPI)
+                largura_px = cm_to_px(largura_cm, dpi_saida)
+                altura_px = cm_to_px(altura_cm, dpi_saida)
                 
                 # Processar imagem para o formato
                 img_formatada = make_print_image(
@@ -169,7 +188,7 @@ if uploaded_file:
                 imagens_processadas.append((img_formatada, formato_nome, (largura_cm, altura_cm)))
             
             # Criar layout da folha 10x15
-            folha_10x15 = create_layout_10x15(imagens_processadas, DPI)
+            folha_10x15 = create_layout_10x15(imagens_processadas, dpi_saida)
             
             st.image(folha_10x15, caption="Layout na folha 10×15 cm", use_column_width=True)
             
@@ -177,13 +196,13 @@ if uploaded_file:
             
             # Download da folha completa
             buf_folha = io.BytesIO()
-            folha_10x15.save(buf_folha, format='JPEG', quality=95, dpi=(DPI, DPI))
+            folha_10x15.save(buf_folha, format='JPEG', quality=95, dpi=(dpi_saida, dpi_saida), icc_profile=perfil_saida_bytes())
             buf_folha.seek(0)
             
             st.download_button(
                 "📄 Baixar Folha 10×15 Completa",
                 buf_folha,
-                f"folha_fotos_{DPI}dpi.jpg",
+                f"folha_fotos_{dpi_saida}dpi.jpg",
                 "image/jpeg",
                 help="Baixe a folha completa com todos os formatos selecionados"
             )
@@ -196,10 +215,10 @@ if uploaded_file:
                 col_idx = idx % 3
                 with cols_download[col_idx]:
                     buf_individual = io.BytesIO()
-                    img.save(buf_individual, format='JPEG', quality=95, dpi=(DPI, DPI))
+                    img.save(buf_individual, format='JPEG', quality=95, dpi=(dpi_saida, dpi_saida), icc_profile=perfil_saida_bytes())
                     buf_individual.seek(0)
                     
-                    nome_arquivo = f"foto_{formato_nome.replace(' ', '_').replace('×', 'x')}_{DPI}dpi.jpg"
+                    nome_arquivo = f"foto_{formato_nome.replace(' ', '_').replace('×', 'x')}_{dpi_saida}dpi.jpg"
                     
                     st.download_button(
                         f"⬇️ {formato_nome}",
@@ -213,9 +232,9 @@ if uploaded_file:
             with st.expander("📊 Informações Técnicas"):
                 st.markdown(f"""
                 **Configurações aplicadas:**
-                - Resolução: {DPI} DPI
+                - Resolução: {dpi_saida} DPI
                 - Cor do fundo: {background_color}
-                - Folha base: 10×15 cm ({cm_to_px(10, DPI)} × {cm_to_px(15, DPI)} pixels)
+                - Folha base: 10×15 cm ({cm_to_px(10, dpi_saida)} × {cm_to_px(15, dpi_saida)} pixels)
                 - Formatos gerados: {len(formatos_selecionados)}
                 
                 **Formatos incluídos:**
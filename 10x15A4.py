@@ -1,7 +1,18 @@
 import streamlit as st
 from PIL import Image
+import io
 import tempfile
 import os
+import uuid
+from nucleo.cores import cmyk_disponivel, para_cmyk
+from nucleo.fotos_pdf import TIPOS_UPLOAD, expandir_pdfs
+from nucleo.hashes import hash_upload
+from nucleo.metricas import medido
+from nucleo.modelos import MODELOS, compilar, renderizar
+from nucleo.previa import previa
+from nucleo.reamostragem import redimensionar
+from nucleo.sonda import abrir_imagem, sondar_imagem, validar_imagem, ImagemRejeitada
+from nucleo.trabalhos import fila_compartilhada
 
 # =============================
 # Configuração da página
@@ -14,7 +25,7 @@ st.set_page_config(
 st.title("📸 Fotos 10×15 em A4")
 
 st.write(
-    "Envie suas fotos. O sistema monta automaticamente "
+    "Envie suas fotos (ou PDFs com as fotos). O sistema monta automaticamente "
     "**4 fotos 10×15 por folha A4**, com pré-visualização e PDF pronto."
 )
 
@@ -23,7 +34,7 @@ st.write(
 # =============================
 files = st.file_uploader(
     "Selecione as fotos",
-    type=["jpg", "jpeg", "png"],
+    type=TIPOS_UPLOAD,
     accept_multiple_files=True
 )
 
@@ -35,63 +46,144 @@ if not files:
 # Constantes
 # =============================
 DPI = 300
+DPI_RASCUNHO = 40
 
-def cm_to_px(cm):
-    return int((cm / 2.54) * DPI)
+MODELO_PAGINA = MODELOS["10x15_em_a4"]
+
+# PDFs viram fotos: imagens embutidas saem como estão; páginas de documento
+# são rasterizadas no DPI que o espaço 10x15 precisa
+files = expandir_pdfs(files, compilar(MODELO_PAGINA, DPI)["slots"][0][2:])
 
-A4_W, A4_H = cm_to_px(21), cm_to_px(29.7)
-PHOTO_W, PHOTO_H = cm_to_px(10), cm_to_px(15)
 
 # =============================
-# Processar imagens
+# Montagem de uma página A4 (roda em segundo plano)
 # =============================
-photos = []
-
-for f in files:
-    img = Image.open(f).convert("RGB")
-    img = img.resize((PHOTO_W, PHOTO_H), Image.LANCZOS)
-    photos.append(img)
+def ajuste_rascunho(img, tamanho):
+    return img.resize(tamanho, Image.BILINEAR)
+
+def compor_pagina(lote, dpi=DPI, rascunho=False):
+    """Decodifica e cola até 4 fotos em uma folha A4 (modelo ``10x15_em_a4``).
+
+    Com ``rascunho`` a folha sai em baixa resolução e com filtro bilinear,
+    para a pré-visualização imediata; a versão final roda em segundo plano.
+    """
+    pagina = compilar(MODELO_PAGINA, dpi)
+    _, _, photo_w, photo_h = pagina["slots"][0]
+    # JPEGs grandes já são decodificados em escala reduzida (>= 10x15 no DPI pedido)
+    # (gerador: uma foto decodificada por vez)
+    fotos = (abrir_imagem(io.BytesIO(dados), tamanho_alvo=(photo_w, photo_h)) for dados in lote)
+    return renderizar(pagina, fotos, ajustar=ajuste_rascunho if rascunho else redimensionar)
+
+@medido("compor_pagina_10x15")
+def compor_pagina_final(lote):
+    """Tarefa da fila: a página no DPI final (os rascunhos não entram nas métricas)"""
+    return compor_pagina(lote)
 
 # =============================
-# Criar páginas A4
+# Validar fotos (só o cabeçalho)
 # =============================
-pages = []
+validos = []
 
-for i in range(0, len(photos), 4):
-    page = Image.new("RGB", (A4_W, A4_H), "white")
-    batch = photos[i:i + 4]
-
-    offset_x = (A4_W - (PHOTO_W * 2)) // 2
-    offset_y = (A4_H - (PHOTO_H * 2)) // 2
+for f in files:
+    try:
+        validar_imagem(sondar_imagem(f))
+    except ImagemRejeitada as e:
+        st.error(f"{f.name}: {e}")
+        continue
+    validos.append(f)
+
+if not validos:
+    st.stop()
 
-    positions = [
-        (0, 0),
-        (PHOTO_W, 0),
-        (0, PHOTO_H),
-        (PHOTO_W, PHOTO_H)
+# =============================
+# Enviar para a fila de renderização
+# =============================
+# O trabalho é identificado pelo conteúdo das fotos: reruns causados por
+# outros widgets reaproveitam o trabalho em andamento, e um upload novo
+# cancela o anterior.
+if "id_sessao" not in st.session_state:
+    st.session_state.id_sessao = uuid.uuid4().hex
+
+chave = tuple(hash_upload(f) for f in validos)
+trabalho = st.session_state.get("trabalho_10x15")
+
+if trabalho is None or trabalho.chave != chave:
+    if trabalho is not None:
+        trabalho.cancelar()
+    lotes = [
+        [f.getvalue() for f in validos[i:i + 4]]
+        for i in range(0, len(validos), 4)
     ]
+    trabalho = fila_compartilhada().submeter(st.session_state.id_sessao, chave, compor_pagina_final, lotes)
+    st.session_state.trabalho_10x15 = trabalho
 
-    for img, (x, y) in zip(batch, positions):
-        page.paste(img, (x + offset_x, y + offset_y))
-
-    pages.append(page)
+if trabalho.erro is not None:
+    st.error(f"Erro ao montar as folhas: {trabalho.erro}")
+    st.stop()
 
 # =============================
-# Pré-visualização
+# Pré-visualização progressiva
 # =============================
-st.subheader("👀 Pré-visualização")
+# Cada página aparece primeiro como rascunho (decodificação reduzida) e é
+# trocada pela versão final assim que a fila termina de montá-la.
+previas = st.session_state.get("previas_10x15")
+if previas is None or previas["chave"] != chave:
+    previas = {"chave": chave, "rascunhos": {}, "finais": {}}
+    st.session_state.previas_10x15 = previas
+
+def mostrar_paginas():
+    for i in range(trabalho.total):
+        pagina = trabalho.resultados[i]
+        st.markdown(f"**Página {i + 1}**")
+        if pagina is not None:
+            if i not in previas["finais"]:
+                previas["finais"][i] = previa(pagina)
+            st.image(previas["finais"][i], use_container_width=True)
+        else:
+            if i not in previas["rascunhos"]:
+                lote = [f.getvalue() for f in validos[i * 4:i * 4 + 4]]
+                previas["rascunhos"][i] = compor_pagina(lote, dpi=DPI_RASCUNHO, rascunho=True)
+            st.image(previas["rascunhos"][i], caption="Rascunho: a versão final está sendo montada",
+                     use_container_width=True)
+
+@st.fragment(run_every=0.5)
+def acompanhar_trabalho():
+    """Atualiza o progresso e troca os rascunhos sem reexecutar a página inteira"""
+    if trabalho.pronto:
+        st.rerun()
+    st.progress(
+        trabalho.progresso,
+        text=f"Montando folhas: {trabalho.concluidos} de {trabalho.total}"
+    )
+    st.caption(f"{fila_compartilhada().pendentes()} páginas na fila do servidor.")
+    st.subheader("👀 Pré-visualização")
+    mostrar_paginas()
 
-for i, p in enumerate(pages, start=1):
-    st.markdown(f"**Página {i}**")
-    st.image(p, use_container_width=True)
+if not trabalho.pronto:
+    acompanhar_trabalho()
+    st.stop()
+
+pages = trabalho.resultados
+
+st.subheader("👀 Pré-visualização")
+mostrar_paginas()
 
 # =============================
 # Gerar PDF
 # =============================
+cmyk = st.checkbox(
+    "PDF em CMYK (gráfica)",
+    disabled=not cmyk_disponivel(),
+    help="Converte para o perfil CMYK da gráfica (configure RETRATOS_PERFIL_CMYK no servidor)"
+)
+
 if st.button("📄 Gerar PDF"):
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
         pdf_path = tmp.name
 
+    if cmyk:
+        pages = [para_cmyk(p) for p in pages]
+
     pages[0].save(
         pdf_path,
         save_all=True,
@@ -1,6 +1,9 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import io
+from nucleo.cores import perfil_saida_bytes
+from nucleo.recursos import fonte
+from nucleo.sonda import abrir_imagem, ImagemRejeitada
 
 st.set_page_config(page_title="Mosaico Tríptico", layout="centered")
 
@@ -30,7 +33,11 @@ if generate_btn:
         st.error("Por favor, envie **exatamente 3 fotos**.")
     else:
         # --- Abrir e redimensionar imagens ---
-        images = [Image.open(file).convert("RGB") for file in uploaded_files]
+        try:
+            images = [abrir_imagem(file) for file in uploaded_files]
+        except ImagemRejeitada as e:
+            st.error(f"Não foi possível usar uma das fotos: {e}")
+            st.stop()
 
         # Dimensões finais (20x15 cm) em pixels, assumindo 300 DPI (alta qualidade)
         cm_to_px = lambda cm: int(cm / 2.54 * 300)
@@ -56,10 +63,7 @@ if generate_btn:
 
         # --- Adicionar texto ---
         draw = ImageDraw.Draw(final_img)
-        try:
-            font = ImageFont.truetype("arial.ttf", 60)
-        except:
-            font = ImageFont.load_default()
+        font = fonte("arial.ttf", 60)
 
         if title:
             draw.text((final_img.width // 2, 30), title, fill="black", anchor="mm", font=font)
@@ -70,7 +74,7 @@ if generate_btn:
         st.image(final_img, caption="Pré-visualização do Mosaico", use_container_width=True)
 
         buf = io.BytesIO()
-        final_img.save(buf, format="JPEG", quality=95)
+        final_img.save(buf, format="JPEG", quality=95, icc_profile=perfil_saida_bytes())
         buf.seek(0)
         st.download_button(
             label="📥 Baixar Mosaico",
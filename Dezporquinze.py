@@ -1,59 +1,78 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import io
 import os
+import tempfile
+from nucleo.cache_disco import cache_compartilhado, versao_codigo
+from nucleo.cores import assinatura, cmyk_disponivel, para_cmyk, perfil_saida_bytes
+from nucleo.hashes import hash_upload
+from nucleo.metricas import medido
+from nucleo.modelos import MODELOS, compilar, renderizar
+from nucleo.reamostragem import backend_ativo, redimensionar
+from nucleo.resolucao import mostrar_plano, planejar
+from nucleo.faixas import abrir_em_faixas
+from nucleo.sonda import abrir_imagem, sondar_imagem, ImagemRejeitada
 
 def cm_to_pixels(cm, dpi=300):
     """Converte centímetros para pixels considerando DPI"""
     return int(cm * dpi / 2.54)
 
-def create_10x15_pdf(image_path, output_path):
-    """Cria um PDF A4 com a imagem no formato 10x15cm centralizada"""
+@medido("create_10x15_pdf")
+def create_10x15_pdf(image_path, output_path, dpi=300, cmyk=False):
+    """Cria um PDF A4 com a imagem no formato 10x15cm centralizada (em CMYK para a gráfica, se pedido)"""
     
-    # DPI para alta qualidade de impressão
-    dpi = 300
+    # Geometria (A4, foto centralizada, guias vermelhas e texto) vem do modelo
+    folha = compilar(MODELOS["10x15_centralizada_a4"], dpi)
+    _, _, img_width_px, img_height_px = folha["slots"][0]
     
-    # Tamanhos em pixels
-    a4_width_px = cm_to_pixels(21, dpi)  # A4 width: 21cm
-    a4_height_px = cm_to_pixels(29.7, dpi)  # A4 height: 29.7cm
-    img_width_px = cm_to_pixels(15, dpi)  # 15cm em pixels
-    img_height_px = cm_to_pixels(10, dpi)  # 10cm em pixels
+    # Carregar a imagem original (JPEG decodificado já em escala reduzida)
+    original_image = abrir_imagem(image_path, tamanho_alvo=(img_width_px, img_height_px))
     
-    # Criar imagem A4 em branco
-    a4_image = Image.new('RGB', (a4_width_px, a4_height_px), 'white')
-    draw = ImageDraw.Draw(a4_image)
-    
-    # Carregar e redimensionar a imagem original
-    original_image = Image.open(image_path)
-    
-    # Redimensionar mantendo a proporção para caber em 10x15cm
-    resized_image = original_image.resize((img_width_px, img_height_px), Image.LANCZOS)
-    
-    # Calcular posição para centralizar
-    x_pos = (a4_width_px - img_width_px) // 2
-    y_pos = (a4_height_px - img_height_px) // 2
-    
-    # Colar a imagem redimensionada no A4
-    a4_image.paste(resized_image, (x_pos, y_pos))
-    
-    # Adicionar guias de corte (linhas vermelhas)
-    draw.line([(x_pos, y_pos), (x_pos + img_width_px, y_pos)], fill='red', width=3)
-    draw.line([(x_pos, y_pos + img_height_px), (x_pos + img_width_px, y_pos + img_height_px)], fill='red', width=3)
-    draw.line([(x_pos, y_pos), (x_pos, y_pos + img_height_px)], fill='red', width=3)
-    draw.line([(x_pos + img_width_px, y_pos), (x_pos + img_width_px, y_pos + img_height_px)], fill='red', width=3)
-    
-    # Adicionar texto informativo
-    try:
-        # Tentar usar fonte padrão, se não conseguir, não adiciona texto
-        font = ImageFont.load_default()
-        draw.text((50, 50), "Imagem 10x15cm - Corte nas linhas vermelhas", fill='black', font=font)
-    except:
-        pass
+    # Redimensionar para 10x15cm, colar no A4 e desenhar as guias de corte
+    a4_image = renderizar(folha, [original_image])
     
     # Salvar como PDF
+    if cmyk:
+        a4_image = para_cmyk(a4_image)
     a4_image.save(output_path, "PDF", resolution=dpi)
     return output_path
 
+def gerar_pdf_10x15(image, dpi, cmyk=False):
+    """Bytes do PDF A4 com a imagem 10x15cm, usando arquivos temporários exclusivos"""
+    # Converter para RGB se necessário (para PNG com transparência); a imagem
+    # já chega reduzida, então o achatamento do alfa é barato
+    if image.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', image.size, 'white')
+        if image.mode in ('P', 'LA'):
+            image = image.convert('RGBA')
+        background.paste(image, mask=image.split()[-1])
+        image = background
+
+    with tempfile.TemporaryDirectory() as pasta:
+        temp_image_path = os.path.join(pasta, "temp_image.jpg")
+        # Já está no perfil de saída: embutido, não é convertido de novo ao reabrir
+        image.save(temp_image_path, "JPEG", quality=95, icc_profile=perfil_saida_bytes())
+
+        pdf_path = create_10x15_pdf(temp_image_path, os.path.join(pasta, "imagem_10x15cm.pdf"), dpi=dpi, cmyk=cmyk)
+
+        with open(pdf_path, "rb") as f:
+            return f.read()
+
+# Foto no maior DPI oferecido: uma única leitura serve para todos os DPIs
+TAMANHO_MAXIMO = (cm_to_pixels(15, 300), cm_to_pixels(10, 300))
+
+@st.cache_data(show_spinner="Lendo a imagem...", max_entries=4)
+def abrir_upload(hash_arquivo, _arquivo):
+    """Imagem já reduzida para o PDF e o tamanho original (TIFF/BMP lidos em faixas)"""
+    resultado = abrir_em_faixas(_arquivo, TAMANHO_MAXIMO)
+    if resultado is not None:
+        return resultado
+    info = sondar_imagem(_arquivo)
+    return abrir_imagem(_arquivo, modo=None, tamanho_alvo=TAMANHO_MAXIMO, info=info), info["tamanho_exibido"]
+
+# Versão do código que gera o PDF: qualquer mudança invalida o cache em disco
+VERSAO_PDF_10X15 = versao_codigo(abrir_imagem, abrir_em_faixas, create_10x15_pdf, compilar, renderizar, redimensionar, backend_ativo(), assinatura(), gerar_pdf_10x15)
+
 def main():
     st.set_page_config(
         page_title="Conversor 10x15cm para PDF",
@@ -80,16 +99,23 @@ def main():
     )
     
     if uploaded_file is not None:
+        # Sondar o cabeçalho antes de decodificar (recusa arquivos corrompidos/gigantes);
+        # digitalizações TIFF/BMP enormes são reduzidas faixa a faixa
+        try:
+            image, (largura_original, altura_original) = abrir_upload(hash_upload(uploaded_file), uploaded_file)
+        except ImagemRejeitada as e:
+            st.error(f"❌ Não foi possível usar esta imagem: {e}")
+            return
+
         # Mostrar preview da imagem
-        image = Image.open(uploaded_file)
         st.image(image, caption="Imagem Original", use_column_width=True)
         
         # Informações da imagem
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Largura Original", f"{image.width}px")
+            st.metric("Largura Original", f"{largura_original}px")
         with col2:
-            st.metric("Altura Original", f"{image.height}px")
+            st.metric("Altura Original", f"{altura_original}px")
         with col3:
             st.metric("Formato", uploaded_file.type.split('/')[-1].upper())
         
@@ -97,43 +123,38 @@ def main():
         st.subheader("⚙️ Configurações")
         quality = st.slider("Qualidade do PDF (DPI)", min_value=150, max_value=300, value=200, 
                            help="DPI mais alto = melhor qualidade, mas arquivo maior")
+        cmyk = st.checkbox(
+            "PDF em CMYK (gráfica)",
+            disabled=not cmyk_disponivel(),
+            help="Converte para o perfil CMYK da gráfica (configure RETRATOS_PERFIL_CMYK no servidor)"
+        )
+        limitar_dpi = st.checkbox(
+            "Limitar ao que a imagem suporta", value=True,
+            help="Não amplia a imagem além da resolução que ela tem: o PDF sai no DPI efetivo dela"
+        )
+        # A imagem é esticada para 15x10: vale o lado com menos pixels por cm
+        plano = planejar(
+            "pdf_10x15", quality, [(uploaded_file.name, (largura_original, altura_original), (15, 10), "cobrir")],
+            (21, 29.7), limitar=limitar_dpi,
+        )
+        dpi_saida = plano["dpi"]
+        mostrar_plano(plano)
         
         # Processar imagem
         if st.button("🔄 Converter para PDF 10x15cm"):
             with st.spinner("Processando imagem e criando PDF..."):
                 try:
-                    # Salvar imagem temporariamente
-                    temp_image_path = "temp_image.jpg"
-                    
-                    # Converter para RGB se necessário (para PNG com transparência)
-                    if image.mode in ('RGBA', 'LA', 'P'):
-                        background = Image.new('RGB', image.size, 'white')
-                        if image.mode == 'P':
-                            image = image.convert('RGBA')
-                        background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                        image = background
-                    
-                    image.save(temp_image_path, "JPEG", quality=95)
-                    
-                    # Criar PDF
-                    output_pdf = "imagem_10x15cm.pdf"
-                    
-                    # Atualizar DPI baseado no slider
-                    global cm_to_pixels
-                    original_cm_to_pixels = cm_to_pixels
-                    cm_to_pixels = lambda cm, dpi=quality: int(cm * dpi / 2.54)
-                    
-                    pdf_path = create_10x15_pdf(temp_image_path, output_pdf)
-                    
-                    # Restaurar função original
-                    cm_to_pixels = original_cm_to_pixels
-                    
-                    # Ler o PDF criado
-                    with open(pdf_path, "rb") as f:
-                        pdf_bytes = f.read()
+                    # Mesma imagem + mesmo DPI = mesmo PDF: servido do cache em disco
+                    pdf_bytes, do_cache = cache_compartilhado().obter_ou_gerar(
+                        "pdf_10x15",
+                        hash_upload(uploaded_file),
+                        {"dpi": dpi_saida, "cmyk": cmyk},
+                        VERSAO_PDF_10X15,
+                        lambda: gerar_pdf_10x15(image, dpi_saida, cmyk)
+                    )
                     
                     # Botão para download
-                    st.success("✅ PDF criado com sucesso!")
+                    st.success("✅ PDF criado com sucesso!" + (" (reaproveitado do cache)" if do_cache else ""))
                     
                     col1, col2 = st.columns(2)
                     with col1:
@@ -151,7 +172,7 @@ def main():
                     # Preview do layout
                     st.subheader("📐 Visualização do Layout")
                     st.markdown(f"""
-                    **Layout do PDF (DPI: {quality}):**
+                    **Layout do PDF (DPI: {dpi_saida}):**
                     - **Página A4:** 21cm × 29.7cm
                     - **Imagem:** 10cm × 15cm (centralizada)
                     - **Linhas vermelhas:** guias para corte
@@ -159,12 +180,6 @@ def main():
                       - Superior/Inferior: ≈7.35cm cada
                       - Esquerda/Direita: ≈3cm cada
                     """)
-                    
-                    # Limpar arquivos temporários
-                    if os.path.exists(temp_image_path):
-                        os.remove(temp_image_path)
-                    if os.path.exists(output_pdf):
-                        os.remove(output_pdf)
                         
                 except Exception as e:
                     st.error(f"❌ Erro ao processar a imagem: {str(e)}")
@@ -1,13 +1,132 @@
 import streamlit as st
-from pypdf 
-from pypdf import PdfMerger, PdfReader
+from pypdf import PdfWriter
 import io
+import os
+from nucleo.hashes import hash_upload
+from nucleo.impor_pdf import FOLHAS_PT, LIVRETO, impor_paginas
+from nucleo.metricas import BYTES_CODIFICADOS, medido
+from nucleo.miniaturas_pdf import contar_paginas, renderizar_miniatura, ZOOM_PADRAO
+from nucleo.otimizar_pdf import otimizar_pdf
+from nucleo.pdf_spool import (
+    LIMITE_STATIC, PastaSessao, abrir_leitor, gravar_upload, juntar_em_disco, ler_ao_baixar,
+    limpar_spool_antigo
+)
 
-st.set_page_config(page_title="Juntar PDFs", layout="centered")
+st.set_page_config(page_title="Juntar PDFs", layout="wide")
 
 st.title("📄 Juntar Arquivos PDF")
 
-st.write("Envie vários PDFs, organize a ordem e gere um único arquivo.")
+st.write("Envie vários PDFs, organize a ordem (de arquivos ou de páginas) e gere um único arquivo.")
+
+@st.cache_resource
+def limpeza_inicial():
+    """Uma vez por processo: apaga spools de sessões antigas"""
+    limpar_spool_antigo()
+
+limpeza_inicial()
+
+# --- Estado inicial ---
+# Os PDFs enviados são copiados para uma pasta temporária da sessão; na memória
+# fica só o upload do próprio Streamlit.
+# arquivos_pdf: {hash: {"nome": str, "caminho": str, "paginas": int}} na ordem dos arquivos
+# paginas_pdf: [{"arquivo": hash, "indice": int, "rotacao": int}, ...] na ordem final
+if "arquivos_pdf" not in st.session_state:
+    st.session_state.arquivos_pdf = {}
+if "paginas_pdf" not in st.session_state:
+    st.session_state.paginas_pdf = []
+# A pasta é apagada quando a sessão termina (PastaSessao)
+if "spool" not in st.session_state or not st.session_state.spool.existe():
+    st.session_state.spool = PastaSessao()
+st.session_state.pasta_spool = st.session_state.spool.caminho
+
+# Em disco, o PDF final vai para uma pasta em static/ e o navegador baixa direto
+# do servidor de arquivos do Streamlit, sem passar pela memória do Python
+SERVINDO_STATIC = st.get_option("server.enableStaticServing")
+
+# --- Funções auxiliares ---
+
+def sincronizar_uploads(uploaded_files):
+    """Adiciona PDFs novos e remove os que saíram do uploader, sem reler os demais"""
+    arquivos = st.session_state.arquivos_pdf
+    hashes_enviados = []
+
+    for file in uploaded_files:
+        h = hash_upload(file)
+        hashes_enviados.append(h)
+        if h in arquivos:
+            continue
+        caminho = gravar_upload(file, st.session_state.pasta_spool, f"{h}.pdf")
+        try:
+            paginas = contar_paginas(h, caminho)
+        except Exception as e:
+            st.error(f"Erro ao ler {file.name}: {e}")
+            os.remove(caminho)
+            continue
+        arquivos[h] = {"nome": file.name, "caminho": caminho, "paginas": paginas}
+        st.session_state.paginas_pdf.extend(
+            {"arquivo": h, "indice": i, "rotacao": 0} for i in range(paginas)
+        )
+
+    for h in [h for h in arquivos if h not in hashes_enviados]:
+        if os.path.exists(arquivos[h]["caminho"]):
+            os.remove(arquivos[h]["caminho"])
+        del arquivos[h]
+    st.session_state.paginas_pdf = [
+        p for p in st.session_state.paginas_pdf if p["arquivo"] in arquivos
+    ]
+
+def mover_arquivo(h, passo):
+    ordem = list(st.session_state.arquivos_pdf)
+    i = ordem.index(h)
+    j = i + passo
+    if 0 <= j < len(ordem):
+        ordem[i], ordem[j] = ordem[j], ordem[i]
+        st.session_state.arquivos_pdf = {k: st.session_state.arquivos_pdf[k] for k in ordem}
+        # Ordenação estável: mantém a ordem interna, exclusões e rotações das páginas
+        st.session_state.paginas_pdf.sort(key=lambda p: ordem.index(p["arquivo"]))
+
+def mover_pagina(index, destino):
+    paginas = st.session_state.paginas_pdf
+    if 0 <= destino < len(paginas):
+        paginas.insert(destino, paginas.pop(index))
+
+def girar_pagina(index):
+    pagina = st.session_state.paginas_pdf[index]
+    pagina["rotacao"] = (pagina["rotacao"] + 90) % 360
+
+def excluir_pagina(index):
+    del st.session_state.paginas_pdf[index]
+
+def restaurar_paginas():
+    st.session_state.paginas_pdf = [
+        {"arquivo": h, "indice": i, "rotacao": 0}
+        for h, arq in st.session_state.arquivos_pdf.items()
+        for i in range(arq["paginas"])
+    ]
+
+@medido("juntar_pdf")
+def juntar_paginas(paginas, arquivos, progress=None):
+    """Monta o PDF final em memória, página a página (com as rotações escolhidas)"""
+    writer = PdfWriter()
+    readers = {}
+
+    for n, pagina in enumerate(paginas):
+        h = pagina["arquivo"]
+        if h not in readers:
+            readers[h] = abrir_leitor(arquivos[h]["caminho"])
+        nova = writer.add_page(readers[h].pages[pagina["indice"]])
+        if pagina["rotacao"]:
+            nova.rotate(pagina["rotacao"])
+        if progress is not None:
+            progress.progress((n + 1) / len(paginas))
+
+    pdf_final = io.BytesIO()
+    writer.write(pdf_final)
+    writer.close()
+    for reader in readers.values():
+        reader.stream.close()
+    pdf_final.seek(0)
+    return pdf_final
 
 # Upload de arquivos
 uploaded_files = st.file_uploader(
@@ -16,66 +135,201 @@ uploaded_files = st.file_uploader(
     accept_multiple_files=True
 )
 
-if uploaded_files:
+sincronizar_uploads(uploaded_files or [])
 
-    st.subheader("Arquivos carregados")
+if st.session_state.arquivos_pdf:
 
-    arquivos = []
+    aba_arquivos, aba_paginas = st.tabs(["🗂️ Arquivos", "📑 Páginas"])
 
-    for file in uploaded_files:
-        reader = PdfReader(file)
-        paginas = len(reader.pages)
+    # Controle de ordem dos arquivos
+    with aba_arquivos:
+        st.subheader("Arquivos carregados")
+
+        for i, (h, arq) in enumerate(st.session_state.arquivos_pdf.items()):
+
+            col1, col2, col3 = st.columns([4,1,1])
+
+            with col1:
+                st.write(f"**{i+1}. {arq['nome']}** ({arq['paginas']} páginas)")
+
+            with col2:
+                st.button("⬆", key=f"up_{h}", on_click=mover_arquivo, args=(h, -1))
 
-        arquivos.append({
-            "nome": file.name,
-            "file": file,
-            "paginas": paginas
-        })
+            with col3:
+                st.button("⬇", key=f"down_{h}", on_click=mover_arquivo, args=(h, 1))
 
-    # Controle de ordem
-    for i, arq in enumerate(arquivos):
+    # Grade de páginas: só as miniaturas da página visível da grade são renderizadas
+    with aba_paginas:
+        paginas = st.session_state.paginas_pdf
+        arquivos = st.session_state.arquivos_pdf
 
-        col1, col2, col3 = st.columns([4,1,1])
+        col_a, col_b, col_c = st.columns(3)
+        with col_a:
+            por_pagina = st.selectbox("Páginas por tela", [12, 24, 48], index=0)
+        with col_b:
+            zoom = st.select_slider(
+                "Tamanho das miniaturas",
+                options=[0.15, ZOOM_PADRAO, 0.4],
+                value=ZOOM_PADRAO,
+                format_func=lambda z: {0.15: "Pequeno", ZOOM_PADRAO: "Médio", 0.4: "Grande"}[z]
+            )
+        total_telas = max(1, -(-len(paginas) // por_pagina))
+        with col_c:
+            tela = st.number_input("Tela", min_value=1, max_value=total_telas, value=1, step=1)
 
-        with col1:
-            st.write(f"**{i+1}. {arq['nome']}** ({arq['paginas']} páginas)")
+        st.caption(f"{len(paginas)} páginas no documento final · tela {tela} de {total_telas}")
+        st.button("↺ Restaurar todas as páginas", on_click=restaurar_paginas)
 
-        with col2:
-            if st.button("⬆", key=f"up{i}") and i > 0:
-                arquivos[i], arquivos[i-1] = arquivos[i-1], arquivos[i]
-                st.rerun()
+        inicio = (tela - 1) * por_pagina
+        colunas = st.columns(6)
 
-        with col3:
-            if st.button("⬇", key=f"down{i}") and i < len(arquivos)-1:
-                arquivos[i], arquivos[i+1] = arquivos[i+1], arquivos[i]
-                st.rerun()
+        for pos in range(inicio, min(inicio + por_pagina, len(paginas))):
+            pagina = paginas[pos]
+            arq = arquivos[pagina["arquivo"]]
+            chave = f"{pagina['arquivo']}_{pagina['indice']}"
+
+            with colunas[(pos - inicio) % 6]:
+                png = renderizar_miniatura(pagina["arquivo"], pagina["indice"], zoom, arq["caminho"])
+                # A rotação é só um atributo da página: a miniatura cacheada é reaproveitada
+                st.image(png, caption=f"{pos+1}. {arq['nome']} p.{pagina['indice']+1}"
+                         + (f" ({pagina['rotacao']}°)" if pagina["rotacao"] else ""))
+                b1, b2, b3, b4 = st.columns(4)
+                b1.button("⬅", key=f"esq_{chave}", on_click=mover_pagina, args=(pos, pos - 1))
+                b2.button("➡", key=f"dir_{chave}", on_click=mover_pagina, args=(pos, pos + 1))
+                b3.button("🔄", key=f"rot_{chave}", on_click=girar_pagina, args=(pos,))
+                b4.button("🗑", key=f"del_{chave}", on_click=excluir_pagina, args=(pos,))
 
     st.divider()
 
+    modo_disco = st.radio(
+        "Modo de junção",
+        [False, True],
+        format_func=lambda d: "Em disco (arquivos muito grandes)" if d else "Em memória (permite otimizar)",
+        horizontal=True,
+        help="Em disco, cada objeto é copiado direto para um arquivo temporário: "
+             "a memória não cresce com o tamanho dos PDFs durante a junção. "
+             + ("O download sai direto do disco (até 200 MB; acima disso o arquivo "
+                "é lido inteiro na memória do servidor ao clicar em baixar)."
+                if SERVINDO_STATIC else
+                "Sem server.enableStaticServing, o download ainda passa pela memória "
+                "do servidor: o arquivo final é lido inteiro ao clicar em baixar.")
+    )
+
+    # Imposição: várias páginas por folha ou livreto, direto dos PDFs de origem
+    with st.expander("🖨️ Várias páginas por folha"):
+        imposicao = st.radio(
+            "Páginas por folha",
+            [1, 2, 4, 8, LIVRETO],
+            format_func=lambda m: {1: "1 (sem imposição)", LIVRETO: "Livreto (dobrar ao meio)"}.get(m, str(m)),
+            horizontal=True,
+            help="As páginas entram na folha como objetos do PDF original, sem virar imagem: "
+                 "o arquivo fica do tamanho da entrada."
+        )
+        col_f, col_g = st.columns(2)
+        with col_f:
+            folha_imposicao = st.selectbox("Folha", list(FOLHAS_PT), disabled=imposicao == 1)
+        with col_g:
+            girar_para_caber = st.checkbox("Girar páginas para caber", value=True, disabled=imposicao == 1)
+        if imposicao == LIVRETO:
+            st.caption("Imprima frente e verso virando pela borda curta, dobre ao meio e grampeie.")
+
+    # Otimização opcional do arquivo final (para e-mail e arquivamento)
+    with st.expander("🗜️ Otimizar PDF final"):
+        otimizar = st.checkbox("Otimizar após juntar", value=False, disabled=modo_disco) and not modo_disco
+        comprimir = st.checkbox("Comprimir conteúdo das páginas", value=True, disabled=not otimizar)
+        deduplicar = st.checkbox("Remover objetos duplicados (fontes, logos, imagens)", value=True, disabled=not otimizar)
+        dpi_maximo = st.selectbox(
+            "Reduzir imagens acima de",
+            [None, 300, 200, 150],
+            format_func=lambda d: "Não reduzir" if d is None else f"{d} DPI",
+            disabled=not otimizar
+        )
+
     if st.button("🔗 Juntar PDFs"):
 
-        merger = PdfMerger()
+        if not st.session_state.paginas_pdf:
+            st.error("Nenhuma página selecionada.")
+            st.stop()
 
         progress = st.progress(0)
 
-        for i, arq in enumerate(arquivos):
+        pasta_saida = st.session_state.pasta_spool
+        if modo_disco and SERVINDO_STATIC:
+            if "publica" not in st.session_state or not st.session_state.publica.existe():
+                st.session_state.publica = PastaSessao(publica=True)
+            pasta_saida = st.session_state.publica.caminho
 
-            merger.append(arq["file"])
+        if imposicao != 1:
+            caminhos = {h: arq["caminho"] for h, arq in st.session_state.arquivos_pdf.items()}
+            saida = os.path.join(pasta_saida, "pdf_imposto.pdf")
+            folhas = impor_paginas(
+                st.session_state.paginas_pdf, caminhos, saida, modo=imposicao,
+                folha=folha_imposicao, girar_para_caber=girar_para_caber, progress=progress
+            )
+            st.caption(f"{len(st.session_state.paginas_pdf)} páginas em {folhas} faces de folha {folha_imposicao}.")
+            if modo_disco:
+                pdf_final = None
+            else:
+                with open(saida, "rb") as f:
+                    pdf_final = io.BytesIO(f.read())
+        elif modo_disco:
+            caminhos = {h: arq["caminho"] for h, arq in st.session_state.arquivos_pdf.items()}
+            saida = os.path.join(pasta_saida, "pdf_unificado.pdf")
+            juntar_em_disco(st.session_state.paginas_pdf, caminhos, saida, progress)
+            pdf_final = None
+        else:
+            pdf_final = juntar_paginas(
+                st.session_state.paginas_pdf,
+                st.session_state.arquivos_pdf,
+                progress
+            )
 
-            progresso = (i + 1) / len(arquivos)
-            progress.progress(progresso)
+        if otimizar:
+            with st.spinner("Otimizando PDF..."):
+                pdf_final, relatorio = otimizar_pdf(
+                    pdf_final,
+                    comprimir=comprimir,
+                    deduplicar=deduplicar,
+                    dpi_maximo=dpi_maximo
+                )
 
-        pdf_final = io.BytesIO()
-        merger.write(pdf_final)
-        merger.close()
+            antes = relatorio["tamanho_antes"] / 2**20
+            depois = relatorio["tamanho_depois"] / 2**20
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Antes", f"{antes:.2f} MB")
+            col2.metric("Depois", f"{depois:.2f} MB", f"{(depois - antes) / antes:+.0%}" if antes else None, delta_color="inverse")
+            col3.metric("Tempo", f"{relatorio['tempo']:.1f} s")
+            if relatorio["imagens_reduzidas"]:
+                st.caption(f"{relatorio['imagens_reduzidas']} imagens reamostradas para {dpi_maximo} DPI.")
 
-        pdf_final.seek(0)
+        url_download = None
+        if pdf_final is None:
+            tamanho = os.path.getsize(saida)
+            BYTES_CODIFICADOS.inc(tamanho, ferramenta="juntar_pdf")
+            if SERVINDO_STATIC and tamanho <= LIMITE_STATIC:
+                url_download = st.session_state.publica.url(os.path.basename(saida))
+            else:
+                # Sem static serving, o download copia o PDF inteiro para o
+                # armazenamento de mídia (em memória), mas só no clique
+                dados_download = ler_ao_baixar(saida)
+        else:
+            pdf_final.seek(0, os.SEEK_END)
+            BYTES_CODIFICADOS.inc(pdf_final.tell(), ferramenta="juntar_pdf")
+            pdf_final.seek(0)
+            dados_download = pdf_final
 
         st.success("PDF gerado com sucesso.")
 
-        st.download_button(
-            label="⬇ Baixar PDF unido",
-            data=pdf_final,
-            file_name="pdf_unificado.pdf",
-            mime="application/pdf"
-        )
+        if url_download:
+            st.markdown(
+                f'<a href="{url_download}" download="pdf_unificado.pdf">⬇ Baixar PDF unido</a>',
+                unsafe_allow_html=True
+            )
+        else:
+            st.download_button(
+                label="⬇ Baixar PDF unido",
+                data=dados_download,
+                file_name="pdf_unificado.pdf",
+                mime="application/pdf",
+                on_click="ignore"
+            )
@@ -0,0 +1,105 @@
+# app.py
+"""
+Lançador único dos apps de retratos e fotos (Streamlit multipage).
+Run:
+    streamlit run app.py
+
+Cada ferramenta continua sendo um script independente; as bibliotecas
+pesadas de cada uma (PyMuPDF, pypdf, replicate...) só são importadas
+quando a página é aberta pela primeira vez.
+"""
+
+import streamlit as st
+from nucleo import metricas, recursos, tempos
+from nucleo.cache_disco import cache_compartilhado
+from nucleo.ferramentas import FERRAMENTAS
+
+
+def pagina_desempenho():
+    st.set_page_config(page_title="Desempenho", page_icon="⏱️", layout="wide")
+    st.title("⏱️ Tempos de inicialização")
+    st.caption(
+        "Primeira renderização de cada página neste processo (inclui a importação "
+        "das bibliotecas da página) e média das reexecuções seguintes."
+    )
+
+    cache = cache_compartilhado().estatisticas()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Acertos no cache de impressões", f"{cache['taxa_acerto']:.0%}",
+                f"{cache['acertos']} de {cache['acertos'] + cache['falhas']}", delta_color="off")
+    col2.metric("Itens em cache", cache["entradas"])
+    col3.metric("Uso do cache", f"{cache['bytes'] / 2**20:.0f} / {cache['limite'] / 2**20:.0f} MB")
+
+    duracoes = metricas.DURACAO.series()
+    if duracoes:
+        erros = metricas.ERROS.valores()
+        st.subheader("Renderizações por ferramenta (todas as sessões)")
+        st.dataframe(
+            [
+                {
+                    "Ferramenta": dict(chave)["ferramenta"],
+                    "Renderizações": total,
+                    "Média (ms)": round(soma / total * 1000, 1),
+                    "Erros": erros.get(chave, 0),
+                }
+                for chave, (_, soma, total) in sorted(duracoes.items())
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    carregados = recursos.relatorio()
+    if carregados:
+        primeira = sum(item["poupado_na_primeira"] for item in carregados)
+        st.subheader("Recursos compartilhados (fontes, perfis ICC, modelos)")
+        st.caption(
+            f"Carregados uma vez por processo. O aquecimento na subida do servidor tirou "
+            f"{primeira * 1000:.0f} ms das primeiras renderizações; no total o registro "
+            f"poupou {sum(item['poupado'] for item in carregados) * 1000:.0f} ms de recargas."
+        )
+        st.dataframe(
+            [
+                {
+                    "Recurso": item["recurso"],
+                    "Carga (ms)": round(item["carga"] * 1000, 1),
+                    "Aquecido": item["aquecido"],
+                    "Usos": item["usos"],
+                    "Poupado (ms)": round(item["poupado"] * 1000, 1),
+                }
+                for item in carregados
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    linhas = tempos.relatorio()
+    if not linhas:
+        st.info("Nenhuma página foi aberta ainda neste processo.")
+        return
+
+    st.dataframe(
+        [
+            {
+                "Página": item["pagina"],
+                "Aberta após (s)": round(item["desde_inicio"], 2),
+                "1ª renderização (ms)": round(item["primeira"] * 1000, 1),
+                "Módulos importados": item["modulos_importados"],
+                "Execuções": item["execucoes"],
+                "Média (ms)": round(item["media"] * 1000, 1),
+                "Última (ms)": round(item["ultima"] * 1000, 1),
+            }
+            for item in linhas
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+paginas = [st.Page(script, title=titulo, icon=icone) for script, titulo, icone in FERRAMENTAS]
+paginas.append(st.Page(pagina_desempenho, title="Desempenho", icon="⏱️", url_path="desempenho"))
+
+# Fontes, perfis e modelos carregam em segundo plano enquanto a primeira página abre
+recursos.aquecer_em_segundo_plano()
+
+pagina = st.navigation(paginas)
+tempos.medir_pagina(pagina.title, pagina.run)
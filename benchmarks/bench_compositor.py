@@ -0,0 +1,77 @@
+"""
+Compara a montagem de folhas por laço de ``paste`` com o compositor NumPy.
+
+Três cenários por modelo e DPI, com as fotos já no tamanho dos espaços:
+- paste (Pillow): imagens Pillow coladas em ``Image.new`` (backend
+  ``pillow``, que devolve imagens Pillow);
+- fromarray + paste: arrays do OpenCV convertidos um a um para Pillow e
+  colados (o backend ``opencv`` antes do compositor);
+- compositor: os mesmos arrays colados por ``montar_slots``, com uma única
+  conversão para Pillow no final (o que ``renderizar`` faz hoje com o
+  backend ``opencv``).
+Run:
+    python benchmarks/bench_compositor.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nucleo.compositor import montar_slots  # noqa: E402
+from nucleo.modelos import MODELOS, compilar, variante  # noqa: E402
+
+REPETICOES = 5
+
+CENARIOS = [
+    ("3x4 em 10x15", variante(MODELOS["3x4_em_10x15"], acrescimo_px=10, espaco_px=8), True),
+    ("4 fotos em A4", MODELOS["10x15_em_a4"], False),
+]
+
+
+def slots_paste(fotos, tamanho, posicoes):
+    folha = Image.new("RGB", tamanho, "white")
+    for foto, pos in zip(fotos, posicoes):
+        folha.paste(foto, pos)
+    return folha
+
+
+def slots_fromarray_paste(arrays, tamanho, posicoes):
+    folha = Image.new("RGB", tamanho, "white")
+    for arr, pos in zip(arrays, posicoes):
+        folha.paste(Image.fromarray(arr), pos)
+    return folha
+
+
+def medir(funcao):
+    return min(timeit.repeat(funcao, number=1, repeat=REPETICOES)) * 1000
+
+
+def main():
+    print(f"{'modelo':<16} {'DPI':>4} {'paste (ms)':>11} {'fromarray+paste':>16} {'compositor':>11}")
+    for dpi in (300, 600):
+        for nome, modelo, mesma_foto in CENARIOS:
+            pagina = compilar(modelo, dpi)
+            posicoes = [(x, y) for x, y, _, _ in pagina["slots"]]
+            _, _, w, h = pagina["slots"][0]
+            if mesma_foto:
+                # Folha 3x4 de uma pessoa: a mesma foto em todos os espaços
+                fotos = [Image.effect_noise((w, h), 40).convert("RGB")] * len(posicoes)
+            else:
+                fotos = [Image.effect_noise((w, h), 40).convert("RGB") for _ in posicoes]
+            arrays = [np.asarray(f) for f in fotos]
+            tamanho = pagina["tamanho"]
+            print(
+                f"{nome:<16} {dpi:>4}"
+                f" {medir(lambda: slots_paste(fotos, tamanho, posicoes)):>11.1f}"
+                f" {medir(lambda: slots_fromarray_paste(arrays, tamanho, posicoes)):>16.1f}"
+                f" {medir(lambda: montar_slots(tamanho, zip(arrays, posicoes))):>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Qualidade x velocidade dos backends de reamostragem (Pillow e OpenCV).
+
+A qualidade é o PSNR contra uma referência exata:
+- redução: a origem tem tamanho múltiplo inteiro do alvo, então a
+  referência é a média de cada bloco k x k (a luz média que cai em cada
+  pixel impresso). Nesse caso o INTER_AREA coincide com a referência, por
+  isso o PSNR do OpenCV sai infinito: o número útil é a distância do
+  LANCZOS até ela;
+- ampliação: a origem é reduzida por blocos e ampliada de volta; a
+  referência é a imagem original.
+Run:
+    python benchmarks/bench_reamostragem.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nucleo.reamostragem import BACKENDS, redimensionar  # noqa: E402
+
+REPETICOES = 3
+
+
+def imagem_teste(largura, altura):
+    """Gradiente + anel de frequência crescente + ruído: detalhe em todas as escalas"""
+    y, x = np.mgrid[0:altura, 0:largura].astype(np.float32)
+    r2 = ((x - largura / 2) ** 2 + (y - altura / 2) ** 2) / (largura * altura)
+    anel = 0.5 + 0.5 * np.sin(60 * r2 * np.pi)
+    gradiente = x / largura
+    ruido = np.random.default_rng(0).random((altura, largura), dtype=np.float32)
+    canais = [anel, gradiente, 0.7 * anel + 0.3 * ruido]
+    return (np.dstack(canais) * 255).round().astype(np.uint8)
+
+
+def reduzir_blocos(arr, k):
+    h, w, c = arr.shape
+    return arr.reshape(h // k, k, w // k, k, c).mean(axis=(1, 3)).round().astype(np.uint8)
+
+
+def psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def medir(funcao):
+    return min(timeit.repeat(funcao, number=1, repeat=REPETICOES)) * 1000
+
+
+def cenarios():
+    # (nome, imagem de origem, tamanho alvo, referência)
+    alvo = (1772, 1181)  # 15x10 cm a 300 DPI
+    origem = imagem_teste(alvo[0] * 4, alvo[1] * 4)
+    yield "33 MP -> 10x15", origem, alvo, reduzir_blocos(origem, 4)
+
+    alvo = (354, 472)  # 3x4 cm a 300 DPI
+    origem = imagem_teste(alvo[0] * 8, alvo[1] * 8)
+    yield "11 MP -> 3x4", origem, alvo, reduzir_blocos(origem, 8)
+
+    alvo = (1772, 1180)
+    original = imagem_teste(*alvo)
+    yield "2x ampliação", reduzir_blocos(original, 2), alvo, original
+
+
+def main():
+    nomes = list(BACKENDS)
+    print(f"{'cenário':<16}" + "".join(f"{n + ' ms':>12}{n + ' dB':>12}" for n in nomes))
+    for nome, origem, alvo, referencia in cenarios():
+        img = Image.fromarray(origem)
+        colunas = []
+        for backend in nomes:
+            tempo = medir(lambda: redimensionar(img, alvo, backend=backend))
+            colunas.append(f"{tempo:>12.1f}{psnr(redimensionar(img, alvo, backend=backend), referencia):>12.2f}")
+        print(f"{nome:<16}" + "".join(colunas))
+
+
+if __name__ == "__main__":
+    main()
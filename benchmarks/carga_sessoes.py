@@ -0,0 +1,421 @@
+"""
+Teste de carga: N sessões simultâneas de cada app, sem navegador nem rede.
+
+Cada sessão é um AppTest (o mesmo executor de scripts do servidor) na sua
+própria thread, e todas ficam no mesmo processo. Assim, como as sessões de
+um servidor Streamlit, elas dividem a fila de renderização, os caches e os
+singletons do núcleo. Cada app roda num processo filho, para o pico de
+memória medido ser só dele.
+
+Cada sessão percorre um fluxo realista: envia as fotos, gira, mexe nos
+controles e chega ao botão de download. Os uploads são fotos sintéticas
+de câmera (12 MP), diferentes em cada sessão (sem acerto de cache entre
+sessões), entregues por um ``file_uploader`` substituto. Enquanto há
+trabalho na fila, a sessão reexecuta o script a cada 0,25 s, como o
+fragmento de progresso faz no navegador (aqui cada poll é uma reexecução
+inteira, então a latência medida é um teto).
+
+Relata por app a latência das reexecuções (p50/p95), o pico de RSS, a
+memória por sessão e a vazão (fluxos completos por minuto).
+Run:
+    python benchmarks/carga_sessoes.py --sessoes 8
+    python benchmarks/carga_sessoes.py --apps 10x15A4.py 01-imagem-para-pdf.py --saida base.json
+    python benchmarks/carga_sessoes.py --base base.json   # falha se piorar além da tolerância
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+TAMANHO_FOTO = (4000, 3000)
+INTERVALO_POLL = 0.25
+TEMPO_MAXIMO_ESPERA = 300
+
+# Script executado por cada sessão: troca o file_uploader e roda o app
+ENVOLTORIO = """
+import carga_sessoes
+carga_sessoes.instalar_uploader()
+carga_sessoes.executar_script({script!r})
+"""
+
+
+# =============================
+# Uploads simulados
+# =============================
+class ArquivoSimulado(io.BytesIO):
+    """Imita o UploadedFile: bytes + nome, tipo e tamanho"""
+
+    def __init__(self, dados, nome, tipo):
+        super().__init__(dados)
+        self.name = nome
+        self.type = tipo
+        self.size = len(dados)
+        self.file_id = nome
+
+
+def foto_sintetica(largura, altura):
+    """JPEG com gradiente, anel de frequência crescente e um pouco de ruído.
+
+    O padrão é gerado em 1/4 da resolução e ampliado, para as fotos de
+    teste não pesarem no pico de memória medido.
+    """
+    from PIL import Image
+
+    w, h = largura // 4, altura // 4
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    r2 = ((x - w / 2) ** 2 + (y - h / 2) ** 2) / (w * h)
+    anel = 0.5 + 0.5 * np.sin(40 * r2 * np.pi)
+    ruido = np.random.default_rng(0).random((h, w), dtype=np.float32)
+    arr = np.dstack([anel, x / w, 0.8 * anel + 0.2 * ruido])
+    img = Image.fromarray((arr * 255).astype(np.uint8)).resize((largura, altura), Image.BICUBIC)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def pdf_sintetico(foto, paginas=3):
+    """PDF A4 com a foto em cada página"""
+    import pymupdf
+
+    doc = pymupdf.open()
+    for _ in range(paginas):
+        pagina = doc.new_page(width=595, height=842)
+        pagina.insert_image(pagina.rect, stream=foto)
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def unico(dados, sessao, indice):
+    """Mesmo conteúdo com bytes diferentes por sessão (depois do fim do JPEG/PDF)"""
+    return dados + f"\n%sessao-{sessao}-{indice}\n".encode()
+
+
+def instalar_uploader():
+    """Substitui ``file_uploader`` (inclusive na sidebar) pelos arquivos da sessão"""
+    import streamlit as st
+    from streamlit.delta_generator import DeltaGenerator
+
+    def file_uploader(*args, key=None, accept_multiple_files=False, **kwargs):
+        label = args[-1] if args and isinstance(args[-1], str) else kwargs.get("label")
+        enviados = st.session_state.get("_carga_uploads", {})
+        arquivos = enviados.get(key) if key is not None and key in enviados else enviados.get(label, [])
+        arquivos = [ArquivoSimulado(*a) for a in arquivos]
+        if accept_multiple_files:
+            return arquivos
+        return arquivos[0] if arquivos else None
+
+    st.file_uploader = lambda *a, **k: file_uploader(*a, **k)
+    DeltaGenerator.file_uploader = file_uploader
+
+
+def executar_script(script):
+    caminho = os.path.join(RAIZ, script)
+    with open(caminho, encoding="utf-8") as f:
+        codigo = compile(f.read(), caminho, "exec")
+    exec(codigo, {"__name__": "__main__", "__file__": caminho})
+
+
+# =============================
+# Passos dos fluxos
+# =============================
+def _widget(lista, rotulo=None, chave=None, prefixo=None):
+    for w in lista:
+        if rotulo is not None and w.label != rotulo:
+            continue
+        if chave is not None and w.key != chave:
+            continue
+        if prefixo is not None and not (w.key or "").startswith(prefixo):
+            continue
+        return w
+    raise LookupError(f"widget não encontrado: {rotulo or chave or prefixo}")
+
+
+# Cada passo recebe o AppTest e ``rodar`` (reexecução com a latência medida)
+def clicar(rotulo=None, chave=None, prefixo=None):
+    def passo(at, rodar):
+        _widget(at.button, rotulo, chave, prefixo).click()
+        rodar()
+    return passo
+
+
+def ajustar(tipo, rotulo, valor):
+    def passo(at, rodar):
+        _widget(getattr(at, tipo), rotulo).set_value(valor)
+        rodar()
+    return passo
+
+
+def esperar_fila(pronto=None):
+    """Reexecuta até a fila esvaziar e ``pronto(at)`` valer.
+
+    Não basta a barra de progresso sumir: a reexecução em que o fragmento
+    chama ``st.rerun()`` devolve uma árvore parcial, sem a barra e sem o
+    resto da página. Por isso a espera só termina depois de duas
+    reexecuções seguidas sem barra e com o estado final esperado.
+    """
+    def passo(at, rodar):
+        limite = time.perf_counter() + TEMPO_MAXIMO_ESPERA
+        seguidas = 0
+        while seguidas < 2:
+            if time.perf_counter() > limite:
+                raise RuntimeError(f"a fila não terminou em {TEMPO_MAXIMO_ESPERA} s")
+            if at.get("progress") or (pronto is not None and not pronto(at)):
+                seguidas = 0
+                time.sleep(INTERVALO_POLL)
+            else:
+                seguidas += 1
+            rodar()
+    return passo
+
+
+def imagens_decodificadas(at):
+    """01-imagem-para-pdf: todos os itens já trocaram o rascunho pela imagem completa"""
+    itens = at.session_state["data_imagens"] if "data_imagens" in at.session_state else []
+    return bool(itens) and all(item["imagem"] is not None for item in itens)
+
+
+def baixar(at, rodar):
+    """O fluxo termina com um botão de download na tela"""
+    if not at.get("download_button"):
+        raise RuntimeError("nenhum botão de download no fim do fluxo")
+
+
+# script -> (uploads por key/rótulo: (tipo, quantidade), passos)
+FLUXOS = {
+    "01-imagem-para-pdf.py": (
+        {"image_uploader": ("foto", None)},
+        [esperar_fila(imagens_decodificadas), clicar(prefixo="rotate_"), clicar(prefixo="down_"),
+         clicar("📄 Gerar PDF"), baixar],
+    ),
+    "02-fotos3x4em10x15maisPola.py": (
+        {"uploader_3x4": ("foto", 1)},
+        [clicar(chave="rot90_3x4"), ajustar("slider", "Espaçamento entre fotos (pixels)", 8),
+         ajustar("checkbox", "Adicionar borda branca em cada foto", False), baixar],
+    ),
+    "03-fotos-multi-formato.py": (
+        {"📸 Faça upload da sua foto": ("foto", 1)},
+        [ajustar("checkbox", "Adicionar formato customizado", True), baixar],
+    ),
+    "10x15A4.py": (
+        {"Selecione as fotos": ("foto", None)},
+        [esperar_fila(), clicar("📄 Gerar PDF"), baixar],
+    ),
+    "Dezporquinze.py": (
+        {"Escolha uma imagem": ("foto", 1)},
+        [ajustar("slider", "Qualidade do PDF (DPI)", 300), clicar("🔄 Converter para PDF 10x15cm"), baixar],
+    ),
+    "3 em 20x15": (
+        {"Envie 3 fotos (um por vez ou multi):": ("foto", 3)},
+        [ajustar("slider", "Espaçamento entre fotos (mm)", 12), baixar],
+    ),
+    "3em20x15.py": (
+        {"Arraste ou selecione **3 fotos** do seu celular": ("foto", 3)},
+        [ajustar("slider", "Espaçamento entre fotos (px)", 20), clicar("✨ Gerar Mosaico"), baixar],
+    ),
+    "Juntar-pdf.py": (
+        {"Selecione os PDFs": ("pdf", 3)},
+        [clicar(prefixo="down_"), clicar("🔗 Juntar PDFs"), baixar],
+    ),
+    # Só o motor local: a IA na nuvem depende da API do Replicate (rede)
+    "melhora-foto.py": (
+        {"📷 Envie uma ou mais fotos": ("foto", 2)},
+        [ajustar("slider", "Nitidez", 0.8), clicar("🚀 Melhorar 2 foto(s)"), esperar_fila(), baixar],
+    ),
+}
+
+
+# =============================
+# Processo filho: um app, N sessões
+# =============================
+def rss_atual_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def zerar_pico_rss():
+    """Recomeça a contagem do pico (VmHWM) a partir do RSS atual; só no Linux"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def pico_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def sessao(script, n, fixtures, fotos, barreira, latencias, resultado):
+    from streamlit.testing.v1 import AppTest
+
+    uploads, passos = FLUXOS[script]
+    at = AppTest.from_string(ENVOLTORIO.format(script=script), default_timeout=TEMPO_MAXIMO_ESPERA)
+    at.session_state["_carga_uploads"] = {
+        alvo: [
+            (unico(fixtures[tipo], n, i), f"{tipo}_{n}_{i}.{'pdf' if tipo == 'pdf' else 'jpg'}",
+             "application/pdf" if tipo == "pdf" else "image/jpeg")
+            for i in range(quantidade or fotos)
+        ]
+        for alvo, (tipo, quantidade) in uploads.items()
+    }
+
+    def rodar():
+        inicio = time.perf_counter()
+        at.run()
+        latencias.append(time.perf_counter() - inicio)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    barreira.wait()
+    inicio = time.perf_counter()
+    try:
+        rodar()
+        for passo in passos:
+            passo(at, rodar)
+        erro = None
+    except Exception as e:
+        erro = f"sessão {n}: {e}"
+    with resultado["trava"]:
+        if erro is None:
+            resultado["ok"] += 1
+        else:
+            resultado["erros"].append(erro)
+        resultado["duracoes"].append(time.perf_counter() - inicio)
+
+
+def executar_app(script, sessoes, fotos):
+    import logging
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    sys.modules.setdefault("carga_sessoes", sys.modules[__name__])
+    os.chdir(RAIZ)
+
+    foto = foto_sintetica(*TAMANHO_FOTO)
+    fixtures = {"foto": foto}
+    if any(tipo == "pdf" for tipo, _ in FLUXOS[script][0].values()):
+        fixtures["pdf"] = pdf_sintetico(foto)
+
+    # Linha de base: Streamlit importado e fotos de teste prontas
+    from streamlit.testing.v1 import AppTest  # noqa: F401
+
+    rss_base = rss_atual_mb()
+    zerar_pico_rss()
+    latencias = []
+    resultado = {"ok": 0, "erros": [], "duracoes": [], "trava": threading.Lock()}
+    barreira = threading.Barrier(sessoes)
+    threads = [
+        threading.Thread(target=sessao, args=(script, n, fixtures, fotos, barreira, latencias, resultado))
+        for n in range(sessoes)
+    ]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    parede = time.perf_counter() - inicio
+
+    pico = pico_rss_mb()
+    p50, p95 = np.percentile(latencias, [50, 95]) if latencias else (0.0, 0.0)
+    return {
+        "sessoes": sessoes,
+        "reexecucoes": len(latencias),
+        "p50_ms": float(p50) * 1000,
+        "p95_ms": float(p95) * 1000,
+        "pico_rss_mb": pico,
+        "mb_por_sessao": max(0.0, pico - rss_base) / sessoes,
+        "fluxos_por_min": resultado["ok"] / parede * 60,
+        "duracao_s": parede,
+        "erros": resultado["erros"],
+    }
+
+
+# =============================
+# Processo pai: um filho por app
+# =============================
+def medir(script, sessoes, fotos):
+    saida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--filho", script,
+         "--sessoes", str(sessoes), "--fotos", str(fotos)],
+        cwd=RAIZ, capture_output=True, text=True,
+    )
+    linhas = saida.stdout.strip().splitlines()
+    if saida.returncode != 0 or not linhas:
+        return {"erros": [saida.stderr.strip().splitlines()[-1] if saida.stderr.strip() else "falhou"]}
+    return json.loads(linhas[-1])
+
+
+def comparar(atual, base, tolerancia):
+    """Métricas que pioraram além da tolerância (%) em relação à medição base"""
+    piores = []
+    for script, r in atual.items():
+        b = base.get(script)
+        if not b or "p95_ms" not in b or "p95_ms" not in r:
+            continue
+        for metrica in ("p95_ms", "pico_rss_mb"):
+            if b[metrica] and (r[metrica] - b[metrica]) / b[metrica] * 100 > tolerancia:
+                piores.append(f"{script}: {metrica} {b[metrica]:.0f} → {r[metrica]:.0f}")
+        if b["fluxos_por_min"] and (b["fluxos_por_min"] - r["fluxos_por_min"]) / b["fluxos_por_min"] * 100 > tolerancia:
+            piores.append(f"{script}: fluxos_por_min {b['fluxos_por_min']:.1f} → {r['fluxos_por_min']:.1f}")
+    return piores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessoes", type=int, default=4, help="sessões simultâneas por app")
+    parser.add_argument("--fotos", type=int, default=8, help="fotos por upload múltiplo")
+    parser.add_argument("--apps", nargs="*", default=list(FLUXOS), help="scripts a medir")
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    parser.add_argument("--base", help="JSON de uma medição anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=25.0, help="piora aceitável em %% (com --base)")
+    parser.add_argument("--filho", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        print(json.dumps(executar_app(args.filho, args.sessoes, args.fotos)))
+        return
+
+    print(f"{args.sessoes} sessões simultâneas por app, {args.fotos} fotos por upload múltiplo")
+    print(f"{'app':<32} {'reexec.':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'pico RSS (MB)':>14} "
+          f"{'MB/sessão':>10} {'fluxos/min':>11}")
+    resultados = {}
+    for script in args.apps:
+        r = medir(script, args.sessoes, args.fotos)
+        resultados[script] = r
+        if "p95_ms" in r:
+            print(f"{script:<32} {r['reexecucoes']:>8} {r['p50_ms']:>9.0f} {r['p95_ms']:>9.0f} "
+                  f"{r['pico_rss_mb']:>14.0f} {r['mb_por_sessao']:>10.0f} {r['fluxos_por_min']:>11.1f}")
+        for erro in r["erros"]:
+            print(f"    ✗ {erro}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            piores = comparar(resultados, json.load(f), args.tolerancia)
+        for linha in piores:
+            print(f"regressão: {linha}")
+        if piores:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
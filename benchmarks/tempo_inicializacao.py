@@ -0,0 +1,60 @@
+"""
+Mede o tempo de primeira renderização de cada app, a frio.
+
+Cada script roda em um processo Python novo (via AppTest, sem navegador),
+então o tempo inclui a importação de todas as bibliotecas da página.
+Run:
+    python benchmarks/tempo_inicializacao.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from nucleo.ferramentas import FERRAMENTAS  # noqa: E402
+
+# Executado no processo filho: importa o Streamlit, roda o script uma vez e
+# devolve o tempo total e o número de módulos carregados
+MEDIDOR = """
+import json, sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+modulos_base = len(sys.modules)
+base = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+fim = time.perf_counter()
+print(json.dumps({
+    "streamlit": base - inicio,
+    "render": fim - base,
+    "modulos": len(sys.modules) - modulos_base,
+    "erro": bool(at.exception),
+}))
+"""
+
+
+def medir(script):
+    inicio = time.perf_counter()
+    saida = subprocess.run(
+        [sys.executable, "-c", MEDIDOR, script],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    )
+    resultado = json.loads(saida.stdout.strip().splitlines()[-1])
+    resultado["processo"] = time.perf_counter() - inicio
+    return resultado
+
+
+def main():
+    print(f"{'página':<32} {'1ª render (ms)':>15} {'módulos':>8} {'processo (s)':>13}")
+    for script, titulo, _ in FERRAMENTAS + [("app.py", "Lançador", "")]:
+        r = medir(script)
+        marca = " (erro)" if r["erro"] else ""
+        print(f"{titulo:<32} {r['render'] * 1000:>15.0f} {r['modulos']:>8} {r['processo']:>13.2f}{marca}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,171 @@
 import streamlit as st
 import os
-import replicate
+import uuid
+import zipfile
 from PIL import Image
 import io
-import requests
+from nucleo.cores import perfil_saida_bytes
+from nucleo.hashes import hash_upload
+from nucleo.melhoria import AJUSTES_PADRAO, melhorar, motor_de_ampliacao
+from nucleo.metricas import BYTES_CODIFICADOS
+from nucleo.previa import previa
+from nucleo.sonda import abrir_imagem, ImagemRejeitada
+from nucleo.trabalhos import fila_compartilhada
 
 # =============================
-# 1. PEGAR TOKEN DO STREAMLIT
+# PROCESSAMENTO (roda na fila, uma foto por tarefa)
 # =============================
-REPLICATE_API_TOKEN = st.secrets["REPLICATE_API_TOKEN"]
-os.environ["REPLICATE_API_TOKEN"] = REPLICATE_API_TOKEN
+def melhorar_jpeg(item):
+    """Tarefa da fila: decodifica, melhora e codifica uma foto (ou devolve o erro como texto)"""
+    dados, ajustes = item
+    try:
+        img = abrir_imagem(io.BytesIO(dados))
+    except ImagemRejeitada as e:
+        return str(e)
+    melhorada = melhorar(img, **ajustes)
+    buf = io.BytesIO()
+    melhorada.save(buf, format="JPEG", quality=95, icc_profile=perfil_saida_bytes())
+    BYTES_CODIFICADOS.inc(buf.tell(), ferramenta="melhorar_foto")
+    return buf.getvalue(), melhorada.size, previa(melhorada)
+
+def zip_das_fotos(nomes, resultados):
+    """ZIP com um JPEG por foto (sem recomprimir: JPEG já é comprimido)"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for nome, resultado in zip(nomes, resultados):
+            if not isinstance(resultado, str):
+                zf.writestr(f"{os.path.splitext(nome)[0]}_melhorada.jpg", resultado[0])
+    return buf.getvalue()
 
 # =============================
-# 2. INTERFACE
+# INTERFACE
 # =============================
 st.set_page_config(page_title="Melhorar Foto com IA", layout="centered")
 st.title("🧠 Melhorar Foto com IA")
-st.caption("Reconstrução de detalhes usando inteligência artificial")
+st.caption("Redução de ruído, contraste, nitidez e ampliação no próprio computador — ou reconstrução por IA na nuvem")
+
+if "id_sessao" not in st.session_state:
+    st.session_state.id_sessao = uuid.uuid4().hex
+
+uploaded_files = st.file_uploader(
+    "📷 Envie uma ou mais fotos",
+    type=["jpg", "png", "jpeg"],
+    accept_multiple_files=True
+)
 
-uploaded_file = st.file_uploader(
-    "📷 Envie uma foto",
-    type=["jpg", "png", "jpeg"]
+motor = st.radio(
+    "Motor",
+    ["local", "nuvem"],
+    format_func=lambda m: "💻 Local (offline, sem custo)" if m == "local" else "☁️ IA na nuvem (Replicate, uma foto)",
+    horizontal=True,
+    key="motor_melhoria",
 )
 
-if uploaded_file:
-    image = Image.open(uploaded_file).convert("RGB")
+if uploaded_files and motor == "local":
+    st.subheader("⚙️ Ajustes")
+    col1, col2 = st.columns(2)
+    with col1:
+        ruido = st.slider("Redução de ruído", 0, 3, AJUSTES_PADRAO["ruido"],
+                          help="Tira o granulado de fotos de celular tiradas com pouca luz")
+        contraste = st.slider("Contraste local", 0.0, 4.0, AJUSTES_PADRAO["contraste"], 0.5,
+                              help="Realça sombras e detalhes sem mudar as cores (CLAHE)")
+    with col2:
+        nitidez = st.slider("Nitidez", 0.0, 2.0, AJUSTES_PADRAO["nitidez"], 0.1)
+        escala = st.select_slider("Ampliar", [1, 2, 3, 4], value=AJUSTES_PADRAO["escala"],
+                                  format_func=lambda e: "Não ampliar" if e == 1 else f"{e}×", key="escala_melhoria")
+    if escala > 1:
+        st.caption(f"Ampliação por {motor_de_ampliacao(escala)}.")
+    ajustes = {"ruido": ruido, "contraste": contraste, "nitidez": nitidez, "escala": escala}
+
+    nomes = [f.name for f in uploaded_files]
+    chave = (tuple(hash_upload(f) for f in uploaded_files), tuple(sorted(ajustes.items())))
+    lote = st.session_state.get("melhoria")
+
+    if st.button(f"🚀 Melhorar {len(uploaded_files)} foto(s)", type="primary"):
+        if lote is not None:
+            lote["trabalho"].cancelar()
+        trabalho = fila_compartilhada().submeter(
+            st.session_state.id_sessao, chave, melhorar_jpeg, [(f.getvalue(), ajustes) for f in uploaded_files]
+        )
+        lote = {"chave": chave, "nomes": nomes, "trabalho": trabalho}
+        st.session_state.melhoria = lote
+
+    if lote is not None and lote["chave"] == chave:
+
+        @st.fragment(run_every=0.5)
+        def acompanhar_melhoria():
+            """Progresso do lote sem reexecutar a página inteira"""
+            trabalho = lote["trabalho"]
+            if trabalho.pronto:
+                st.rerun()
+            st.progress(trabalho.progresso, text=f"Melhorando: {trabalho.concluidos} de {trabalho.total}")
+
+        trabalho = lote["trabalho"]
+        if trabalho.erro is not None:
+            st.error(f"Erro ao melhorar as fotos: {trabalho.erro}")
+        elif not trabalho.pronto:
+            acompanhar_melhoria()
+        else:
+            resultados = trabalho.resultados
+            for nome, resultado in zip(lote["nomes"], resultados):
+                if isinstance(resultado, str):
+                    st.warning(f"{nome} ficou de fora: {resultado}")
+            prontas = [r for r in resultados if not isinstance(r, str)]
+            col_m1, col_m2 = st.columns(2)
+            col_m1.metric("Fotos", len(prontas))
+            col_m2.metric("Tempo total", f"{trabalho.duracao:.1f} s")
+
+            for nome, resultado, arquivo in zip(lote["nomes"], resultados, uploaded_files):
+                if isinstance(resultado, str):
+                    continue
+                jpeg, tamanho, img_previa = resultado
+                with st.expander(f"{nome} — {tamanho[0]}×{tamanho[1]} px", expanded=len(prontas) == 1):
+                    col_a, col_b = st.columns(2)
+                    with col_a:
+                        st.image(arquivo, caption="Original", use_container_width=True)
+                    with col_b:
+                        st.image(img_previa, caption="Melhorada", use_container_width=True)
+
+            if len(prontas) == 1:
+                indice = next(i for i, r in enumerate(resultados) if not isinstance(r, str))
+                st.download_button(
+                    "⬇️ Baixar imagem melhorada",
+                    data=prontas[0][0],
+                    file_name=f"{os.path.splitext(lote['nomes'][indice])[0]}_melhorada.jpg",
+                    mime="image/jpeg"
+                )
+            elif prontas:
+                st.download_button(
+                    "⬇️ Baixar ZIP com as fotos melhoradas",
+                    data=zip_das_fotos(lote["nomes"], resultados),
+                    file_name="fotos_melhoradas.zip",
+                    mime="application/zip"
+                )
+    elif lote is not None:
+        st.info("As fotos ou os ajustes mudaram: clique em **Melhorar** para refazer.")
+
+elif uploaded_files:
+    uploaded_file = uploaded_files[0]
+    if len(uploaded_files) > 1:
+        st.warning("A IA na nuvem processa uma foto por vez: só a primeira será enviada.")
+    try:
+        image = abrir_imagem(uploaded_file)
+    except ImagemRejeitada as e:
+        st.error(f"Não foi possível usar esta foto: {e}")
+        st.stop()
     st.subheader("Original")
     st.image(image, use_column_width=True)
 
     if st.button("🚀 Melhorar com IA"):
         with st.spinner("IA trabalhando… aguarde alguns segundos"):
+            # replicate e requests só são importados quando a IA é de fato usada
+            import replicate
+            import requests
+
+            # -----------------------------
+            # TOKEN DO STREAMLIT
+            # -----------------------------
+            os.environ["REPLICATE_API_TOKEN"] = st.secrets["REPLICATE_API_TOKEN"]
 
             # -----------------------------
             # ENVIA PARA O REPLICATE
@@ -0,0 +1 @@
+"""Rotinas compartilhadas entre os apps de retratos e fotos."""
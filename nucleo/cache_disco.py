@@ -0,0 +1,167 @@
+"""Cache de renderizações em disco, endereçado por conteúdo.
+
+A chave combina hash da entrada, ferramenta, parâmetros normalizados e
+versão do código que gera a saída. O artefato final (JPEG/PDF já
+codificado) fica em um arquivo por chave, sobrevive a reinícios do
+servidor e é descartado por LRU quando a pasta passa do limite.
+"""
+
+import hashlib
+import inspect
+import json
+import marshal
+import os
+import tempfile
+import threading
+import time
+
+from nucleo.metricas import BYTES_CODIFICADOS, CACHE
+
+PASTA_CACHE = os.environ.get(
+    "RETRATOS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "retratos_e_fotos"),
+)
+LIMITE_CACHE_MB = int(os.environ.get("RETRATOS_CACHE_MB", "512"))
+
+# Ao estourar o limite, o LRU apaga até sobrar esta fração
+FRACAO_APOS_LIMPEZA = 0.9
+
+
+def versao_codigo(*funcoes):
+    """Hash do código-fonte das funções: mudou o código, mudou a chave.
+
+    Strings entram como estão (ex.: a assinatura da configuração de cor).
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for funcao in funcoes:
+        if isinstance(funcao, str):
+            h.update(funcao.encode())
+            continue
+        # Funções decoradas (ex.: ``@medido``) contam pelo código original
+        funcao = inspect.unwrap(funcao)
+        try:
+            h.update(inspect.getsource(funcao).encode())
+        except OSError:
+            # Sem o arquivo-fonte (ex.: código executado via exec): usa o bytecode
+            h.update(marshal.dumps(funcao.__code__))
+    return h.hexdigest()
+
+
+def normalizar(parametros):
+    """JSON estável dos parâmetros (ordem das chaves, tuplas como listas)"""
+    return json.dumps(parametros, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class CacheDisco:
+    """Cache LRU em disco com gravação atômica e estatísticas de acerto"""
+
+    def __init__(self, pasta=PASTA_CACHE, limite_mb=LIMITE_CACHE_MB):
+        self.pasta = pasta
+        self.limite = limite_mb * 1024 * 1024
+        self.acertos = 0
+        self.falhas = 0
+        self._trava = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+        # Índice em memória: chave -> (tamanho, último uso)
+        self._indice = {}
+        for nome in os.listdir(pasta):
+            if nome.endswith(".bin"):
+                st = os.stat(os.path.join(pasta, nome))
+                self._indice[nome[:-4]] = (st.st_size, st.st_mtime)
+
+    def chave(self, ferramenta, hash_entrada, parametros, versao):
+        texto = f"{ferramenta}\0{hash_entrada}\0{normalizar(parametros)}\0{versao}"
+        return hashlib.blake2b(texto.encode(), digest_size=20).hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.bin")
+
+    def obter(self, chave):
+        """Bytes gravados para a chave, ou None"""
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+        except FileNotFoundError:
+            with self._trava:
+                self.falhas += 1
+                self._indice.pop(chave, None)
+            CACHE.inc(resultado="falha")
+            return None
+        agora = time.time()
+        # mtime marca o último uso (atime costuma estar desligado no disco)
+        try:
+            os.utime(caminho, (agora, agora))
+        except OSError:
+            pass
+        with self._trava:
+            self.acertos += 1
+            self._indice[chave] = (len(dados), agora)
+        CACHE.inc(resultado="acerto")
+        return dados
+
+    def gravar(self, chave, dados):
+        """Grava em arquivo temporário e renomeia: leitores nunca veem arquivo pela metade"""
+        fd, temporario = tempfile.mkstemp(dir=self.pasta, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(dados)
+            os.replace(temporario, self._caminho(chave))
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        with self._trava:
+            self._indice[chave] = (len(dados), time.time())
+            self._limpar()
+
+    def obter_ou_gerar(self, ferramenta, hash_entrada, parametros, versao, gerar):
+        """Devolve (bytes, veio_do_cache); ``gerar()`` só roda em caso de falha"""
+        chave = self.chave(ferramenta, hash_entrada, parametros, versao)
+        dados = self.obter(chave)
+        if dados is not None:
+            return dados, True
+        dados = gerar()
+        BYTES_CODIFICADOS.inc(len(dados), ferramenta=ferramenta)
+        self.gravar(chave, dados)
+        return dados, False
+
+    def _limpar(self):
+        total = sum(tamanho for tamanho, _ in self._indice.values())
+        if total <= self.limite:
+            return
+        alvo = self.limite * FRACAO_APOS_LIMPEZA
+        for chave, (tamanho, _) in sorted(self._indice.items(), key=lambda item: item[1][1]):
+            if total <= alvo:
+                break
+            try:
+                os.remove(self._caminho(chave))
+            except FileNotFoundError:
+                pass
+            del self._indice[chave]
+            total -= tamanho
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+                "entradas": len(self._indice),
+                "bytes": sum(tamanho for tamanho, _ in self._indice.values()),
+                "limite": self.limite,
+            }
+
+
+_cache = None
+_trava_cache = threading.Lock()
+
+
+def cache_compartilhado():
+    """Cache único do processo, criado no primeiro uso"""
+    global _cache
+    with _trava_cache:
+        if _cache is None:
+            _cache = CacheDisco()
+        return _cache
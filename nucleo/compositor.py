@@ -0,0 +1,112 @@
+"""Montagem de folhas com NumPy: uma alocação e atribuição por fatias.
+
+O fundo é preenchido de uma vez (uma linha + broadcast das linhas), grades
+de uma mesma foto são escritas numa visão (linhas, célula, colunas, célula)
+da folha, sem cópia intermediária, e a conversão para Pillow acontece uma
+única vez, no final.
+
+As entradas podem ser imagens Pillow ou arrays ``uint8`` (H, W, 3), e a
+saída pode ficar em array (``como_imagem=False``). O ganho só aparece com
+fotos que já chegam em array: o Pillow guarda RGB com 4 bytes por pixel,
+então cada ida e volta Pillow ↔ NumPy é uma cópia com reempacotamento, e
+com imagens Pillow na entrada o ``paste`` continua mais rápido. Por isso
+``modelos.renderizar`` só usa o compositor com o backend ``opencv`` de
+reamostragem, que entrega as fotos em array (ver
+benchmarks/bench_compositor.py).
+"""
+
+import numpy as np
+from PIL import Image
+
+
+def _cor(cor):
+    """Cor Pillow ("white", "#fff", (r, g, b)) como tupla RGB de inteiros"""
+    if isinstance(cor, str):
+        cor = Image.new("RGB", (1, 1), cor).getpixel((0, 0))
+    return tuple(cor)[:3]
+
+
+def como_array(imagem):
+    """Array (H, W, 3) uint8 de uma imagem Pillow ou de um array já pronto"""
+    if isinstance(imagem, np.ndarray):
+        return imagem
+    if imagem.mode != "RGB":
+        imagem = imagem.convert("RGB")
+    return np.asarray(imagem)
+
+
+def _preencher(arr, cor):
+    # ``arr[:] = (r, g, b)`` faz broadcast elemento a elemento e é ~30x mais lento
+    if arr.size == 0:
+        return arr
+    if cor[0] == cor[1] == cor[2]:
+        arr.fill(cor[0])
+    else:
+        arr[0, 0] = cor
+        arr[0, 1:] = arr[0, 0]
+        arr[1:] = arr[0]
+    return arr
+
+
+def nova_folha(tamanho_folha, fundo="white"):
+    """Array da folha já preenchido com a cor de fundo"""
+    largura, altura = tamanho_folha
+    return _preencher(np.empty((altura, largura, 3), np.uint8), _cor(fundo))
+
+
+def _colar(folha, arr, x, y):
+    """Atribuição por fatia com recorte nas bordas (como o ``paste`` do Pillow)"""
+    altura, largura = folha.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + arr.shape[1], largura), min(y + arr.shape[0], altura)
+    if x0 < x1 and y0 < y1:
+        folha[y0:y1, x0:x1] = arr[y0 - y:y1 - y, x0 - x:x1 - x]
+
+
+def montar_grade(foto, colunas, linhas, tamanho_folha, espacamento=0, borda=0,
+                 origem=(0, 0), fundo="white", cor_borda="white", como_imagem=True):
+    """Folha com ``colunas`` × ``linhas`` cópias da mesma foto.
+
+    Cada célula ocupa a foto + ``borda`` em volta; células vizinhas ficam
+    separadas por ``espacamento`` pixels (mesma geometria de
+    ``ImageOps.expand`` seguido de ``paste`` em laço).
+    """
+    tile = como_array(foto)
+    altura_tile, largura_tile = tile.shape[:2]
+    passo_x = largura_tile + 2 * borda + espacamento
+    passo_y = altura_tile + 2 * borda + espacamento
+
+    folha = nova_folha(tamanho_folha, fundo)
+    x, y = origem
+    altura_folha, largura_folha = folha.shape[:2]
+
+    cabe = (
+        x >= 0 and y >= 0
+        and x + colunas * passo_x <= largura_folha
+        and y + linhas * passo_y <= altura_folha
+    )
+    if cabe:
+        # Visão (linhas, passo_y, colunas, passo_x, 3) da região da grade:
+        # cada atribuição abaixo escreve a mesma fatia em todas as células
+        grade = folha[y:y + linhas * passo_y, x:x + colunas * passo_x]
+        celulas = grade.reshape(linhas, passo_y, colunas, passo_x, 3)
+        if borda and _cor(cor_borda) != _cor(fundo):
+            _preencher(celulas[:, :passo_y - espacamento, :, :passo_x - espacamento], _cor(cor_borda))
+        celulas[:, borda:borda + altura_tile, :, borda:borda + largura_tile] = tile[None, :, None]
+    else:
+        # Grade maior que a folha: recorta célula a célula
+        celula = nova_folha((passo_x - espacamento, passo_y - espacamento), cor_borda)
+        celula[borda:borda + altura_tile, borda:borda + largura_tile] = tile
+        for linha in range(linhas):
+            for coluna in range(colunas):
+                _colar(folha, celula, x + coluna * passo_x, y + linha * passo_y)
+
+    return Image.fromarray(folha) if como_imagem else folha
+
+
+def montar_slots(tamanho_folha, itens, fundo="white", como_imagem=True):
+    """Folha com fotos diferentes em posições fixas: ``itens`` = [(imagem, (x, y)), ...]"""
+    folha = nova_folha(tamanho_folha, fundo)
+    for imagem, (x, y) in itens:
+        _colar(folha, como_array(imagem), x, y)
+    return Image.fromarray(folha) if como_imagem else folha
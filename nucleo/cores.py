@@ -0,0 +1,197 @@
+"""Gerenciamento de cor: do perfil embutido na foto para o perfil de impressão.
+
+Fotos de celular (Display P3) e de câmera (Adobe RGB) trazem o perfil ICC
+embutido; convertê-las com um simples ``convert("RGB")`` joga o perfil fora
+e as cores saem apagadas na impressão. Aqui os pixels são convertidos do
+perfil embutido (ou sRGB, se não houver) para o perfil de saída.
+
+Configuração por implantação:
+
+- ``RETRATOS_PERFIL_SAIDA``: caminho do ``.icc`` RGB da impressora/lab
+  (padrão: sRGB embutido no LittleCMS);
+- ``RETRATOS_PERFIL_CMYK``: caminho do ``.icc`` CMYK da gráfica; habilita
+  os PDFs em CMYK;
+- ``RETRATOS_INTENCAO``: ``perceptual`` (padrão), ``relativo``,
+  ``saturacao`` ou ``absoluto``.
+
+As transformações do LittleCMS são montadas uma vez por (perfil de
+entrada, perfil de saída, intenção, modos) e reaproveitadas por todas as
+imagens e sessões. Os perfis configurados e as transformações entre eles
+ficam no registro de recursos do processo (``nucleo.recursos``); as que
+partem de perfis embutidos nas fotos enviadas dependem do que os
+clientes mandam, então ficam num LRU limitado
+(``MAX_TRANSFORMACOES_ENVIADAS``).
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import ImageCms
+
+from nucleo.hashes import hash_bytes
+from nucleo.recursos import recurso, recurso_carregado
+
+PERFIL_SAIDA = os.environ.get("RETRATOS_PERFIL_SAIDA") or None
+PERFIL_CMYK = os.environ.get("RETRATOS_PERFIL_CMYK") or None
+
+INTENCOES = {
+    "perceptual": ImageCms.Intent.PERCEPTUAL,
+    "relativo": ImageCms.Intent.RELATIVE_COLORIMETRIC,
+    "saturacao": ImageCms.Intent.SATURATION,
+    "absoluto": ImageCms.Intent.ABSOLUTE_COLORIMETRIC,
+}
+INTENCAO_PADRAO = os.environ.get("RETRATOS_INTENCAO", "perceptual").lower()
+
+# NOCACHE: a mesma transformação é usada por várias threads ao mesmo tempo
+# (o cache de 1 pixel do LittleCMS não é thread-safe)
+FLAGS_TRANSFORMACAO = ImageCms.Flags.NOCACHE | ImageCms.Flags.BLACKPOINTCOMPENSATION
+
+# Modo de entrada -> modo de saída RGB da transformação
+MODOS_GERENCIADOS = {"RGB": "RGB", "RGBA": "RGBA", "L": "RGB", "CMYK": "RGB"}
+
+# Perfis embutidos diferentes vistos de uma vez (celulares, câmeras, editores)
+MAX_TRANSFORMACOES_ENVIADAS = 64
+
+_enviadas = OrderedDict()
+_trava_enviadas = threading.Lock()
+
+
+def _registrar_perfil(dados):
+    """Interpreta um perfil configurado (uma vez por conteúdo) e devolve o hash que o identifica"""
+    chave = hash_bytes(dados)
+    recurso(("perfil_icc", chave), lambda: (ImageCms.ImageCmsProfile(io.BytesIO(dados)), bytes(dados)))
+    return chave
+
+
+def _perfil(chave):
+    """(perfil, bytes) de um perfil configurado já registrado"""
+    return recurso_carregado(("perfil_icc", chave))
+
+
+def _carregar_perfil(caminho):
+    if caminho is None:
+        perfil = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+        return _registrar_perfil(perfil.tobytes())
+    with open(caminho, "rb") as f:
+        return _registrar_perfil(f.read())
+
+
+def chave_srgb():
+    return recurso(("perfil", "sRGB"), lambda: _carregar_perfil(None))
+
+
+def chave_saida():
+    """Hash do perfil RGB de saída configurado"""
+    return recurso(("perfil", "saída", PERFIL_SAIDA), lambda: _carregar_perfil(PERFIL_SAIDA))
+
+
+def chave_cmyk():
+    """Hash do perfil CMYK configurado (None se não houver)"""
+    if PERFIL_CMYK is None:
+        return None
+    return recurso(("perfil", "CMYK", PERFIL_CMYK), lambda: _carregar_perfil(PERFIL_CMYK))
+
+
+def cmyk_disponivel():
+    return PERFIL_CMYK is not None
+
+
+def perfil_saida_bytes():
+    """Bytes do perfil de saída, para embutir nos JPEG/PNG gerados"""
+    return _perfil(chave_saida())[1]
+
+
+def assinatura():
+    """Identifica a configuração de cor (entra na versão das chaves de cache)"""
+    return f"{chave_saida()}:{chave_cmyk()}:{INTENCAO_PADRAO}"
+
+
+def transformacao(chave_entrada, chave_destino, modo_entrada, modo_saida, intencao=None):
+    """Transformação LittleCMS compartilhada entre dois perfis configurados"""
+    intencao = intencao or INTENCAO_PADRAO
+    return recurso(
+        ("transformacao_icc", chave_entrada, chave_destino, intencao, modo_entrada, modo_saida),
+        lambda: ImageCms.buildTransform(
+            _perfil(chave_entrada)[0],
+            _perfil(chave_destino)[0],
+            modo_entrada,
+            modo_saida,
+            renderingIntent=INTENCOES[intencao],
+            flags=FLAGS_TRANSFORMACAO,
+        ),
+    )
+
+
+def transformacao_enviada(icc, chave_entrada, chave_destino, modo_entrada, modo_saida, intencao=None):
+    """Transformação do perfil embutido ``icc`` para um perfil configurado, com LRU limitado"""
+    intencao = intencao or INTENCAO_PADRAO
+    chave = (chave_entrada, chave_destino, intencao, modo_entrada, modo_saida)
+    with _trava_enviadas:
+        t = _enviadas.get(chave)
+        if t is not None:
+            _enviadas.move_to_end(chave)
+            return t
+    # Montada fora da trava: duas threads com o mesmo perfil novo montam em dobro, sem erro
+    t = ImageCms.buildTransform(
+        ImageCms.ImageCmsProfile(io.BytesIO(icc)),
+        _perfil(chave_destino)[0],
+        modo_entrada,
+        modo_saida,
+        renderingIntent=INTENCOES[intencao],
+        flags=FLAGS_TRANSFORMACAO,
+    )
+    with _trava_enviadas:
+        _enviadas[chave] = t
+        _enviadas.move_to_end(chave)
+        while len(_enviadas) > MAX_TRANSFORMACOES_ENVIADAS:
+            _enviadas.popitem(last=False)
+    return t
+
+
+def converter_para_saida(img):
+    """Converte a imagem do perfil embutido (ou sRGB) para o perfil de saída.
+
+    Perfis embutidos inválidos ou incompatíveis com o modo da imagem são
+    ignorados: a imagem segue como estava, como antes do gerenciamento.
+    """
+    icc = img.info.get("icc_profile")
+    destino = chave_saida()
+    if icc:
+        entrada = hash_bytes(icc)
+        if entrada == destino:
+            return img
+    else:
+        # Sem perfil embutido vale a convenção da web: sRGB
+        entrada = chave_srgb()
+        if entrada == destino:
+            return img
+
+    if img.mode not in MODOS_GERENCIADOS:
+        if img.mode in ("P", "PA", "LA"):
+            img = img.convert("RGBA")
+        else:
+            return img
+    try:
+        if icc:
+            t = transformacao_enviada(icc, entrada, destino, img.mode, MODOS_GERENCIADOS[img.mode])
+        else:
+            t = transformacao(entrada, destino, img.mode, MODOS_GERENCIADOS[img.mode])
+        convertida = ImageCms.applyTransform(img, t)
+    except (ImageCms.PyCMSError, ValueError, OSError):
+        return img
+    convertida.info = {**img.info, "icc_profile": perfil_saida_bytes()}
+    return convertida
+
+
+def para_cmyk(img):
+    """Converte uma imagem no perfil de saída para o perfil CMYK configurado"""
+    destino = chave_cmyk()
+    if destino is None:
+        raise ValueError("nenhum perfil CMYK configurado (RETRATOS_PERFIL_CMYK)")
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    cmyk = ImageCms.applyTransform(img, transformacao(chave_saida(), destino, "RGB", "CMYK"))
+    cmyk.info["icc_profile"] = _perfil(destino)[1]
+    return cmyk
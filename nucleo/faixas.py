@@ -0,0 +1,240 @@
+"""Leitura em faixas de TIFF e BMP grandes (digitalizações de centenas de MP).
+
+A imagem nunca é decodificada inteira: cada faixa de linhas é decodificada,
+reduzida por um fator inteiro (``Image.reduce``, média de blocos) e colada
+na imagem reduzida. O pico de memória fica em uma faixa mais o resultado.
+
+- sem compressão (TIFF em faixas, BMP): as linhas são lidas direto do
+  buffer do upload, ou de um ``numpy.memmap`` quando é um caminho;
+- TIFF comprimido em faixas ou blocos: para cada faixa montamos um TIFF
+  mínimo só com os dados daquela região e o libtiff decodifica.
+
+O alfa é reduzido pré-multiplicado e achatado depois, já na imagem pequena.
+"""
+
+import io
+import math
+
+import numpy as np
+from PIL import BmpImagePlugin, Image, TiffImagePlugin, TiffTags
+
+from nucleo.cores import converter_para_saida
+from nucleo.sonda import ORIENTACOES_TRANSPOSTAS, ImagemRejeitada, bytes_por_pixel
+
+# Sem o buffer inteiro na memória, o limite passa a ser o tempo de decodificação
+LIMITE_MEGAPIXELS_FAIXAS = 2000
+# Quanto de pixels decodificados cada faixa pode ocupar
+BYTES_POR_FAIXA = 32 * 1024 * 1024
+
+# Tags copiadas para o TIFF mínimo de cada faixa
+TAGS_FAIXA = (
+    256, 258, 259, 262, 266, 277, 284, 317, 320, 322, 323, 332, 338, 339,
+    347, 529, 530, 531, 532,
+)
+
+# Mesmas transposições do ImageOps.exif_transpose
+TRANSPOSICOES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Modo da faixa -> modo em que ela é reduzida (alfa pré-multiplicado)
+MODOS_REDUCAO = {"RGBA": "RGBa", "LA": "La", "1": "L"}
+
+
+def _abrir_cabecalho(fp):
+    """Abre TIFF/BMP só pelo cabeçalho, sem o limite de pixels do ``Image.open``"""
+    fp.seek(0)
+    assinatura = fp.read(4)
+    fp.seek(0)
+    if assinatura[:2] == b"BM":
+        classe = BmpImagePlugin.BmpImageFile
+    elif assinatura in TiffImagePlugin.PREFIXES:
+        classe = TiffImagePlugin.TiffImageFile
+    else:
+        return None
+    try:
+        return classe(fp)
+    except Exception as e:
+        raise ImagemRejeitada(f"arquivo de imagem inválido ou corrompido: {e}") from e
+
+
+def _buffer(arquivo):
+    """Bytes do arquivo sem copiar: buffer do upload ou memmap do caminho"""
+    if hasattr(arquivo, "getbuffer"):
+        return arquivo.getbuffer()
+    return memoryview(np.memmap(arquivo, dtype=np.uint8, mode="r"))
+
+
+def _faixas_brutas(img, buffer, linhas_por_faixa):
+    """Faixas de arquivos sem compressão, lidas direto do buffer"""
+    largura = img.width
+    for tile in img.tile:
+        _, (_, y0, _, y1), offset, args = tile
+        rawmode, stride, orientacao = (tuple(args) + (0, 1))[:3]
+        altura = y1 - y0
+        if stride == 0:
+            stride = img.tag_v2[279][0] // min(img.tag_v2.get(278, altura), altura)
+        for inicio in range(0, altura, linhas_por_faixa):
+            linhas = min(linhas_por_faixa, altura - inicio)
+            # BMP guarda as linhas de baixo para cima
+            primeira = inicio if orientacao > 0 else altura - inicio - linhas
+            dados = buffer[offset + primeira * stride: offset + (primeira + linhas) * stride]
+            yield Image.frombuffer(img.mode, (largura, linhas), dados, "raw", rawmode, stride, orientacao)
+
+
+def _tiff_da_faixa(img, buffer, linhas, offsets, contagens, tags_offsets):
+    """TIFF mínimo com a altura da faixa e só os dados (faixas ou blocos) dela"""
+    prefixo = b"II*\x00" if img.tag_v2._endian == "<" else b"MM\x00*"
+    dados = b"".join(bytes(buffer[o:o + c]) for o, c in zip(offsets, contagens))
+
+    ifd = TiffImagePlugin.ImageFileDirectory_v2(ifh=prefixo + b"\x00\x00\x00\x00")
+    for tag in TAGS_FAIXA:
+        if tag in img.tag_v2:
+            ifd[tag] = img.tag_v2[tag]
+            ifd.tagtype[tag] = img.tag_v2.tagtype[tag]
+    ifd[257] = linhas
+    if 278 in img.tag_v2:
+        ifd[278] = img.tag_v2[278]
+    relativos, posicao = [], 0
+    for c in contagens:
+        relativos.append(posicao)
+        posicao += c
+    tag_offsets, tag_contagens = tags_offsets
+    ifd[tag_offsets] = tuple(relativos)
+    ifd[tag_contagens] = tuple(contagens)
+    ifd.tagtype[tag_offsets] = ifd.tagtype[tag_contagens] = TiffTags.LONG
+    if tag_offsets != 273:
+        # O Pillow só realoca StripOffsets para depois do IFD; TileOffsets
+        # precisam ser absolutos (o tamanho do IFD não depende dos valores)
+        inicio_dados = 8 + len(ifd.tobytes(8))
+        ifd[tag_offsets] = tuple(inicio_dados + r for r in relativos)
+
+    ordem = "little" if img.tag_v2._endian == "<" else "big"
+    arquivo = io.BytesIO(prefixo + (8).to_bytes(4, ordem) + ifd.tobytes(8) + dados)
+    faixa = Image.open(arquivo)
+    faixa.load()
+    return faixa
+
+
+def _faixas_comprimidas(img, buffer, linhas_por_faixa):
+    """Faixas de TIFF comprimido: um TIFF mínimo por grupo de faixas/blocos"""
+    altura = img.height
+    if 324 in img.tag_v2:
+        # Blocos: uma fileira de blocos por vez
+        por_fileira = math.ceil(img.width / img.tag_v2[322])
+        passo = img.tag_v2[323]
+        offsets, contagens, tags = img.tag_v2[324], img.tag_v2[325], (324, 325)
+        grupo = max(1, linhas_por_faixa // passo)
+    else:
+        por_fileira = 1
+        passo = img.tag_v2.get(278, altura)
+        offsets, contagens, tags = img.tag_v2[273], img.tag_v2[279], (273, 279)
+        grupo = max(1, linhas_por_faixa // passo)
+
+    fileiras = math.ceil(altura / passo)
+    for f0 in range(0, fileiras, grupo):
+        f1 = min(fileiras, f0 + grupo)
+        linhas = min(altura, f1 * passo) - f0 * passo
+        fatia = slice(f0 * por_fileira, f1 * por_fileira)
+        yield _tiff_da_faixa(img, buffer, linhas, offsets[fatia], contagens[fatia], tags)
+
+
+def _faixas(img, buffer, linhas_por_faixa):
+    if all(tile[0] == "raw" and tile[1][0] == 0 and tile[1][2] == img.width for tile in img.tile):
+        return _faixas_brutas(img, buffer, linhas_por_faixa)
+    if img.format == "TIFF" and img.tag_v2.get(284, 1) == 1 and img.tag_v2._bigtiff is False:
+        return _faixas_comprimidas(img, buffer, linhas_por_faixa)
+    return None
+
+
+def _preparar(faixa):
+    """Leva a faixa a um modo que o ``Image.reduce`` aceita"""
+    if faixa.mode.startswith("I;16"):
+        return Image.fromarray((np.asarray(faixa) >> 8).astype(np.uint8), "L")
+    if faixa.mode == "P":
+        faixa = faixa.convert("RGBA" if "transparency" in faixa.info else "RGB")
+    modo = MODOS_REDUCAO.get(faixa.mode)
+    return faixa.convert(modo) if modo else faixa
+
+
+def abrir_em_faixas(arquivo, tamanho_alvo, max_megapixels=LIMITE_MEGAPIXELS_FAIXAS):
+    """Decodifica TIFF/BMP grande em faixas já reduzidas para cobrir ``tamanho_alvo``.
+
+    Devolve ``(imagem, tamanho_original)`` com a orientação e o perfil de
+    cor aplicados (o tamanho já na orientação exibida), ou ``None`` se o arquivo não for
+    TIFF/BMP ou o layout não permitir leitura em faixas (use ``abrir_imagem``).
+    """
+    fp = open(arquivo, "rb") if isinstance(arquivo, str) else arquivo
+    try:
+        img = _abrir_cabecalho(fp)
+        if img is None:
+            return None
+        largura, altura = img.size
+        if largura * altura / 1_000_000 > max_megapixels:
+            raise ImagemRejeitada(
+                f"{largura}×{altura} px ({largura * altura / 1_000_000:.0f} MP) "
+                f"excede o limite de {max_megapixels} MP"
+            )
+        try:
+            orientacao = img.getexif().get(0x0112, 1)
+        except Exception:
+            orientacao = 1
+
+        alvo_w, alvo_h = tamanho_alvo
+        if orientacao in ORIENTACOES_TRANSPOSTAS:
+            alvo_w, alvo_h = alvo_h, alvo_w
+        fator = max(1, min(largura // alvo_w, altura // alvo_h))
+
+        # Faixas com altura múltipla do fator: os blocos nunca cruzam faixas
+        bytes_linha = largura * bytes_por_pixel(img.mode)
+        linhas_por_faixa = max(fator, BYTES_POR_FAIXA // bytes_linha // fator * fator)
+        faixas = _faixas(img, _buffer(arquivo), linhas_por_faixa)
+        if faixas is None:
+            return None
+
+        reduzida = None
+        y = 0
+        sobra = None
+        try:
+            for faixa in faixas:
+                faixa = _preparar(faixa)
+                if sobra is not None:
+                    # Linhas que não fecharam um bloco na faixa anterior
+                    juntas = Image.new(faixa.mode, (largura, sobra.height + faixa.height))
+                    juntas.paste(sobra, (0, 0))
+                    juntas.paste(faixa, (0, sobra.height))
+                    faixa, sobra = juntas, None
+                inteiras = faixa.height // fator * fator
+                if inteiras < faixa.height:
+                    sobra = faixa.crop((0, inteiras, largura, faixa.height))
+                    faixa = faixa.crop((0, 0, largura, inteiras))
+                if reduzida is None:
+                    reduzida = Image.new(faixa.mode, (math.ceil(largura / fator), math.ceil(altura / fator)))
+                if faixa.height:
+                    reduzida.paste(faixa.reduce(fator), (0, y))
+                    y += faixa.height // fator
+            if sobra is not None:
+                reduzida.paste(sobra.reduce(fator), (0, y))
+        except ImagemRejeitada:
+            raise
+        except Exception as e:
+            raise ImagemRejeitada(f"falha ao decodificar a imagem: {e}") from e
+
+        if reduzida.mode in ("RGBa", "La"):
+            reduzida = reduzida.convert("RGBA" if reduzida.mode == "RGBa" else "LA")
+        if orientacao in TRANSPOSICOES:
+            reduzida = reduzida.transpose(TRANSPOSICOES[orientacao])
+        if img.info.get("icc_profile"):
+            reduzida.info["icc_profile"] = img.info["icc_profile"]
+        if orientacao in ORIENTACOES_TRANSPOSTAS:
+            largura, altura = altura, largura
+        return converter_para_saida(reduzida), (largura, altura)
+    finally:
+        if fp is not arquivo:
+            fp.close()
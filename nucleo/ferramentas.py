@@ -0,0 +1,14 @@
+"""Catálogo dos apps do projeto, usado pelo lançador e pelos benchmarks."""
+
+# (script, título, ícone)
+FERRAMENTAS = [
+    ("01-imagem-para-pdf.py", "Imagens → PDF", "📄"),
+    ("02-fotos3x4em10x15maisPola.py", "Fotos 3x4 e Polaroid", "📸"),
+    ("03-fotos-multi-formato.py", "Fotos Multi-Formato", "🖼️"),
+    ("10x15A4.py", "Fotos 10×15 em A4", "🗂️"),
+    ("Dezporquinze.py", "10×15 em PDF", "🖨️"),
+    ("3 em 20x15", "Tríptico 20×15", "🏞️"),
+    ("3em20x15.py", "Mosaico Tríptico", "🧩"),
+    ("Juntar-pdf.py", "Juntar PDFs", "📚"),
+    ("melhora-foto.py", "Melhorar Foto com IA", "🧠"),
+]
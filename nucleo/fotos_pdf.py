@@ -0,0 +1,228 @@
+"""Fotos a partir de PDFs enviados no lugar de JPG/PNG.
+
+Cada página vira uma ou mais "fotos" que seguem pelo pipeline normal dos
+apps (sondagem, recorte, montagem):
+
+- página que é só foto (sem texto, imagens JPEG/PNG RGB ou cinza, em pé,
+  cobrindo boa parte da página): as imagens embutidas saem como estão,
+  sem decodificar nem recomprimir;
+- qualquer outra (documento, carteirinha, imagem girada, CMYK, JPEG 2000):
+  a página é rasterizada no DPI que o espaço de destino precisa (entre
+  ``DPI_MINIMO`` e ``DPI_MAXIMO``), em processos paralelos (o PyMuPDF não
+  pode ser usado por várias threads) e guardada no cache em disco por
+  (hash do arquivo, página, DPI).
+"""
+
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+import streamlit as st
+
+from nucleo.cache_disco import cache_compartilhado, versao_codigo
+from nucleo.hashes import hash_bytes
+from nucleo.metricas import ERROS, medido
+from nucleo.rasterizacao import QUALIDADE_JPEG, rasterizar
+
+DPI_MINIMO = 150  # abaixo disso o recorte (rosto, 3x4) fica sem detalhe
+DPI_MAXIMO = 600
+
+# Fração da página coberta pelas imagens para a página contar como "só foto"
+COBERTURA_MINIMA = 0.25
+# Imagens menores que isso (logos, ícones, selos) não são fotos
+LADO_MINIMO_PX = 200
+# Formatos que o Pillow lê direto da extração; componentes de cor aceitos (cinza, RGB)
+FORMATOS_EXTRAIVEIS = ("jpeg", "png")
+COMPONENTES_EXTRAIVEIS = (1, 3)
+
+TIPOS_UPLOAD = ["jpg", "jpeg", "png", "pdf"]
+
+# Páginas lidas por PDF enviado; as seguintes são ignoradas com um aviso
+LIMITE_PAGINAS = int(os.environ.get("RETRATOS_PDF_PAGINAS", "50"))
+
+# Um núcleo fica para o servidor e a fila de renderização
+RASTERIZADORES = max(1, (os.cpu_count() or 2) - 1)
+
+
+class FotoDePdf(io.BytesIO):
+    """Foto tirada de um PDF com a mesma interface usada dos UploadedFile (name, type, size, file_id)"""
+
+    def __init__(self, dados, name, file_id):
+        super().__init__(dados)
+        self.name = name
+        self.type = "image/jpeg" if name.lower().endswith(".jpg") else "image/png"
+        self.size = len(dados)
+        self.file_id = file_id
+
+
+def e_pdf(arquivo):
+    if getattr(arquivo, "type", None) == "application/pdf":
+        return True
+    return getattr(arquivo, "name", "").lower().endswith(".pdf")
+
+
+def dpi_para_caixa(pagina_pt, caixa_px):
+    """DPI em que a página cobre a caixa (lado maior com lado maior), limitado a [DPI_MINIMO, DPI_MAXIMO]"""
+    pagina = sorted(pagina_pt)
+    caixa = sorted(caixa_px)
+    dpi = max(caixa[0] * 72 / pagina[0], caixa[1] * 72 / pagina[1])
+    return int(min(DPI_MAXIMO, max(DPI_MINIMO, round(dpi))))
+
+
+def _fotos_embutidas(pagina):
+    """Imagens da página a extrair como estão, ou None se a página tem que ser rasterizada"""
+    if pagina.rotation or pagina.get_text("text").strip():
+        return None
+    fotos = [
+        info for info in pagina.get_image_info(xrefs=True)
+        if info["xref"] and min(info["width"], info["height"]) >= LADO_MINIMO_PX
+    ]
+    if not fotos:
+        return None
+    area = pagina.rect.width * pagina.rect.height
+    if sum(pymupdf.Rect(info["bbox"]).get_area() for info in fotos) < COBERTURA_MINIMA * area:
+        return None
+    for info in fotos:
+        a, b, c, d = info["transform"][:4]
+        # Girada ou espelhada na página: a rasterização mostra como o cliente vê
+        if b or c or a <= 0 or d <= 0 or info["has-mask"] or info["colorspace"] not in COMPONENTES_EXTRAIVEIS:
+            return None
+    return fotos
+
+
+VERSAO_RASTER = versao_codigo(rasterizar, f"{pymupdf.VersionBind}:{QUALIDADE_JPEG}")
+
+_processos = None
+_trava_processos = threading.Lock()
+
+
+def processos_compartilhados():
+    """Pool de processos do servidor para a rasterização, criado no primeiro uso"""
+    global _processos
+    with _trava_processos:
+        if _processos is None:
+            _processos = ProcessPoolExecutor(
+                max_workers=RASTERIZADORES,
+                # spawn: o fork de um processo com threads (Streamlit, fila) pode travar
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _processos
+
+
+def _rasterizar_paginas(dados, hash_arquivo, pedidos):
+    """JPEG de cada (índice, dpi): do cache em disco, ou rasterizado em paralelo"""
+    cache = cache_compartilhado()
+    chaves = [cache.chave("pdf_pagina", hash_arquivo, {"pagina": i, "dpi": dpi}, VERSAO_RASTER) for i, dpi in pedidos]
+    resultados = [cache.obter(chave) for chave in chaves]
+    faltando = [n for n, jpeg in enumerate(resultados) if jpeg is None]
+    if not faltando:
+        return resultados
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "entrada.pdf")
+        with open(caminho, "wb") as f:
+            f.write(dados)
+        if len(faltando) == 1 or RASTERIZADORES == 1:
+            # Uma página só (ou um processo só): não compensa acordar o pool
+            gerados = [rasterizar(caminho, *pedidos[n]) for n in faltando]
+        else:
+            pool = processos_compartilhados()
+            gerados = list(pool.map(rasterizar, [caminho] * len(faltando), *zip(*(pedidos[n] for n in faltando))))
+    for n, jpeg in zip(faltando, gerados):
+        cache.gravar(chaves[n], jpeg)
+        resultados[n] = jpeg
+    return resultados
+
+
+# cache_resource: a lista é lida, nunca alterada, então as sessões dividem a
+# mesma cópia em vez de desserializar todas as páginas a cada reexecução.
+# Poucas entradas: as páginas rasterizadas continuam no cache em disco.
+@st.cache_resource(show_spinner="Lendo o PDF...", max_entries=8)
+@medido("fotos_de_pdf")
+def fotos_de_pdf(hash_arquivo, nome, caixa_px, _dados, paginas=LIMITE_PAGINAS):
+    """([(nome, bytes)] das fotos das primeiras ``paginas`` páginas, total de páginas do PDF)"""
+    base = os.path.splitext(nome)[0]
+    fotos, a_rasterizar, extraidas = [], [], {}
+    with pymupdf.open(stream=_dados, filetype="pdf") as doc:
+        total_paginas = doc.page_count
+        for indice in range(min(paginas, total_paginas)):
+            pagina = doc[indice]
+            imagens = []
+            for info in _fotos_embutidas(pagina) or []:
+                # A mesma imagem repetida em várias páginas é extraída uma vez
+                if info["xref"] not in extraidas:
+                    extraidas[info["xref"]] = doc.extract_image(info["xref"])
+                imagens.append(extraidas[info["xref"]])
+            if any(imagem["ext"] not in FORMATOS_EXTRAIVEIS for imagem in imagens):
+                # JPEG 2000, JBIG2...: o Pillow não lê, a página é rasterizada
+                imagens = []
+            if not imagens:
+                dpi = dpi_para_caixa((pagina.rect.width, pagina.rect.height), caixa_px)
+                a_rasterizar.append((len(fotos), indice, dpi))
+                fotos.append((f"{base} p{indice + 1}.jpg", None))
+                continue
+            for k, imagem in enumerate(imagens, start=1):
+                sufixo = f" foto{k}" if len(imagens) > 1 else ""
+                extensao = "jpg" if imagem["ext"] == "jpeg" else "png"
+                fotos.append((f"{base} p{indice + 1}{sufixo}.{extensao}", imagem["image"]))
+    if a_rasterizar:
+        jpegs = _rasterizar_paginas(_dados, hash_arquivo, [(indice, dpi) for _, indice, dpi in a_rasterizar])
+        for (posicao, _, _), jpeg in zip(a_rasterizar, jpegs):
+            fotos[posicao] = (fotos[posicao][0], jpeg)
+    return fotos, total_paginas
+
+
+def _ler_pdf(arquivo, caixa_px, paginas):
+    """(fotos como FotoDePdf, total de páginas), ou None se o PDF não abre (já avisado na tela)"""
+    dados = arquivo.getvalue()
+    try:
+        fotos, total_paginas = fotos_de_pdf(hash_bytes(dados), arquivo.name, tuple(caixa_px), dados, paginas)
+    except (pymupdf.FileDataError, RuntimeError, ValueError) as e:
+        ERROS.inc(ferramenta="fotos_de_pdf")
+        st.error(f"Não foi possível ler o PDF {arquivo.name}: {e}")
+        return None
+    if not total_paginas:
+        st.warning(f"{arquivo.name} não tem páginas.")
+    file_id = getattr(arquivo, "file_id", hash_bytes(dados))
+    return [FotoDePdf(jpeg, nome, f"{file_id}:{n}") for n, (nome, jpeg) in enumerate(fotos)], total_paginas
+
+
+def expandir_pdfs(arquivos, caixa_px):
+    """Troca cada PDF da lista pelas fotos dele; os demais arquivos passam como estão.
+
+    ``caixa_px`` é o tamanho do espaço de destino no DPI de saída: define o
+    DPI das páginas rasterizadas. De cada PDF só as ``LIMITE_PAGINAS``
+    primeiras páginas são lidas. PDFs que não abrem viram uma mensagem de erro.
+    """
+    saida = []
+    for arquivo in arquivos:
+        if not e_pdf(arquivo):
+            saida.append(arquivo)
+            continue
+        lido = _ler_pdf(arquivo, caixa_px, LIMITE_PAGINAS)
+        if lido is None:
+            continue
+        fotos, total_paginas = lido
+        if total_paginas > LIMITE_PAGINAS:
+            st.warning(f"{arquivo.name} tem {total_paginas} páginas: só as {LIMITE_PAGINAS} primeiras foram usadas.")
+        saida.extend(fotos)
+    return saida
+
+
+def primeira_foto(arquivo, caixa_px):
+    """Para os campos de uma foto só: a primeira foto do PDF (ou o próprio arquivo).
+
+    Só a primeira página é lida, e rasterizada se for o caso.
+    """
+    if arquivo is None or not e_pdf(arquivo):
+        return arquivo
+    lido = _ler_pdf(arquivo, caixa_px, 1)
+    if not lido or not lido[0]:
+        return None
+    fotos, total_paginas = lido
+    if total_paginas > 1 or len(fotos) > 1:
+        st.info(f"{arquivo.name} tem mais de uma página ou foto: usando a primeira ({fotos[0].name}).")
+    return fotos[0]
@@ -0,0 +1,53 @@
+"""Hashes de conteúdo: chave de cache entre reruns e sessões, e dHash perceptual."""
+
+import hashlib
+
+import numpy as np
+from PIL import Image
+
+# Diferença máxima (bits de 64) para duas fotos contarem como quase iguais:
+# pega a mesma foto reexportada, reduzida ou recomprimida, não fotos em sequência
+LIMITE_QUASE_IGUAIS = 6
+
+
+def hash_bytes(dados):
+    """Hash curto (BLAKE2b, 128 bits) dos bytes informados"""
+    return hashlib.blake2b(dados, digest_size=16).hexdigest()
+
+
+def hash_upload(arquivo):
+    """Hash do conteúdo de um UploadedFile (ou qualquer objeto com getvalue/read)"""
+    if hasattr(arquivo, "getbuffer"):
+        # memoryview do buffer do upload: hash sem copiar os bytes
+        return hash_bytes(arquivo.getbuffer())
+    arquivo.seek(0)
+    h = hashlib.blake2b(digest_size=16)
+    for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+        h.update(bloco)
+    arquivo.seek(0)
+    return h.hexdigest()
+
+
+def dhash(img):
+    """dHash de 64 bits: cada bit diz se um pixel é mais claro que o vizinho da direita (9x8, cinza)"""
+    cinza = np.asarray(img.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (cinza[:, 1:] > cinza[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def quase_iguais(novos, existentes, limite=LIMITE_QUASE_IGUAIS, ate=None):
+    """Para cada dHash de ``novos``, o índice do mais parecido em ``existentes`` (ou -1).
+
+    Compara todos contra todos de uma vez (XOR + contagem de bits no numpy).
+    Com ``ate``, o novo ``i`` só é comparado com ``existentes[:ate[i]]``.
+    """
+    if not len(novos) or not len(existentes):
+        return [-1] * len(novos)
+    a = np.asarray(novos, dtype=np.uint64)[:, None]
+    b = np.asarray(existentes, dtype=np.uint64)[None, :]
+    diferentes = np.unpackbits((a ^ b).view(np.uint8)[..., None], axis=-1).reshape(len(novos), len(existentes), -1)
+    distancias = diferentes.sum(axis=-1)
+    if ate is not None:
+        distancias[np.arange(len(existentes))[None, :] >= np.asarray(ate)[:, None]] = 65
+    melhor = distancias.argmin(axis=1)
+    return [int(j) if distancias[i, j] <= limite else -1 for i, j in enumerate(melhor)]
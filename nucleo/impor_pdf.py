@@ -0,0 +1,129 @@
+"""Imposição n-up e livreto direto dos PDFs de origem, sem rasterizar.
+
+Cada página de origem entra na folha como Form XObject (``show_pdf_page``
+do PyMuPDF): o conteúdo é referenciado com uma matriz de escala e rotação,
+não redesenhado, e as fontes e imagens de um arquivo são copiadas uma vez
+só para a saída. O tamanho do arquivo fica próximo ao da entrada e o
+custo é de milissegundos por página.
+
+As rotações escolhidas na tela (e o ``/Rotate`` da própria página) entram
+na matriz; o ``/Rotate`` da origem é zerado antes, porque o
+``show_pdf_page`` não o considera ao recortar a página.
+"""
+
+import pymupdf
+
+from nucleo.metricas import medido
+
+# Tamanhos em pontos (1/72"), em pé
+FOLHAS_PT = {
+    "A4": (595, 842),
+    "A3": (842, 1191),
+    "Carta": (612, 792),
+}
+MARGEM_PT = 14  # ≈ 5 mm: área que as impressoras não alcançam
+ESPACO_PT = 8   # entre as páginas de uma mesma folha
+
+# Páginas por folha -> (colunas, linhas, folha deitada)
+GRADES = {
+    2: (2, 1, True),
+    4: (2, 2, False),
+    8: (4, 2, True),
+}
+LIVRETO = "livreto"
+
+
+def celulas(tamanho_folha, colunas, linhas, margem=MARGEM_PT, espaco=ESPACO_PT):
+    """Retângulos das páginas na folha, em ordem de leitura"""
+    largura, altura = tamanho_folha
+    w = (largura - 2 * margem - (colunas - 1) * espaco) / colunas
+    h = (altura - 2 * margem - (linhas - 1) * espaco) / linhas
+    retangulos = []
+    for linha in range(linhas):
+        for coluna in range(colunas):
+            x, y = margem + coluna * (w + espaco), margem + linha * (h + espaco)
+            retangulos.append(pymupdf.Rect(x, y, x + w, y + h))
+    return retangulos
+
+
+def ordem_livreto(total):
+    """Páginas de cada face (esquerda, direita), com None nas brancas do fim.
+
+    Folhas dobradas ao meio e encaixadas: a primeira folha leva a última e
+    a primeira página na frente, a segunda e a penúltima no verso, e assim
+    por diante. Imprima frente e verso virando pela borda curta.
+    """
+    n = -(-total // 4) * 4
+
+    def pagina(i):
+        return i if i < total else None
+
+    faces = []
+    for folha in range(n // 4):
+        faces.append([pagina(n - 1 - 2 * folha), pagina(2 * folha)])
+        faces.append([pagina(2 * folha + 1), pagina(n - 2 - 2 * folha)])
+    return faces
+
+
+def plano_de_folhas(total, modo):
+    """Índices das páginas em cada face da saída, na ordem das células"""
+    if modo == LIVRETO:
+        return ordem_livreto(total)
+    return [list(range(i, min(i + modo, total))) for i in range(0, total, modo)]
+
+
+@medido("impor_pdf")
+def impor_paginas(paginas, caminhos, saida, modo=4, folha="A4", girar_para_caber=True, progress=None):
+    """Grava em ``saida`` as páginas [{"arquivo", "indice", "rotacao"}] impostas em ``modo``.
+
+    ``modo`` é o número de páginas por folha (2, 4 ou 8) ou ``LIVRETO``.
+    Com ``girar_para_caber`` a página que está deitada numa célula em pé (ou
+    o contrário) é girada 90° para aproveitar o espaço.
+    Devolve o número de folhas (faces) gravadas.
+    """
+    if modo == LIVRETO:
+        colunas, linhas, deitada, espaco = 2, 1, True, 0  # dobra no meio, sem espaço
+    else:
+        colunas, linhas, deitada = GRADES[modo]
+        espaco = ESPACO_PT
+    largura, altura = FOLHAS_PT[folha]
+    tamanho = (altura, largura) if deitada else (largura, altura)
+    retangulos = celulas(tamanho, colunas, linhas, espaco=espaco)
+
+    docs = {}
+    rotacoes_origem = {}
+    saida_doc = pymupdf.open()
+    faces = plano_de_folhas(len(paginas), modo)
+    try:
+        for n, face in enumerate(faces):
+            nova = saida_doc.new_page(width=tamanho[0], height=tamanho[1])
+            for celula, indice in zip(retangulos, face):
+                if indice is None:
+                    continue
+                pagina = paginas[indice]
+                h = pagina["arquivo"]
+                if h not in docs:
+                    docs[h] = pymupdf.open(caminhos[h])
+                origem = docs[h][pagina["indice"]]
+                chave = (h, pagina["indice"])
+                if chave not in rotacoes_origem:
+                    rotacoes_origem[chave] = origem.rotation
+                    # Só no documento aberto: o arquivo spoolado não muda
+                    origem.set_rotation(0)
+                rotacao = (rotacoes_origem[chave] + pagina["rotacao"]) % 360
+                w, h_pag = origem.rect.width, origem.rect.height
+                if rotacao in (90, 270):
+                    w, h_pag = h_pag, w
+                if girar_para_caber and (w > h_pag) != (celula.width > celula.height) and w != h_pag:
+                    # 90° anti-horário (topo à esquerda), como as impressoras fazem no n-up
+                    rotacao = (rotacao + 270) % 360
+                # /Rotate gira no sentido horário; o parâmetro do PyMuPDF, no anti-horário
+                nova.show_pdf_page(celula, docs[h], pagina["indice"], rotate=-rotacao)
+            if progress is not None:
+                progress.progress((n + 1) / len(faces))
+        saida_doc.save(saida, garbage=1, deflate=True)
+    finally:
+        saida_doc.close()
+        for doc in docs.values():
+            doc.close()
+    return len(faces)
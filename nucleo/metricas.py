@@ -0,0 +1,303 @@
+"""Métricas do processo inteiro: contadores e histogramas de todas as sessões.
+
+Cada pipeline reporta aqui (renderizações por ferramenta, acertos do cache,
+bytes decodificados e codificados, tarefas da fila, erros e latências) e o
+registro é exportado de duas formas, ambas desligadas por padrão:
+
+- ``RETRATOS_METRICAS_PORTA``: servidor HTTP local com ``/metrics`` no
+  formato texto do Prometheus e ``/metrics.json``;
+- ``RETRATOS_METRICAS_JSON``: caminho de um arquivo JSON regravado a cada
+  ``RETRATOS_METRICAS_INTERVALO`` segundos (60 por padrão) e na saída.
+
+Registrar um evento é uma busca em dicionário sob uma trava (cerca de um
+microssegundo); a formatação só acontece quando alguém lê as métricas.
+"""
+
+import atexit
+import bisect
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORTA = os.environ.get("RETRATOS_METRICAS_PORTA")
+ENDERECO = os.environ.get("RETRATOS_METRICAS_ENDERECO", "127.0.0.1")
+ARQUIVO_JSON = os.environ.get("RETRATOS_METRICAS_JSON")
+INTERVALO_JSON = float(os.environ.get("RETRATOS_METRICAS_INTERVALO", "60"))
+
+# Limites (em segundos) dos histogramas de latência: de 5 ms a 2 min
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _chave(rotulos):
+    return tuple(sorted(rotulos.items()))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos_texto(chave, extra=()):
+    pares = list(chave) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+class Contador:
+    """Valor que só cresce, por combinação de rótulos"""
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores = {}
+        self._trava = threading.Lock()
+
+    def inc(self, valor=1, **rotulos):
+        chave = _chave(rotulos)
+        with self._trava:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valores(self):
+        with self._trava:
+            return dict(self._valores)
+
+    def linhas(self):
+        return [f"{self.nome}{_rotulos_texto(chave)} {valor}" for chave, valor in self.valores().items()]
+
+    def instantaneo(self):
+        return [{"rotulos": dict(chave), "valor": valor} for chave, valor in self.valores().items()]
+
+
+class Histograma:
+    """Contagem por faixa, soma e total das observações, por combinação de rótulos"""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, limites=LIMITES_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites)
+        # chave -> [contagens por faixa (a última é +Inf), soma, total]
+        self._series = {}
+        self._trava = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = _chave(rotulos)
+        faixa = bisect.bisect_left(self.limites, valor)
+        with self._trava:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][faixa] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def series(self):
+        with self._trava:
+            return {chave: (list(contagens), soma, total) for chave, (contagens, soma, total) in self._series.items()}
+
+    def linhas(self):
+        linhas = []
+        for chave, (contagens, soma, total) in self.series().items():
+            acumulado = 0
+            for limite, contagem in zip(self.limites + ("+Inf",), contagens):
+                acumulado += contagem
+                linhas.append(f"{self.nome}_bucket{_rotulos_texto(chave, [('le', limite)])} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos_texto(chave)} {soma}")
+            linhas.append(f"{self.nome}_count{_rotulos_texto(chave)} {total}")
+        return linhas
+
+    def instantaneo(self):
+        return [
+            {"rotulos": dict(chave), "faixas": dict(zip(map(str, self.limites + ("+Inf",)), contagens)),
+             "soma": soma, "total": total}
+            for chave, (contagens, soma, total) in self.series().items()
+        ]
+
+
+class Medidor:
+    """Valor instantâneo lido de uma função na hora da exportação (ex.: tamanho da fila)"""
+
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, funcao):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.funcao = funcao
+
+    def _ler(self):
+        try:
+            return self.funcao()
+        except Exception:
+            return None
+
+    def linhas(self):
+        valor = self._ler()
+        return [] if valor is None else [f"{self.nome} {valor}"]
+
+    def instantaneo(self):
+        valor = self._ler()
+        return [] if valor is None else [{"rotulos": {}, "valor": valor}]
+
+
+_metricas = {}
+_trava_registro = threading.Lock()
+
+
+def _registrar(metrica):
+    with _trava_registro:
+        return _metricas.setdefault(metrica.nome, metrica)
+
+
+def contador(nome, ajuda):
+    return _registrar(Contador(nome, ajuda))
+
+
+def histograma(nome, ajuda, limites=LIMITES_SEGUNDOS):
+    return _registrar(Histograma(nome, ajuda, limites))
+
+
+def medidor(nome, ajuda, funcao):
+    """Registra (ou troca) a função lida na exportação"""
+    with _trava_registro:
+        _metricas[nome] = Medidor(nome, ajuda, funcao)
+        return _metricas[nome]
+
+
+# Catálogo das métricas reportadas pelos apps
+RENDERIZACOES = contador("retratos_renderizacoes_total", "Renderizações concluídas por ferramenta")
+DURACAO = histograma("retratos_renderizacao_segundos", "Duração das renderizações por ferramenta")
+ERROS = contador("retratos_erros_total", "Erros por ferramenta ou etapa")
+CACHE = contador("retratos_cache_consultas_total", "Consultas ao cache de impressões em disco, por resultado")
+BYTES_DECODIFICADOS = contador("retratos_bytes_decodificados_total", "Bytes de imagem lidos para decodificação, por formato")
+BYTES_CODIFICADOS = contador("retratos_bytes_codificados_total", "Bytes de saída codificados (JPEG/PDF/PNG), por ferramenta")
+TAREFAS = contador("retratos_fila_tarefas_total", "Tarefas da fila compartilhada, por resultado")
+ESPERA_FILA = histograma("retratos_fila_espera_segundos", "Tempo entre a submissão e o início de cada tarefa")
+
+
+@contextmanager
+def medir(ferramenta):
+    """Conta a renderização, a duração e, se o bloco levantar exceção, o erro"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        ERROS.inc(ferramenta=ferramenta)
+        raise
+    DURACAO.observar(time.perf_counter() - inicio, ferramenta=ferramenta)
+    RENDERIZACOES.inc(ferramenta=ferramenta)
+
+
+def medido(ferramenta):
+    """Decorador: a função inteira conta como uma renderização de ``ferramenta``"""
+    def decorar(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with medir(ferramenta):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorar
+
+
+def texto_prometheus():
+    """Todas as métricas no formato texto de exposição do Prometheus"""
+    with _trava_registro:
+        metricas = list(_metricas.values())
+    saida = []
+    for metrica in metricas:
+        saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        saida.extend(metrica.linhas())
+    return "\n".join(saida) + "\n"
+
+
+def instantaneo():
+    """Dicionário serializável com todas as métricas e o momento da leitura"""
+    with _trava_registro:
+        metricas = list(_metricas.values())
+    return {
+        "momento": time.time(),
+        "metricas": {m.nome: {"tipo": m.tipo, "ajuda": m.ajuda, "series": m.instantaneo()} for m in metricas},
+    }
+
+
+def gravar_instantaneo(caminho=None):
+    """Grava em arquivo temporário e renomeia: quem lê nunca vê o JSON pela metade"""
+    caminho = caminho or ARQUIVO_JSON
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(instantaneo(), f)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+class _Exportador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            corpo, tipo = texto_prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            corpo, tipo = json.dumps(instantaneo()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _gravar_periodicamente():
+    while True:
+        time.sleep(INTERVALO_JSON)
+        try:
+            gravar_instantaneo()
+        except OSError:
+            pass
+
+
+_exportacao_iniciada = False
+
+
+def iniciar_exportacao():
+    """Sobe o servidor HTTP e a gravação do JSON configurados, uma vez, só no processo do servidor"""
+    global _exportacao_iniciada
+    if multiprocessing.parent_process() is not None:
+        # Processo auxiliar (ex.: pool de rasterização): registro vazio, não pode sobrescrever o do servidor
+        return
+    with _trava_registro:
+        if _exportacao_iniciada:
+            return
+        _exportacao_iniciada = True
+    if PORTA:
+        try:
+            servidor = ThreadingHTTPServer((ENDERECO, int(PORTA)), _Exportador)
+        except OSError:
+            # Porta ocupada (ex.: outro processo do servidor): segue sem o endpoint
+            servidor = None
+        if servidor is not None:
+            servidor.daemon_threads = True
+            threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    if ARQUIVO_JSON:
+        threading.Thread(target=_gravar_periodicamente, name="metricas-json", daemon=True).start()
+        atexit.register(gravar_instantaneo)
+
+
+# O módulo é importado uma vez por processo (as reexecuções do Streamlit reaproveitam)
+iniciar_exportacao()
@@ -0,0 +1,28 @@
+"""Miniaturas de páginas PDF renderizadas sob demanda com PyMuPDF.
+
+Cada miniatura é cacheada por (hash do arquivo, índice da página, zoom),
+então mudar a ordem, girar ou excluir páginas não renderiza nada de novo.
+O caminho do PDF (spoolado em disco) entra com ``_`` no nome para o
+Streamlit não usá-lo na chave: o hash do conteúdo já identifica o arquivo.
+"""
+
+import pymupdf
+import streamlit as st
+
+# zoom 1.0 = 72 DPI; 0.25 deixa uma página A4 com ~150 px de largura
+ZOOM_PADRAO = 0.25
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def contar_paginas(hash_arquivo, _caminho):
+    """Número de páginas do PDF (o PyMuPDF lê só a estrutura, não o conteúdo)"""
+    with pymupdf.open(_caminho) as doc:
+        return doc.page_count
+
+
+@st.cache_data(show_spinner=False, max_entries=2000)
+def renderizar_miniatura(hash_arquivo, indice, zoom, _caminho):
+    """PNG de baixa resolução de uma única página"""
+    with pymupdf.open(_caminho) as doc:
+        pix = doc[indice].get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+        return pix.tobytes("png")
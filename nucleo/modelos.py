@@ -0,0 +1,236 @@
+"""Modelos de folha declarativos: papel, espaços das fotos, marcas de corte e textos.
+
+Um modelo é um dict com as medidas em centímetros. ``compilar`` converte o
+modelo para pixels num DPI uma única vez por processo (o resultado fica em
+cache), e ``renderizar`` executa o modelo compilado. Um produto novo de
+impressão passa a ser um dict novo em ``MODELOS``, não um script novo.
+
+Campos do modelo:
+
+- ``papel``: (largura, altura) em cm;
+- ``sangria``: cm acrescentados em volta do papel (padrão 0);
+- ``margem``: cm da borda até a primeira célula quando a grade não é
+  centralizada (padrão 0);
+- ``grade``: ``colunas``, ``linhas``, ``celula`` (largura, altura em cm),
+  ``espaco`` (cm entre células) e ``centralizar`` (padrão True). Ajustes
+  feitos na tela em pixels entram como ``acrescimo_px`` (em volta de cada
+  célula) e ``espaco_px``;
+- ``slots``: alternativa à grade, lista de (x, y, largura, altura) em cm;
+- ``corte``: ``estilo`` (``contorno`` em volta de cada espaço ou ``margem``,
+  traços fora da área das fotos), ``cor``, ``espessura`` (mm) e, no estilo
+  ``margem``, ``comprimento`` e ``afastamento`` (cm);
+- ``textos``: lista de {``texto``, ``posicao`` (cm), ``cor``, ``tamanho``
+  (pt; None = fonte padrão pequena)}.
+
+As conversões usam ``int(cm * dpi / 2.54)``, como os scripts sempre fizeram,
+então as folhas migradas saem idênticas pixel a pixel.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from nucleo.compositor import montar_slots
+from nucleo.reamostragem import entrega_arrays, redimensionar
+from nucleo.recursos import fonte
+
+MAX_COMPILADOS = 256
+
+MODELOS = {
+    # Quatro fotos 10x15 em pé numa folha A4
+    "10x15_em_a4": {
+        "papel": (21, 29.7),
+        "grade": {"colunas": 2, "linhas": 2, "celula": (10, 15)},
+    },
+    # Uma foto 10x15 deitada no centro do A4, com guias vermelhas para o corte
+    "10x15_centralizada_a4": {
+        "papel": (21, 29.7),
+        "grade": {"colunas": 1, "linhas": 1, "celula": (15, 10)},
+        "corte": {"estilo": "contorno", "cor": "red", "espessura": 0.254},
+        # ≈ 50 px do canto a 300 DPI
+        "textos": [{"texto": "Imagem 10x15cm - Corte nas linhas vermelhas", "posicao": (0.424, 0.424), "cor": "black"}],
+    },
+    # Dez fotos 3x4 (5 x 2) numa folha 10x15 deitada, a partir do canto
+    "3x4_em_10x15": {
+        "papel": (15, 10),
+        "grade": {"colunas": 5, "linhas": 2, "celula": (3, 4), "centralizar": False},
+    },
+}
+
+_compilados = OrderedDict()
+_trava = threading.Lock()
+
+
+def cm_para_px(cm, dpi):
+    return int(cm * dpi / 2.54)
+
+
+def chave_modelo(modelo):
+    """JSON estável do modelo: identifica a geometria no cache e nas versões de cache em disco"""
+    return json.dumps(modelo, sort_keys=True)
+
+
+def variante(modelo, **grade):
+    """Cópia do modelo com campos da grade trocados (ex.: ``espaco_px`` escolhido na tela)"""
+    return {**modelo, "grade": {**modelo["grade"], **grade}}
+
+
+def _slots_da_grade(grade, tamanho, sangria, margem, dpi):
+    largura = cm_para_px(grade["celula"][0], dpi) + 2 * grade.get("acrescimo_px", 0)
+    altura = cm_para_px(grade["celula"][1], dpi) + 2 * grade.get("acrescimo_px", 0)
+    espaco = cm_para_px(grade.get("espaco", 0), dpi) + grade.get("espaco_px", 0)
+    colunas, linhas = grade["colunas"], grade["linhas"]
+    if grade.get("centralizar", True):
+        x0 = (tamanho[0] - (colunas * largura + (colunas - 1) * espaco)) // 2
+        y0 = (tamanho[1] - (linhas * altura + (linhas - 1) * espaco)) // 2
+    else:
+        x0 = y0 = sangria + margem
+    return [
+        (x0 + coluna * (largura + espaco), y0 + linha * (altura + espaco), largura, altura)
+        for linha in range(linhas)
+        for coluna in range(colunas)
+    ]
+
+
+def _linhas_de_corte(corte, slots, dpi):
+    """Segmentos ((x0, y0), (x1, y1)) das marcas de corte"""
+    if corte["estilo"] == "contorno":
+        linhas = []
+        for x, y, w, h in slots:
+            linhas += [
+                ((x, y), (x + w, y)),
+                ((x, y + h), (x + w, y + h)),
+                ((x, y), (x, y + h)),
+                ((x + w, y), (x + w, y + h)),
+            ]
+        return linhas
+
+    # Estilo "margem": traços fora da área das fotos, alinhados a cada borda
+    marca = cm_para_px(corte.get("comprimento", 0.4), dpi)
+    afastamento = cm_para_px(corte.get("afastamento", 0.1), dpi)
+    x_min, y_min = min(s[0] for s in slots), min(s[1] for s in slots)
+    x_max, y_max = max(s[0] + s[2] for s in slots), max(s[1] + s[3] for s in slots)
+    bordas_x = sorted({v for x, _, w, _ in slots for v in (x, x + w - 1)})
+    bordas_y = sorted({v for _, y, _, h in slots for v in (y, y + h - 1)})
+    linhas = []
+    for x in bordas_x:
+        linhas.append(((x, y_min - afastamento - marca), (x, y_min - afastamento)))
+        linhas.append(((x, y_max + afastamento), (x, y_max + afastamento + marca)))
+    for y in bordas_y:
+        linhas.append(((x_min - afastamento - marca, y), (x_min - afastamento, y)))
+        linhas.append(((x_max + afastamento, y), (x_max + afastamento + marca, y)))
+    return linhas
+
+
+def _fonte(tamanho_pt, dpi):
+    if tamanho_pt is None:
+        return fonte(None)
+    return fonte(None, max(1, round(tamanho_pt * dpi / 72)))
+
+
+def _compilar(modelo, dpi):
+    sangria = cm_para_px(modelo.get("sangria", 0), dpi)
+    margem = cm_para_px(modelo.get("margem", 0), dpi)
+    papel = modelo["papel"]
+    tamanho = (cm_para_px(papel[0], dpi) + 2 * sangria, cm_para_px(papel[1], dpi) + 2 * sangria)
+
+    if "grade" in modelo:
+        slots = _slots_da_grade(modelo["grade"], tamanho, sangria, margem, dpi)
+    else:
+        slots = [
+            (sangria + cm_para_px(x, dpi), sangria + cm_para_px(y, dpi), cm_para_px(w, dpi), cm_para_px(h, dpi))
+            for x, y, w, h in modelo["slots"]
+        ]
+
+    linhas = []
+    corte = modelo.get("corte")
+    if corte and slots:
+        espessura = max(1, round(corte.get("espessura", 0.1) * dpi / 25.4))
+        linhas = [(segmento, corte.get("cor", "black"), espessura) for segmento in _linhas_de_corte(corte, slots, dpi)]
+
+    textos = [
+        (
+            (sangria + cm_para_px(t["posicao"][0], dpi), sangria + cm_para_px(t["posicao"][1], dpi)),
+            t["texto"],
+            _fonte(t.get("tamanho"), dpi),
+            t.get("cor", "black"),
+        )
+        for t in modelo.get("textos", [])
+    ]
+    return {"tamanho": tamanho, "slots": slots, "linhas": linhas, "textos": textos}
+
+
+def compilar(modelo, dpi):
+    """Geometria do modelo em pixels no DPI pedido, calculada uma vez por processo.
+
+    Devolve ``{"tamanho", "slots": [(x, y, largura, altura)], "linhas", "textos"}``.
+    """
+    chave = (chave_modelo(modelo), dpi)
+    with _trava:
+        compilado = _compilados.get(chave)
+        if compilado is not None:
+            _compilados.move_to_end(chave)
+            return compilado
+    compilado = _compilar(modelo, dpi)
+    with _trava:
+        compilado = _compilados.setdefault(chave, compilado)
+        while len(_compilados) > MAX_COMPILADOS:
+            _compilados.popitem(last=False)
+    return compilado
+
+
+def compilar_catalogo(dpi):
+    """Compila todos os ``MODELOS`` (usado no aquecimento do servidor)"""
+    return [compilar(modelo, dpi) for modelo in MODELOS.values()]
+
+
+def renderizar(compilado, fotos, fundo="white", ajustar=redimensionar):
+    """Executa o modelo compilado: fotos nos espaços (na ordem), depois marcas de corte e textos.
+
+    ``ajustar(foto, (largura, altura))`` leva cada foto ao tamanho do espaço
+    (fotos que já têm o tamanho são coladas direto); ``None`` deixa o
+    espaço vazio. Fotos além do número de espaços são ignoradas.
+
+    Com o backend ``opencv`` as fotos (Pillow ou arrays RGB) são reamostradas
+    para array e a folha é montada pelo ``nucleo.compositor``, com uma única
+    conversão para Pillow no final.
+    """
+    if ajustar is redimensionar and entrega_arrays():
+        itens = (
+            (_em_array(foto, (w, h)), (x, y))
+            for foto, (x, y, w, h) in zip(fotos, compilado["slots"])
+            if foto is not None
+        )
+        folha = montar_slots(compilado["tamanho"], itens, fundo)
+    else:
+        folha = Image.new("RGB", compilado["tamanho"], fundo)
+        for foto, (x, y, w, h) in zip(fotos, compilado["slots"]):
+            if foto is None:
+                continue
+            if isinstance(foto, np.ndarray):
+                foto = Image.fromarray(foto)
+            if foto.size != (w, h):
+                foto = ajustar(foto, (w, h))
+            folha.paste(foto, (x, y))
+
+    if compilado["linhas"] or compilado["textos"]:
+        draw = ImageDraw.Draw(folha)
+        for segmento, cor, espessura in compilado["linhas"]:
+            draw.line(list(segmento), fill=cor, width=espessura)
+        for posicao, texto, fonte, cor in compilado["textos"]:
+            draw.text(posicao, texto, fill=cor, font=fonte)
+    return folha
+
+
+def _em_array(foto, tamanho):
+    """Foto no tamanho do espaço, de preferência como array (sem passar pelo Pillow)"""
+    if isinstance(foto, np.ndarray):
+        if foto.shape[1::-1] == tamanho:
+            return foto
+        foto = Image.fromarray(foto)
+    if foto.size == tamanho:
+        return foto
+    return redimensionar(foto, tamanho, como_array=True)
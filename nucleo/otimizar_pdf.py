@@ -0,0 +1,117 @@
+"""Passo de otimização do PDF unido (sem rasterizar páginas).
+
+1. Comprime os content streams que vieram sem filtro;
+2. Deduplica objetos idênticos (fontes, logos e imagens repetidas entre
+   os arquivos de entrada) e descarta objetos órfãos;
+3. Reduz imagens embutidas acima de um DPI alvo (opcional).
+"""
+
+import io
+import time
+
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+
+# Cada passada de deduplicação só une objetos cujas referências já são iguais
+# (ex.: duas imagens idênticas apontando para ColorSpaces distintos só se unem
+# na passada seguinte à união dos ColorSpaces)
+MAX_PASSADAS_DEDUP = 8
+
+# Modos que o pypdf sabe regravar como JPEG/Flate sem perder informação de cor
+MODOS_REDUZIVEIS = ("RGB", "L", "CMYK")
+
+
+def dpi_efetivo(largura_px, altura_px, pagina):
+    """DPI mínimo da imagem supondo que ela ocupe a página inteira.
+
+    A área real de exibição é sempre menor ou igual à página, então o DPI
+    real é maior ou igual a este valor: a redução nunca fica agressiva demais.
+    """
+    largura_pol = float(pagina.mediabox.width) / 72
+    altura_pol = float(pagina.mediabox.height) / 72
+    return min(largura_px / largura_pol, altura_px / altura_pol)
+
+
+def reduzir_imagens(writer, dpi_maximo, qualidade_jpeg=85):
+    """Reamostra imagens com DPI acima do alvo; devolve quantas foram trocadas"""
+    vistas = set()
+    reduzidas = 0
+
+    for pagina in writer.pages:
+        for imagem in pagina.images:
+            ref = imagem.indirect_reference
+            chave = (ref.idnum, ref.generation) if ref is not None else None
+            if chave in vistas:
+                continue
+            vistas.add(chave)
+
+            try:
+                pil = imagem.image
+            except Exception:
+                continue
+            if pil.mode not in MODOS_REDUZIVEIS:
+                continue
+
+            dpi = dpi_efetivo(pil.width, pil.height, pagina)
+            if dpi <= dpi_maximo:
+                continue
+
+            escala = dpi_maximo / dpi
+            novo = pil.resize(
+                (max(1, round(pil.width * escala)), max(1, round(pil.height * escala))),
+                Image.LANCZOS,
+            )
+            imagem.replace(novo, quality=qualidade_jpeg)
+            reduzidas += 1
+
+    return reduzidas
+
+
+def deduplicar_objetos(writer):
+    """Repete a deduplicação do pypdf até o número de objetos parar de cair"""
+    vivos = sum(o is not None for o in writer._objects)
+    for _ in range(MAX_PASSADAS_DEDUP):
+        writer.compress_identical_objects()
+        restantes = sum(o is not None for o in writer._objects)
+        if restantes >= vivos:
+            break
+        vivos = restantes
+
+
+def otimizar_pdf(entrada, comprimir=True, deduplicar=True, dpi_maximo=None, qualidade_jpeg=85):
+    """Otimiza um PDF (bytes ou arquivo) e devolve (BytesIO, relatório)"""
+    inicio = time.perf_counter()
+
+    if isinstance(entrada, (bytes, bytearray)):
+        entrada = io.BytesIO(entrada)
+    entrada.seek(0, io.SEEK_END)
+    tamanho_antes = entrada.tell()
+    entrada.seek(0)
+
+    writer = PdfWriter(clone_from=PdfReader(entrada))
+
+    if comprimir:
+        for pagina in writer.pages:
+            pagina.compress_content_streams()
+
+    # Deduplicar antes de reduzir: uma imagem repetida em vários arquivos
+    # vira um único objeto e é reamostrada uma vez só
+    if deduplicar:
+        deduplicar_objetos(writer)
+
+    imagens_reduzidas = 0
+    if dpi_maximo:
+        imagens_reduzidas = reduzir_imagens(writer, dpi_maximo, qualidade_jpeg)
+
+    saida = io.BytesIO()
+    writer.write(saida)
+    writer.close()
+    saida.seek(0)
+
+    relatorio = {
+        "tamanho_antes": tamanho_antes,
+        "tamanho_depois": saida.getbuffer().nbytes,
+        "imagens_reduzidas": imagens_reduzidas,
+        "tempo": time.perf_counter() - inicio,
+    }
+    return saida, relatorio
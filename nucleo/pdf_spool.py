@@ -0,0 +1,296 @@
+"""Junção de PDFs em disco, objeto a objeto, com memória limitada.
+
+O PdfWriter do pypdf copia todos os objetos (inclusive os streams das
+imagens) para a memória antes de gravar. Aqui os arquivos de entrada
+ficam em disco, cada objeto é lido, renumerado, gravado na saída e
+descartado em seguida; na memória só ficam as tabelas de offsets e de
+renumeração.
+"""
+
+import os
+import secrets
+import shutil
+import tempfile
+import time
+import weakref
+from collections import deque
+
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    StreamObject,
+)
+
+from nucleo.metricas import medido
+
+PASTA_SPOOL = os.path.join(tempfile.gettempdir(), "retratos_spool")
+TAMANHO_BLOCO = 1024 * 1024
+VALIDADE_SPOOL_HORAS = 6
+
+# Com server.enableStaticServing, o Streamlit serve a pasta static/ ao lado
+# do script principal (app.py ou o script da ferramenta, ambos na raiz) em
+# app/static/, lendo o arquivo do disco em blocos.
+PASTA_STATIC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+PASTA_PUBLICA = os.path.join(PASTA_STATIC, "spool")
+URL_STATIC = "app/static"
+# Acima disso o Streamlit responde 404 em vez de servir o arquivo
+LIMITE_STATIC = 200 * 1024 * 1024
+
+# Objetos 1 e 2 da saída são reservados para o Catalog e a árvore de páginas
+NUM_CATALOGO = 1
+NUM_PAGINAS = 2
+
+
+def criar_pasta_sessao():
+    """Pasta temporária exclusiva de uma sessão"""
+    os.makedirs(PASTA_SPOOL, exist_ok=True)
+    return tempfile.mkdtemp(prefix="sessao_", dir=PASTA_SPOOL)
+
+
+def criar_pasta_publica():
+    """Pasta da sessão servida pelo Streamlit; o nome aleatório é o que a protege"""
+    caminho = os.path.join(PASTA_PUBLICA, secrets.token_urlsafe(24))
+    os.makedirs(caminho, mode=0o700)
+    return caminho
+
+
+class PastaSessao:
+    """Pasta de spool de uma sessão, apagada quando a sessão acaba.
+
+    Guardada no ``st.session_state``: o Streamlit descarta o estado quando
+    a sessão termina, o objeto é coletado e a pasta vai junto (também na
+    saída do processo). ``limpar_spool_antigo`` fica para processos que
+    morreram sem chegar a limpar. Com ``publica=True`` a pasta fica em
+    ``PASTA_PUBLICA`` e os arquivos são baixados por ``url``.
+    """
+
+    def __init__(self, publica=False):
+        self.caminho = criar_pasta_publica() if publica else criar_pasta_sessao()
+        self._remover = weakref.finalize(self, shutil.rmtree, self.caminho, True)
+
+    def existe(self):
+        return os.path.isdir(self.caminho)
+
+    def url(self, nome):
+        """Endereço relativo de um arquivo de pasta pública no static serving"""
+        relativo = os.path.relpath(os.path.join(self.caminho, nome), PASTA_STATIC)
+        return f"{URL_STATIC}/{relativo.replace(os.sep, '/')}"
+
+
+def ler_ao_baixar(caminho):
+    """``data`` para o ``st.download_button``: o arquivo só é lido quando o usuário clica"""
+    def ler():
+        with open(caminho, "rb") as f:
+            return f.read()
+    return ler
+
+
+def limpar_spool_antigo(horas=VALIDADE_SPOOL_HORAS):
+    """Remove pastas de sessões abandonadas há mais de ``horas``"""
+    limite = time.time() - horas * 3600
+    for pasta in (PASTA_SPOOL, PASTA_PUBLICA):
+        if not os.path.isdir(pasta):
+            continue
+        for nome in os.listdir(pasta):
+            caminho = os.path.join(pasta, nome)
+            if os.path.isdir(caminho) and os.path.getmtime(caminho) < limite:
+                shutil.rmtree(caminho, ignore_errors=True)
+
+
+def gravar_upload(arquivo, pasta, nome):
+    """Copia um upload para o disco em blocos e devolve o caminho"""
+    caminho = os.path.join(pasta, nome)
+    arquivo.seek(0)
+    with open(caminho, "wb") as destino:
+        shutil.copyfileobj(arquivo, destino, TAMANHO_BLOCO)
+    arquivo.seek(0)
+    return caminho
+
+
+def abrir_leitor(caminho):
+    """PdfReader sobre o arquivo aberto (com caminho, o pypdf lê tudo para a memória)"""
+    reader = PdfReader(open(caminho, "rb"))
+    if reader.is_encrypted:
+        reader.decrypt("")
+    return reader
+
+
+def _e_no_de_paginas(obj):
+    return isinstance(obj, DictionaryObject) and obj.get("/Type") in ("/Page", "/Pages")
+
+
+def _link_perdido(anotacao, paginas):
+    """Link interno cujo destino não está entre as ``paginas`` (idnum, geração) da saída.
+
+    Destinos nomeados também se perdem: o catálogo de entrada (/Dests,
+    /Names) não é copiado.
+    """
+    if anotacao.get("/Subtype") != "/Link":
+        return False
+    destino = anotacao.get("/Dest")
+    if destino is None:
+        acao = anotacao.get("/A")
+        if acao is None or acao.get("/S") != "/GoTo":
+            return False  # URI, arquivo externo, JavaScript...
+        destino = acao.get("/D")
+    if destino is None:
+        return False
+    destino = destino.get_object()
+    if isinstance(destino, ArrayObject) and destino:
+        alvo = list.__getitem__(destino, 0)
+        if isinstance(alvo, IndirectObject):
+            return (alvo.idnum, alvo.generation) not in paginas
+        return False
+    return True
+
+
+def _sem_links_perdidos(pagina, paginas):
+    """Cópia rasa da página sem as anotações de link para páginas que ficaram de fora"""
+    anotacoes = pagina.get("/Annots")
+    if anotacoes is None:
+        return pagina
+    mantidas = ArrayObject(a for a in anotacoes if not _link_perdido(a.get_object(), paginas))
+    if len(mantidas) == len(anotacoes):
+        return pagina
+    copia = DictionaryObject(dict.items(pagina))
+    if mantidas:
+        copia[NameObject("/Annots")] = mantidas
+    else:
+        del copia[NameObject("/Annots")]
+    return copia
+
+
+class _Renumeracao:
+    """Mapeia os objetos de um arquivo de entrada para números da saída"""
+
+    def __init__(self, reader, proximo_numero):
+        self.reader = reader
+        self.mapa = {}
+        self.pendentes = deque()
+        self.proximo_numero = proximo_numero
+        # Páginas deste arquivo que entram na saída (idnum, geração)
+        self.paginas = set()
+
+    def numero(self, ref, enfileirar=True):
+        chave = (ref.idnum, ref.generation)
+        if chave not in self.mapa:
+            self.mapa[chave] = self.proximo_numero()
+            if enfileirar:
+                self.pendentes.append(ref)
+        return self.mapa[chave]
+
+    def converter(self, obj):
+        """Cópia rasa do objeto com as referências trocadas pelos novos números"""
+        if isinstance(obj, IndirectObject):
+            return IndirectObject(self.numero(obj), 0, None)
+        if isinstance(obj, StreamObject):
+            novo = StreamObject()
+            novo._data = obj._data
+            for k, v in obj.items():
+                novo[k] = self.converter(v)
+            return novo
+        if isinstance(obj, DictionaryObject):
+            novo = DictionaryObject()
+            for k, v in obj.items():
+                novo[k] = self.converter(v)
+            return novo
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self.converter(v) for v in obj)
+        return obj
+
+    def descartar(self, ref):
+        # O pypdf guarda todo objeto resolvido; soltamos depois de gravar
+        self.reader.resolved_objects.pop((ref.generation, ref.idnum), None)
+
+
+@medido("juntar_pdf")
+def juntar_em_disco(paginas, caminhos, saida, progress=None):
+    """Grava em ``saida`` as páginas [{"arquivo", "indice", "rotacao"}] na ordem dada.
+
+    ``caminhos`` mapeia a chave de cada arquivo para o PDF spoolado em disco.
+    Links para páginas que não entram na saída são descartados.
+    """
+    offsets = {}
+    contador = [NUM_PAGINAS]
+
+    def proximo_numero():
+        contador[0] += 1
+        return contador[0]
+
+    renumeracoes = {}
+    arquivos_abertos = []
+    kids = []
+
+    with open(saida, "wb", buffering=TAMANHO_BLOCO) as out:
+        out.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+        def gravar(numero, obj):
+            offsets[numero] = out.tell()
+            out.write(f"{numero} 0 obj\n".encode())
+            if obj is None:
+                out.write(b"null")
+            else:
+                obj.write_to_stream(out)
+            out.write(b"\nendobj\n")
+
+        try:
+            # Numera de antemão todas as páginas da saída, para que links
+            # entre elas (inclusive para páginas posteriores) sejam preservados
+            for pagina in paginas:
+                h = pagina["arquivo"]
+                if h not in renumeracoes:
+                    reader = abrir_leitor(caminhos[h])
+                    arquivos_abertos.append(reader.stream)
+                    renumeracoes[h] = _Renumeracao(reader, proximo_numero)
+                ren = renumeracoes[h]
+                ref = ren.reader.pages[pagina["indice"]].indirect_reference
+                ren.paginas.add((ref.idnum, ref.generation))
+                kids.append(ren.numero(ref, enfileirar=False))
+
+            for n, pagina in enumerate(paginas):
+                ren = renumeracoes[pagina["arquivo"]]
+                origem = ren.reader.pages[pagina["indice"]]
+
+                nova = ren.converter(_sem_links_perdidos(origem, ren.paginas))
+                nova[NameObject("/Parent")] = IndirectObject(NUM_PAGINAS, 0, None)
+                nova[NameObject("/Rotate")] = NumberObject((origem.rotation + pagina["rotacao"]) % 360)
+                gravar(kids[n], nova)
+
+                while ren.pendentes:
+                    ref = ren.pendentes.popleft()
+                    obj = ref.get_object()
+                    gravar(ren.numero(ref), None if _e_no_de_paginas(obj) else ren.converter(obj))
+                    ren.descartar(ref)
+
+                if progress is not None:
+                    progress.progress((n + 1) / len(paginas))
+
+            gravar(NUM_PAGINAS, DictionaryObject({
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): ArrayObject(IndirectObject(k, 0, None) for k in kids),
+                NameObject("/Count"): NumberObject(len(kids)),
+            }))
+            gravar(NUM_CATALOGO, DictionaryObject({
+                NameObject("/Type"): NameObject("/Catalog"),
+                NameObject("/Pages"): IndirectObject(NUM_PAGINAS, 0, None),
+            }))
+
+            # Tabela xref clássica: uma linha de 20 bytes por objeto
+            total = contador[0] + 1
+            inicio_xref = out.tell()
+            out.write(f"xref\n0 {total}\n0000000000 65535 f \n".encode())
+            for numero in range(1, total):
+                out.write(f"{offsets[numero]:010d} 00000 n \n".encode())
+            out.write(
+                f"trailer\n<< /Size {total} /Root {NUM_CATALOGO} 0 R >>\n"
+                f"startxref\n{inicio_xref}\n%%EOF\n".encode()
+            )
+        finally:
+            for stream in arquivos_abertos:
+                stream.close()
+
+    return saida
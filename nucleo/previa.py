@@ -0,0 +1,30 @@
+"""Pré-visualização progressiva: um rascunho na hora, a versão final depois.
+
+O rascunho sai de uma decodificação reduzida (``draft`` do JPEG, até 1/8
+da escala) e de um filtro barato (bilinear), então aparece em milissegundos
+por foto. A versão de alta qualidade é montada em segundo plano, na fila
+compartilhada, e substitui o rascunho quando fica pronta. O que vai para o
+navegador é sempre uma cópia de exibição (``LADO_PREVIA``), nunca a imagem
+de impressão inteira.
+"""
+
+from PIL import Image
+
+from nucleo.sonda import abrir_imagem
+
+LADO_RASCUNHO = 320
+LADO_PREVIA = 1200
+
+
+def rascunho(arquivo, lado=LADO_RASCUNHO):
+    """Miniatura rápida (decodificação reduzida + bilinear) para mostrar logo após o upload"""
+    img = abrir_imagem(arquivo, tamanho_alvo=(lado, lado))
+    img.thumbnail((lado, lado), Image.BILINEAR, reducing_gap=None)
+    return img
+
+
+def previa(img, lado=LADO_PREVIA):
+    """Cópia de exibição da imagem final (Lanczos), leve para reenviar a cada rerun"""
+    copia = img.copy()
+    copia.thumbnail((lado, lado), Image.LANCZOS)
+    return copia
@@ -0,0 +1,17 @@
+"""Rasterização de páginas de PDF, executada nos processos auxiliares.
+
+Este módulo é o único importado pelos processos do pool: depende só do
+PyMuPDF, para que cada processo suba rápido e não carregue o Streamlit,
+o cache nem as métricas do servidor.
+"""
+
+import pymupdf
+
+QUALIDADE_JPEG = 95
+
+
+def rasterizar(caminho, indice, dpi):
+    """JPEG da página no DPI pedido"""
+    with pymupdf.open(caminho) as doc:
+        pix = doc[indice].get_pixmap(dpi=dpi, alpha=False, colorspace=pymupdf.csRGB)
+        return pix.tobytes("jpeg", jpg_quality=QUALIDADE_JPEG)
@@ -0,0 +1,168 @@
+"""Recursos pesados e imutáveis, carregados uma vez por processo.
+
+Fontes, perfis ICC e transformações de cor, detector de rostos e pesos
+de super-resolução não mudam depois de carregados: ficam num registro
+único, compartilhado por todas as sessões e pelas threads da fila. Cada
+chave tem a própria trava de carga, então um modelo lento não segura a
+busca de uma fonte. O registro é só para recursos estáticos (arquivos
+do servidor e da configuração): o que deriva de uploads, como os perfis
+ICC embutidos nas fotos, tem cache próprio e limitado.
+
+``aquecer()`` carrega de antemão o que quase toda sessão acaba pedindo
+(``AQUECIMENTO``); o lançador chama ``aquecer_em_segundo_plano()`` na
+subida do servidor (``RETRATOS_AQUECER=0`` desliga). O ``relatorio()``
+mostra o custo de cada carga e quanto tempo o registro já poupou.
+"""
+
+import importlib
+import os
+import threading
+import time
+
+from PIL import ImageFont
+
+AQUECER = os.environ.get("RETRATOS_AQUECER", "1") != "0"
+
+# (rótulo, módulo, função, argumentos): importados só na hora de aquecer
+AQUECIMENTO = [
+    ("Perfis ICC (saída e CMYK)", "nucleo.cores", "assinatura", ()),
+    ("Perfil sRGB (fotos sem perfil)", "nucleo.cores", "chave_srgb", ()),
+    ("Modelos de folha a 300 DPI e fontes", "nucleo.modelos", "compilar_catalogo", (300,)),
+    ("Fontes do tríptico 20×15", "nucleo.recursos", "fonte", ("DejaVuSans-Bold.ttf", 48)),
+    ("Fontes do tríptico 20×15", "nucleo.recursos", "fonte", ("DejaVuSans.ttf", 18)),
+    ("Fonte do mosaico", "nucleo.recursos", "fonte", ("arial.ttf", 60)),
+    ("Detector de rostos", "nucleo.rostos", "detector", ()),
+    ("Super-resolução 2×", "nucleo.melhoria", "superres", (2,)),
+]
+
+_AUSENTE = object()
+
+_recursos = {}  # chave -> valor
+_cargas = {}    # chave -> {"carga": s, "usos": n, "aquecido": bool, "economia": bool}
+_travas = {}    # chave -> Lock da carga
+_trava = threading.Lock()
+_contexto = threading.local()
+
+
+def recurso(chave, carregar, economia=False):
+    """Valor de ``carregar()`` para a chave, carregado uma única vez por processo.
+
+    ``economia``: sem o registro, quem usa o recurso o recarregaria a cada
+    uso (ex.: fontes). Só esses contam como tempo poupado no ``relatorio()``.
+    """
+    with _trava:
+        valor = _recursos.get(chave, _AUSENTE)
+        if valor is not _AUSENTE:
+            _cargas[chave]["usos"] += 1
+            return valor
+        trava_carga = _travas.setdefault(chave, threading.Lock())
+    with trava_carga:
+        # Outra thread pode ter carregado enquanto esta esperava
+        with _trava:
+            valor = _recursos.get(chave, _AUSENTE)
+            if valor is not _AUSENTE:
+                _cargas[chave]["usos"] += 1
+                return valor
+        inicio = time.perf_counter()
+        valor = carregar()
+        duracao = time.perf_counter() - inicio
+        aquecendo = getattr(_contexto, "aquecendo", False)
+        with _trava:
+            _recursos[chave] = valor
+            _cargas[chave] = {
+                "carga": duracao, "usos": 0 if aquecendo else 1, "aquecido": aquecendo, "economia": economia,
+            }
+        return valor
+
+
+def recurso_carregado(chave):
+    """Valor já registrado (KeyError se a chave ainda não foi carregada)"""
+    with _trava:
+        return _recursos[chave]
+
+
+def _carregar_fonte(nome, tamanho):
+    if nome is None:
+        if tamanho is None:
+            return ImageFont.load_default()
+        try:
+            return ImageFont.load_default(size=tamanho)
+        except (TypeError, OSError):
+            # Pillow sem FreeType não escala a fonte padrão
+            return ImageFont.load_default()
+    try:
+        return ImageFont.truetype(nome, tamanho)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def fonte(nome, tamanho=None):
+    """Fonte TrueType ``nome`` no tamanho em pixels (fonte padrão se o arquivo não existir).
+
+    ``nome`` None é a fonte padrão do Pillow, escalada para ``tamanho`` se
+    houver FreeType. As fontes do Pillow são só leitura ao desenhar, então
+    a mesma instância serve a todas as threads.
+    """
+    return recurso(("fonte", nome or "padrão", tamanho), lambda: _carregar_fonte(nome, tamanho), economia=True)
+
+
+def aquecer(itens=None):
+    """Carrega os recursos de ``AQUECIMENTO``; devolve [(rótulo, segundos, erro)]"""
+    resultados = []
+    _contexto.aquecendo = True
+    try:
+        for rotulo, modulo, funcao, argumentos in itens or AQUECIMENTO:
+            inicio = time.perf_counter()
+            try:
+                getattr(importlib.import_module(modulo), funcao)(*argumentos)
+                erro = None
+            except Exception as e:
+                # Recurso opcional ausente (ex.: OpenCV sem contrib): carrega sob demanda ou não carrega
+                erro = str(e)
+            resultados.append((rotulo, time.perf_counter() - inicio, erro))
+    finally:
+        _contexto.aquecendo = False
+    return resultados
+
+
+_aquecimento_iniciado = False
+
+
+def aquecer_em_segundo_plano():
+    """Dispara ``aquecer()`` numa thread, uma vez por processo, sem atrasar a primeira página"""
+    global _aquecimento_iniciado
+    with _trava:
+        if _aquecimento_iniciado or not AQUECER:
+            return
+        _aquecimento_iniciado = True
+    threading.Thread(target=aquecer, name="aquecimento", daemon=True).start()
+
+
+def _rotulo(chave):
+    if isinstance(chave, tuple):
+        return " ".join(str(parte) for parte in chave if parte is not None)
+    return str(chave)
+
+
+def relatorio():
+    """Uma linha por recurso: custo da carga, usos e tempo poupado.
+
+    ``poupado`` só conta os recursos registrados com ``economia`` (os que
+    antes eram recarregados a cada uso); os demais já eram carregados uma
+    vez por processo. O aquecimento tira a primeira carga de qualquer um
+    da primeira renderização (``poupado_na_primeira``).
+    """
+    with _trava:
+        itens = [(chave, dict(info)) for chave, info in _cargas.items()]
+    linhas = []
+    for chave, info in itens:
+        pagos = 0 if info["aquecido"] else 1
+        linhas.append({
+            "recurso": _rotulo(chave),
+            "carga": info["carga"],
+            "usos": info["usos"],
+            "aquecido": info["aquecido"],
+            "poupado": info["carga"] * max(0, info["usos"] - pagos) if info["economia"] else 0.0,
+            "poupado_na_primeira": info["carga"] if info["aquecido"] and info["usos"] else 0.0,
+        })
+    return sorted(linhas, key=lambda linha: -linha["poupado"])
@@ -0,0 +1,108 @@
+"""Resolução de saída planejada pela resolução real das fotos de origem.
+
+Renderizar a 600 DPI uma foto de 1 MP só amplia pixels: o Lanczos não cria
+detalhe, e a folha sai com 4x mais pixels (CPU, memória e arquivo) sem
+diferença visível na impressão. O planejador calcula o DPI efetivo de cada
+foto no espaço em que ela vai ser impressa e limita a resolução da folha
+ao que a melhor foto consegue preencher, sem descer abaixo do piso do
+produto (texto, bordas e marcas de corte precisam de resolução própria).
+
+O piso de cada produto fica em ``PRODUTOS``; ``RETRATOS_DPI_PISO`` troca o
+piso de todos numa implantação (ex.: laboratório que exige 300 DPI).
+"""
+
+import math
+import os
+
+import streamlit as st
+
+DPI_PISO_PADRAO = 150
+
+PRODUTOS = {
+    # Título e rodapé em texto: abaixo disso as letras perdem o contorno
+    "triptico_20x15": {"piso": 200},
+    "multi_formato": {"piso": 150},
+    "pdf_10x15": {"piso": 150},
+}
+
+# (DPI efetivo mínimo, rótulo, nível da mensagem)
+FAIXAS_QUALIDADE = (
+    (300, "ótima", "success"),
+    (200, "boa", "info"),
+    (150, "aceitável, pode perder nitidez de perto", "warning"),
+    (0, "baixa, deve sair granulada", "error"),
+)
+
+
+def piso_do_produto(produto):
+    if os.environ.get("RETRATOS_DPI_PISO"):
+        return int(os.environ["RETRATOS_DPI_PISO"])
+    return PRODUTOS.get(produto, {}).get("piso", DPI_PISO_PADRAO)
+
+
+def dpi_efetivo(tamanho_px, caixa_cm, modo="cobrir"):
+    """DPI com que a foto sai impressa na caixa.
+
+    ``cobrir``: a foto preenche a caixa e o excesso é recortado (vale o lado
+    mais justo); ``caber``: a foto cabe inteira, com sobra (vale o lado que encosta).
+    """
+    dpi_x = tamanho_px[0] * 2.54 / caixa_cm[0]
+    dpi_y = tamanho_px[1] * 2.54 / caixa_cm[1]
+    return min(dpi_x, dpi_y) if modo == "cobrir" else max(dpi_x, dpi_y)
+
+
+def qualidade(dpi):
+    """(rótulo, nível) da qualidade de impressão esperada para o DPI efetivo"""
+    for minimo, rotulo, nivel in FAIXAS_QUALIDADE:
+        if dpi >= minimo:
+            return rotulo, nivel
+
+
+def planejar(produto, dpi_pedido, fotos, papel_cm, limitar=True):
+    """Resolução da folha e diagnóstico por foto.
+
+    ``fotos`` é uma lista de ``(nome, tamanho_px, caixa_cm, modo)``. Com
+    ``limitar`` o DPI da folha desce até o DPI efetivo da melhor foto
+    (arredondado para cima em múltiplos de 10), nunca abaixo do piso do
+    produto nem acima do pedido.
+    """
+    diagnostico = []
+    for nome, tamanho_px, caixa_cm, modo in fotos:
+        efetivo = dpi_efetivo(tamanho_px, caixa_cm, modo)
+        rotulo, nivel = qualidade(efetivo)
+        diagnostico.append({"nome": nome, "dpi": efetivo, "rotulo": rotulo, "nivel": nivel})
+
+    dpi = dpi_pedido
+    if limitar and diagnostico:
+        suportado = math.ceil(max(d["dpi"] for d in diagnostico) / 10) * 10
+        dpi = min(dpi_pedido, max(piso_do_produto(produto), suportado))
+
+    def pixels(d):
+        return round(papel_cm[0] * d / 2.54) * round(papel_cm[1] * d / 2.54)
+
+    poupados = pixels(dpi_pedido) - pixels(dpi)
+    return {
+        "dpi": dpi,
+        "pedido": dpi_pedido,
+        "fotos": diagnostico,
+        "pixels_poupados": poupados,
+        # Folha RGB na memória (o arquivo comprimido cai na mesma proporção)
+        "bytes_poupados": poupados * 3,
+        "fracao_poupada": poupados / pixels(dpi_pedido) if dpi_pedido else 0.0,
+    }
+
+
+def mostrar_plano(plano):
+    """Avisos de qualidade por foto e o que deixou de ser renderizado"""
+    for foto in plano["fotos"]:
+        if foto["nivel"] in ("warning", "error"):
+            getattr(st, foto["nivel"])(
+                f"{foto['nome']}: {foto['dpi']:.0f} DPI efetivos, qualidade {foto['rotulo']}."
+            )
+    if plano["dpi"] < plano["pedido"]:
+        st.info(
+            f"📐 Renderizado a {plano['dpi']} DPI em vez de {plano['pedido']}: as fotos não têm "
+            f"resolução para mais. {plano['pixels_poupados'] / 1_000_000:.1f} MP "
+            f"({plano['bytes_poupados'] / 1024 / 1024:.0f} MB na memória, "
+            f"{plano['fracao_poupada']:.0%} da folha) a menos, sem diferença na impressão."
+        )
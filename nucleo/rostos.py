@@ -0,0 +1,136 @@
+"""Detecção de rosto para o recorte 3x4 centrado na pessoa.
+
+A detecção roda numa cópia pequena da foto (``LADO_PROXY`` px no maior
+lado), então custa milissegundos mesmo com fotos de 12 MP. Detectores, na
+ordem de preferência:
+
+- YuNet (``cv2.FaceDetectorYN``), se o ONNX estiver em
+  ``RETRATOS_MODELO_ROSTO`` ou em ``modelos/face_detection_yunet_2023mar.onnx``;
+- a cascata Haar que acompanha o opencv-python 4.x (``cv2.data``).
+
+O detector é carregado uma vez por processo e o resultado fica em cache
+pela chave da imagem (hash do upload + ajustes). Sem detector disponível,
+``localizar_rosto`` devolve None e o recorte continua centralizado.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from nucleo.recursos import recurso
+
+LADO_PROXY = 320
+PASTA_MODELOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modelos")
+MODELO_YUNET = os.environ.get("RETRATOS_MODELO_ROSTO") or os.path.join(
+    PASTA_MODELOS, "face_detection_yunet_2023mar.onnx"
+)
+CASCATA_HAAR = "haarcascade_frontalface_default.xml"
+MAX_ROSTOS_EM_CACHE = 4096
+
+# Enquadramento de documento: o rosto detectado (testa ao queixo) ocupa
+# ~40% da altura da foto, com o centro um pouco abaixo do meio
+FRACAO_ROSTO = 0.42
+CENTRO_ROSTO_Y = 0.56
+
+# Serializa a detecção (o carregamento fica no registro de recursos)
+_trava_detector = threading.Lock()
+_rostos = OrderedDict()
+_trava_rostos = threading.Lock()
+
+
+def _carregar_detector():
+    try:
+        import cv2
+    except ImportError:
+        return False
+    if hasattr(cv2, "FaceDetectorYN") and os.path.exists(MODELO_YUNET):
+        return "yunet", cv2.FaceDetectorYN.create(MODELO_YUNET, "", (LADO_PROXY, LADO_PROXY), 0.8)
+    if hasattr(cv2, "CascadeClassifier") and hasattr(cv2, "data"):
+        caminho = os.path.join(cv2.data.haarcascades, CASCATA_HAAR)
+        if os.path.exists(caminho):
+            cascata = cv2.CascadeClassifier(caminho)
+            if not cascata.empty():
+                return "haar", cascata
+    return False
+
+
+def detector():
+    """(tipo, detector) carregado uma vez por processo, ou False se não houver"""
+    return recurso("detector_rosto", _carregar_detector)
+
+
+def detector_disponivel():
+    return detector() is not False
+
+
+def _detectar(proxy, tipo, modelo):
+    import cv2
+
+    arr = np.asarray(proxy)
+    if tipo == "yunet":
+        modelo.setInputSize(proxy.size)
+        _, faces = modelo.detect(np.ascontiguousarray(arr[:, :, ::-1]))
+        caixas = [] if faces is None else [tuple(f[:4]) for f in faces]
+    else:
+        cinza = cv2.equalizeHist(cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY))
+        minimo = max(16, min(proxy.size) // 12)
+        caixas = modelo.detectMultiScale(cinza, scaleFactor=1.1, minNeighbors=5, minSize=(minimo, minimo))
+    if len(caixas) == 0:
+        return None
+    return max(caixas, key=lambda c: c[2] * c[3])
+
+
+def localizar_rosto(img, chave=None):
+    """Maior rosto da imagem como frações (x, y, largura, altura), ou None"""
+    if chave is not None:
+        with _trava_rostos:
+            if chave in _rostos:
+                _rostos.move_to_end(chave)
+                return _rostos[chave]
+    carregado = detector()
+    if carregado is False:
+        return None
+
+    escala = min(1.0, LADO_PROXY / max(img.size))
+    tamanho = (max(1, round(img.width * escala)), max(1, round(img.height * escala)))
+    proxy = img.convert("RGB").resize(tamanho, Image.BILINEAR, reducing_gap=2.0)
+    # Os detectores do OpenCV não são thread-safe; a detecção no proxy é curta
+    with _trava_detector:
+        caixa = _detectar(proxy, *carregado)
+    rosto = None
+    if caixa is not None:
+        x, y, w, h = (float(v) for v in caixa)
+        rosto = (x / proxy.width, y / proxy.height, w / proxy.width, h / proxy.height)
+
+    if chave is not None:
+        with _trava_rostos:
+            _rostos[chave] = rosto
+            while len(_rostos) > MAX_ROSTOS_EM_CACHE:
+                _rostos.popitem(last=False)
+    return rosto
+
+
+def janela_no_rosto(tamanho, rosto, proporcao, altura_minima=0):
+    """Caixa de recorte (proporção largura/altura) que enquadra o rosto como numa foto de documento.
+
+    A janela nunca sai da imagem e, se a imagem permitir, não fica mais
+    baixa que ``altura_minima`` px (para não ampliar um rosto pequeno).
+    """
+    largura, altura = tamanho
+    fx, fy = rosto[0] * largura, rosto[1] * altura
+    fw, fh = rosto[2] * largura, rosto[3] * altura
+
+    h = max(fh / FRACAO_ROSTO, altura_minima)
+    w = h * proporcao
+    # Não pode ser maior que a imagem (mantendo a proporção)
+    ajuste = min(1.0, largura / w, altura / h)
+    w, h = w * ajuste, h * ajuste
+
+    x0 = fx + fw / 2 - w / 2
+    y0 = fy + fh / 2 - h * CENTRO_ROSTO_Y
+    x0 = min(max(0.0, x0), largura - w)
+    y0 = min(max(0.0, y0), altura - h)
+    return (round(x0), round(y0), round(x0 + w), round(y0 + h))
@@ -0,0 +1,153 @@
+"""Sondagem do cabeçalho das imagens antes da decodificação completa.
+
+O Pillow só lê o cabeçalho em ``Image.open``; os pixels são decodificados
+apenas em ``load()``/``convert()``. Aqui aproveitamos essa janela para
+recusar arquivos corrompidos ou grandes demais e para escolher a escala
+de decodificação antes de alocar o buffer inteiro.
+"""
+
+import os
+
+from PIL import Image, ImageOps
+
+from nucleo.cores import converter_para_saida
+from nucleo.metricas import BYTES_DECODIFICADOS, ERROS
+
+# Limites padrão para uploads (uma foto de celular tem de 12 a 50 MP)
+LIMITE_MEGAPIXELS = 100
+LIMITE_MEMORIA_MB = 1024
+
+# Orientações EXIF que trocam largura e altura
+ORIENTACOES_TRANSPOSTAS = (5, 6, 7, 8)
+
+
+class ImagemRejeitada(ValueError):
+    """Arquivo recusado na sondagem (corrompido, grande demais ou sem suporte)"""
+
+
+def bytes_por_pixel(modo):
+    """Bytes ocupados por pixel no modo Pillow informado"""
+    if modo in ("I", "F", "I;32", "F;32"):
+        return 4
+    if modo.startswith("I;16"):
+        return 2
+    if modo == "1":
+        return 1
+    return Image.getmodebands(modo)
+
+
+def tamanho_arquivo(arquivo):
+    """Bytes do arquivo (caminho ou objeto com ``seek``), sem ler o conteúdo"""
+    if isinstance(arquivo, (str, os.PathLike)):
+        return os.path.getsize(arquivo)
+    posicao = arquivo.tell()
+    fim = arquivo.seek(0, os.SEEK_END)
+    arquivo.seek(posicao)
+    return fim
+
+
+def sondar_imagem(arquivo):
+    """Lê somente o cabeçalho e devolve tamanho, modo, formato, orientação e ICC"""
+    if hasattr(arquivo, "seek"):
+        arquivo.seek(0)
+    try:
+        with Image.open(arquivo) as img:
+            largura, altura = img.size
+            try:
+                orientacao = img.getexif().get(0x0112, 1)
+            except Exception:
+                orientacao = 1
+            info = {
+                "largura": largura,
+                "altura": altura,
+                "modo": img.mode,
+                "formato": img.format,
+                "orientacao": orientacao,
+                "icc": bool(img.info.get("icc_profile")),
+                "quadros": getattr(img, "n_frames", 1),
+            }
+    except Image.DecompressionBombError as e:
+        raise ImagemRejeitada(f"imagem grande demais: {e}") from e
+    except Exception as e:
+        raise ImagemRejeitada(f"arquivo de imagem inválido ou corrompido: {e}") from e
+    finally:
+        if hasattr(arquivo, "seek"):
+            arquivo.seek(0)
+
+    if orientacao in ORIENTACOES_TRANSPOSTAS:
+        info["tamanho_exibido"] = (altura, largura)
+    else:
+        info["tamanho_exibido"] = (largura, altura)
+    info["megapixels"] = largura * altura / 1_000_000
+    # Pico estimado: buffer no modo original + cópia RGB da conversão
+    buffer_original = largura * altura * bytes_por_pixel(info["modo"])
+    buffer_rgb = 0 if info["modo"] == "RGB" else largura * altura * 3
+    info["memoria_estimada"] = buffer_original + buffer_rgb
+    return info
+
+
+def validar_imagem(info, max_megapixels=LIMITE_MEGAPIXELS, max_memoria_mb=LIMITE_MEMORIA_MB, formatos=None):
+    """Recusa a imagem sondada se ultrapassar os limites configurados"""
+    if info["largura"] <= 0 or info["altura"] <= 0:
+        raise ImagemRejeitada("dimensões inválidas no cabeçalho")
+    if formatos is not None and info["formato"] not in formatos:
+        raise ImagemRejeitada(f"formato {info['formato']} não suportado")
+    if max_megapixels is not None and info["megapixels"] > max_megapixels:
+        raise ImagemRejeitada(
+            f"{info['largura']}×{info['altura']} px ({info['megapixels']:.0f} MP) "
+            f"excede o limite de {max_megapixels} MP"
+        )
+    if max_memoria_mb is not None and info["memoria_estimada"] > max_memoria_mb * 1024 * 1024:
+        raise ImagemRejeitada(
+            f"decodificação exigiria ~{info['memoria_estimada'] / 2**20:.0f} MB "
+            f"(limite {max_memoria_mb} MB)"
+        )
+    return info
+
+
+def fator_reducao(info, tamanho_alvo):
+    """Maior redução (1, 2, 4 ou 8) que ainda cobre o tamanho alvo"""
+    if tamanho_alvo is None:
+        return 1
+    largura, altura = info["tamanho_exibido"]
+    alvo_w, alvo_h = tamanho_alvo
+    fator = 1
+    while fator < 8 and largura // (fator * 2) >= alvo_w and altura // (fator * 2) >= alvo_h:
+        fator *= 2
+    return fator
+
+
+def abrir_imagem(arquivo, modo="RGB", tamanho_alvo=None, info=None, gerenciar_cores=True, **limites):
+    """Sonda, valida e só então decodifica a imagem (já com a orientação EXIF aplicada).
+
+    Com ``tamanho_alvo`` (largura, altura na orientação final), JPEGs são
+    decodificados direto em escala reduzida via ``draft``, sem alocar a
+    imagem em tamanho cheio. Com ``gerenciar_cores`` os pixels saem
+    convertidos do perfil ICC embutido para o perfil de saída.
+    """
+    try:
+        if info is None:
+            info = sondar_imagem(arquivo)
+        validar_imagem(info, **limites)
+    except ImagemRejeitada:
+        ERROS.inc(ferramenta="decodificacao")
+        raise
+
+    BYTES_DECODIFICADOS.inc(tamanho_arquivo(arquivo), formato=info["formato"])
+    img = Image.open(arquivo)
+    fator = fator_reducao(info, tamanho_alvo)
+    if fator > 1 and img.format == "JPEG":
+        alvo_w, alvo_h = info["largura"] // fator, info["altura"] // fator
+        img.draft(modo if modo in ("RGB", "L") else None, (alvo_w, alvo_h))
+    try:
+        img.load()
+    except Exception as e:
+        ERROS.inc(ferramenta="decodificacao")
+        raise ImagemRejeitada(f"falha ao decodificar a imagem: {e}") from e
+
+    ImageOps.exif_transpose(img, in_place=True)
+    if gerenciar_cores:
+        img = converter_para_saida(img)
+    if modo is not None and img.mode != modo:
+        img = img.convert(modo)
+    return img
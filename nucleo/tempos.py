@@ -0,0 +1,53 @@
+"""Tempos de inicialização e de renderização das páginas do lançador.
+
+O registro é um dicionário de módulo: vale para o processo inteiro e é
+compartilhado por todas as sessões.
+"""
+
+import sys
+import threading
+import time
+
+# O lançador importa este módulo antes de tudo: serve de marco da subida do servidor
+INICIO_PROCESSO = time.perf_counter()
+
+_trava = threading.Lock()
+_registro = {}
+
+
+def medir_pagina(nome, executar):
+    """Executa a página, registrando a duração e quantos módulos ela importou"""
+    modulos_antes = len(sys.modules)
+    inicio = time.perf_counter()
+    try:
+        executar()
+    finally:
+        registrar(nome, inicio, time.perf_counter() - inicio, len(sys.modules) - modulos_antes)
+
+
+def registrar(nome, inicio, duracao, modulos_novos):
+    with _trava:
+        item = _registro.get(nome)
+        if item is None:
+            _registro[nome] = {
+                "pagina": nome,
+                "desde_inicio": inicio - INICIO_PROCESSO,
+                "primeira": duracao,
+                "modulos_importados": modulos_novos,
+                "execucoes": 1,
+                "total": duracao,
+                "ultima": duracao,
+            }
+        else:
+            item["execucoes"] += 1
+            item["total"] += duracao
+            item["ultima"] = duracao
+
+
+def relatorio():
+    """Linhas do relatório, na ordem em que as páginas foram abertas pela primeira vez"""
+    with _trava:
+        linhas = [dict(item) for item in _registro.values()]
+    for item in linhas:
+        item["media"] = item["total"] / item["execucoes"]
+    return linhas
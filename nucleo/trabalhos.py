@@ -0,0 +1,138 @@
+"""Fila de renderização em segundo plano, compartilhada por todas as sessões.
+
+Um trabalho (ex.: montar todas as folhas A4 de um upload) é quebrado em
+tarefas pequenas (uma por página). Um número fixo de threads consome as
+tarefas alternando entre as sessões (round-robin), então um pedido grande
+não segura a fila inteira e cada usuário avança uma página por vez.
+Pillow libera o GIL ao decodificar, redimensionar e codificar, então
+threads bastam para usar vários núcleos.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from nucleo.metricas import ESPERA_FILA, TAREFAS, medidor
+
+
+class Trabalho:
+    """Estado de um trabalho: progresso por tarefa, resultado, erro e cancelamento"""
+
+    def __init__(self, chave, total):
+        self.chave = chave
+        self.total = total
+        self.resultados = [None] * total
+        self.concluidos = 0
+        self.erro = None
+        self.inicio = time.perf_counter()
+        # Sem tarefas o trabalho já nasce concluído
+        self.fim = self.inicio if total == 0 else None
+        self._cancelado = threading.Event()
+        self._trava = threading.Lock()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    @property
+    def pronto(self):
+        return self.erro is not None or self.concluidos == self.total
+
+    @property
+    def progresso(self):
+        return self.concluidos / self.total if self.total else 1.0
+
+    @property
+    def duracao(self):
+        """Segundos desde a submissão até a última tarefa (ou até agora)"""
+        return (self.fim or time.perf_counter()) - self.inicio
+
+    def cancelar(self):
+        """As tarefas ainda não iniciadas são descartadas pela fila"""
+        self._cancelado.set()
+
+    def _concluir(self, indice, resultado):
+        with self._trava:
+            self.resultados[indice] = resultado
+            self.concluidos += 1
+            if self.concluidos == self.total:
+                self.fim = time.perf_counter()
+
+    def _falhar(self, erro):
+        with self._trava:
+            self.erro = erro
+        self.cancelar()
+
+
+class FilaJusta:
+    """Executor com uma fila por sessão, atendidas em rodízio"""
+
+    def __init__(self, trabalhadores=None):
+        if trabalhadores is None:
+            trabalhadores = max(1, (os.cpu_count() or 2) - 1)
+        self._cond = threading.Condition()
+        self._filas = OrderedDict()  # sessão -> deque[(trabalho, indice, funcao, item)]
+        for n in range(trabalhadores):
+            threading.Thread(target=self._trabalhador, name=f"render-{n}", daemon=True).start()
+
+    def submeter(self, sessao, chave, funcao, itens):
+        """Enfileira ``funcao(item)`` para cada item e devolve o Trabalho"""
+        itens = list(itens)
+        trabalho = Trabalho(chave, len(itens))
+        with self._cond:
+            fila = self._filas.setdefault(sessao, deque())
+            fila.extend((trabalho, i, funcao, item) for i, item in enumerate(itens))
+            self._cond.notify_all()
+        return trabalho
+
+    def pendentes(self):
+        """Tarefas aguardando, somando todas as sessões (as de trabalhos cancelados não contam)"""
+        with self._cond:
+            return sum(not tarefa[0].cancelado for fila in self._filas.values() for tarefa in fila)
+
+    def _proxima_tarefa(self):
+        with self._cond:
+            while True:
+                for sessao in list(self._filas):
+                    fila = self._filas[sessao]
+                    while fila and fila[0][0].cancelado:
+                        fila.popleft()
+                        TAREFAS.inc(resultado="cancelada")
+                    if not fila:
+                        del self._filas[sessao]
+                        continue
+                    tarefa = fila.popleft()
+                    # A sessão atendida vai para o fim da fila de sessões
+                    self._filas.move_to_end(sessao)
+                    return tarefa
+                self._cond.wait()
+
+    def _trabalhador(self):
+        while True:
+            trabalho, indice, funcao, item = self._proxima_tarefa()
+            if trabalho.cancelado:
+                TAREFAS.inc(resultado="cancelada")
+                continue
+            ESPERA_FILA.observar(time.perf_counter() - trabalho.inicio)
+            try:
+                trabalho._concluir(indice, funcao(item))
+            except Exception as e:
+                TAREFAS.inc(resultado="erro")
+                trabalho._falhar(e)
+            else:
+                TAREFAS.inc(resultado="concluida")
+
+
+_fila = None
+_trava_fila = threading.Lock()
+
+
+def fila_compartilhada():
+    """Fila única do processo, criada no primeiro uso"""
+    global _fila
+    with _trava_fila:
+        if _fila is None:
+            _fila = FilaJusta()
+            medidor("retratos_fila_pendentes", "Tarefas aguardando na fila compartilhada", _fila.pendentes)
+        return _fila